@@ -3,18 +3,24 @@ DineQR — ASGI Configuration with WebSocket support
 """
 import os
 from django.core.asgi import get_asgi_application
+from django.urls import path, re_path
 from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
 
 django_asgi_app = get_asgi_application()
 
 from orders.routing import websocket_urlpatterns
+from orders.sse import TableEventStreamApp
+from users.middleware import JWTAuthMiddlewareStack
 
 application = ProtocolTypeRouter({
-    'http': django_asgi_app,
-    'websocket': AuthMiddlewareStack(
+    'http': URLRouter([
+        # Guest event streams skip Django's request handling (see orders.sse).
+        path('api/orders/table/<int:number>/events/', TableEventStreamApp()),
+        re_path(r'', django_asgi_app),
+    ]),
+    'websocket': JWTAuthMiddlewareStack(
         URLRouter(websocket_urlpatterns)
     ),
 })
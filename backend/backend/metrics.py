@@ -0,0 +1,234 @@
+"""
+In-process metrics in the Prometheus text format.
+
+A deliberately small registry (counters, gauges, histograms with labels)
+so the hot paths can stay instrumented at peak: recording is a dict lookup
+and a locked add. Every metric the app records is declared at the bottom
+of this module, and :func:`metrics_view` serves them at ``/metrics``.
+
+Values are per process; with several workers, scrape each one (or run a
+single ASGI worker per container, as the Docker setup does). Scrapes need
+``METRICS_TOKEN`` as a bearer token or a staff session; with no token
+configured only staff can read them.
+"""
+import hmac
+import threading
+from bisect import bisect_left
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def labels(self, *values):
+        child = self.children.get(values)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(values, self.new_child())
+        return child
+
+    def new_child(self):
+        raise NotImplementedError
+
+    def samples(self):
+        """``[(suffix, label_values, extra_labels, value)]``."""
+        raise NotImplementedError
+
+    def render(self):
+        lines = [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.type}',
+        ]
+        for suffix, values, extra, value in self.samples():
+            lines.append(
+                f'{self.name}{suffix}{_format_labels(self.labelnames, values, extra)} '
+                f'{_format_value(value)}'
+            )
+        return '\n'.join(lines)
+
+
+class _Value:
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self.lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def samples(self):
+        return [('_total', values, (), child.value) for values, child in list(self.children.items())]
+
+
+class Gauge(Counter):
+    type = 'gauge'
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def samples(self):
+        return [('', values, (), child.value) for values, child in list(self.children.items())]
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    DEFAULT_BUCKETS = (.005, .01, .025, .05, .075, .1, .25, .5, .75, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def new_child(self):
+        return _Histogram(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def samples(self):
+        samples = []
+        for values, child in list(self.children.items()):
+            with child.lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                samples.append(('_bucket', values, (('le', _format_value(float(bound))),), cumulative))
+            samples.append(('_sum', values, (), total))
+            samples.append(('_count', values, (), cumulative))
+        return samples
+
+
+def render():
+    return '\n'.join(metric.render() for metric in REGISTRY) + '\n'
+
+
+def scrape_allowed(request):
+    """The ``METRICS_TOKEN`` bearer token, or an admin session."""
+    from users.permissions import IsAdminRole, has_role
+
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return True
+    return has_role(getattr(request, 'user', None), IsAdminRole.roles)
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint; closed to anyone without the token or an admin session."""
+    if not scrape_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type=CONTENT_TYPE)
+
+
+# --- what we record ----------------------------------------------------------
+
+HTTP_REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds',
+    'HTTP request latency by route pattern.',
+    ['method', 'route', 'status'],
+)
+HTTP_REQUEST_QUERIES = Histogram(
+    'http_request_db_queries',
+    'SQL queries per HTTP request by route pattern.',
+    ['route'],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+
+ORDERS_CREATED = Counter('orders_created', 'Orders created.')
+ORDER_STATUS_CHANGES = Counter(
+    'order_status_changes', 'Order status transitions by new status.', ['status'],
+)
+
+WEBSOCKET_CONNECTIONS = Gauge('websocket_connections', 'Open OrderConsumer connections.')
+WEBSOCKET_CONNECTS = Counter('websocket_connects', 'OrderConsumer connections accepted by role.', ['role'])
+WEBSOCKET_GROUP_SUBSCRIPTIONS = Gauge(
+    'websocket_group_subscriptions', 'Open sockets subscribed to groups, by kind of group.', ['group'],
+)
+WEBSOCKET_MESSAGES_RECEIVED = Counter(
+    'websocket_messages_received', 'Messages received from clients by type.', ['type'],
+)
+WEBSOCKET_MESSAGES_SENT = Counter(
+    'websocket_messages_sent', 'Channel-layer events delivered to sockets by type.', ['type'],
+)
+
+CHANNEL_PUBLISH_SECONDS = Histogram(
+    'channel_layer_publish_duration_seconds',
+    'group_send latency by kind of group.',
+    ['group'],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.0),
+)
+CHANNEL_PUBLISH_FAILURES = Counter(
+    'channel_layer_publish_failures', 'Failed group_send calls by kind of group.', ['group'],
+)
+CHANNEL_MESSAGES_PUBLISHED = Counter(
+    'channel_layer_messages_published', 'Events sent to groups by kind of group and event type.', ['group', 'type'],
+)
+
+CACHE_REQUESTS = Counter(
+    'cache_requests', 'Application cache lookups by cache and result (hit/miss).', ['cache', 'result'],
+)
@@ -0,0 +1,181 @@
+"""
+Per-request SQL and latency instrumentation.
+
+:class:`RequestTimingMiddleware` wraps every database connection for the
+duration of a request to count queries and time spent in SQL, then:
+
+* adds a ``Server-Timing`` header (``db``, ``app``, ``total``) when
+  ``SERVER_TIMING_HEADERS`` is on, so browser dev tools and the Flutter
+  network inspector show where a request spent its time;
+* logs requests slower than ``SLOW_REQUEST_MS`` or issuing more than
+  ``SLOW_REQUEST_QUERIES`` queries to the ``backend.requests`` logger;
+* with ``NPLUSONE_DETECT`` on (the default under ``DEBUG`` and
+  ``manage.py test``), flags statements repeated ``NPLUSONE_THRESHOLD``
+  times or more in one request and names the serializer field (or the
+  line of app code) that issued them. ``NPLUSONE_RAISE`` turns the
+  warning into an exception so tests fail on new N+1s.
+
+The middleware is sync-only on purpose. Under ASGI, Django runs it in the
+request's thread-sensitive executor, the same thread the (sync) DRF views
+run their ORM calls on, and database connections are per thread: wrappers
+installed from the event loop would see no queries at all. Streaming
+responses are passed through untouched: their work happens after the
+middleware returns, so neither the timings nor the query counts would
+describe it.
+"""
+import logging
+import re
+import sys
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from .metrics import HTTP_REQUEST_QUERIES, HTTP_REQUEST_SECONDS
+
+
+logger = logging.getLogger('backend.requests')
+
+IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+
+
+class NPlusOneDetected(Exception):
+    pass
+
+
+def fingerprint(sql):
+    """Statement text with ``IN (...)`` lists collapsed, so batches compare equal."""
+    return IN_LIST_RE.sub('IN (...)', sql)
+
+
+def route_name(request):
+    """URL pattern the request matched (e.g. ``api/orders/<int:pk>/``)."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.route or match.view_name
+
+
+def query_source(frame):
+    """
+    Where a query came from: ``Serializer.field`` if a DRF serializer was
+    rendering a field, else the innermost project file and line.
+    """
+    app_frame = None
+    base_dir = str(settings.BASE_DIR)
+    while frame is not None:
+        code = frame.f_code
+        if (
+            code.co_name == 'to_representation'
+            and 'rest_framework' in code.co_filename
+            and 'field' in frame.f_locals
+            and 'instance' in frame.f_locals
+        ):
+            field = frame.f_locals['field']
+            return f"{type(field.parent).__name__}.{field.field_name}"
+        if (
+            app_frame is None
+            and code.co_filename.startswith(base_dir)
+            and code.co_filename != __file__
+        ):
+            app_frame = f"{code.co_filename[len(base_dir) + 1:]}:{frame.f_lineno}"
+        frame = frame.f_back
+    return app_frame
+
+
+class QueryRecorder:
+    """``execute_wrapper`` that counts and times queries for one request."""
+
+    def __init__(self, detect=False):
+        self.count = 0
+        self.seconds = 0.0
+        self.detect = detect
+        self.repeats = Counter()
+        self.sources = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.count += 1
+            if self.detect:
+                key = fingerprint(sql)
+                self.repeats[key] += 1
+                # The stack is only walked once a statement repeats.
+                if self.repeats[key] == 2:
+                    self.sources[key] = query_source(sys._getframe(1))
+
+    def repeated(self, threshold):
+        """``[(sql, times, source)]`` for statements run ``threshold`` times or more."""
+        return [
+            (sql, times, self.sources.get(sql))
+            for sql, times in self.repeats.most_common()
+            if times >= threshold
+        ]
+
+
+class RequestTimingMiddleware:
+    sync_capable = True
+    async_capable = False
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.headers = getattr(settings, 'SERVER_TIMING_HEADERS', settings.DEBUG)
+        self.slow_ms = getattr(settings, 'SLOW_REQUEST_MS', 500)
+        self.slow_queries = getattr(settings, 'SLOW_REQUEST_QUERIES', 50)
+        self.detect = getattr(settings, 'NPLUSONE_DETECT', False)
+        self.threshold = getattr(settings, 'NPLUSONE_THRESHOLD', 5)
+        self.raise_on_detect = getattr(settings, 'NPLUSONE_RAISE', False)
+
+    def __call__(self, request):
+        recorder = QueryRecorder(self.detect)
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        if response.streaming:
+            return response
+        total_ms = (time.perf_counter() - start) * 1000
+        db_ms = recorder.seconds * 1000
+
+        request.timing = {'total_ms': total_ms, 'db_ms': db_ms, 'queries': recorder.count}
+        route = route_name(request)
+        HTTP_REQUEST_SECONDS.labels(request.method, route, response.status_code).observe(total_ms / 1000)
+        HTTP_REQUEST_QUERIES.labels(route).observe(recorder.count)
+        if self.headers:
+            response['Server-Timing'] = (
+                f'db;dur={db_ms:.1f};desc="{recorder.count} queries", '
+                f'app;dur={total_ms - db_ms:.1f}, total;dur={total_ms:.1f}'
+            )
+
+        if total_ms >= self.slow_ms or recorder.count > self.slow_queries:
+            logger.warning(
+                "Slow request %s %s (%s) -> %s: %.0f ms, %d queries, %.0f ms SQL",
+                request.method, request.path, route, response.status_code,
+                total_ms, recorder.count, db_ms,
+            )
+
+        if self.detect:
+            self.report_repeats(request, recorder)
+        return response
+
+    def report_repeats(self, request, recorder):
+        repeated = recorder.repeated(self.threshold)
+        if not repeated:
+            return
+        lines = [
+            f"  {times}x from {source or 'unknown'}: {sql[:200]}"
+            for sql, times, source in repeated
+        ]
+        message = (
+            f"Possible N+1 in {request.method} {request.path} ({route_name(request)}):\n"
+            + '\n'.join(lines)
+        )
+        if self.raise_on_detect:
+            raise NPlusOneDetected(message)
+        logger.warning(message)
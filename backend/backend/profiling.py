@@ -0,0 +1,222 @@
+"""
+Opt-in sampling profiler for requests and WebSocket handlers.
+
+An admin can profile one request by sending ``X-Profile: 1`` (or
+``?profile=1``); the response names the artifact in its ``X-Profile``
+header. Independently, ``PROFILE_SAMPLE_RATE`` and
+``PROFILE_WS_SAMPLE_RATE`` profile that fraction of all requests and
+``OrderConsumer`` handler calls.
+
+Profiles are taken with pyinstrument when it is installed (an HTML
+flame view) and with cProfile otherwise (a ``.prof`` file for ``pstats``
+or snakeviz); ``PROFILE_ENGINE`` forces one. Artifacts go to
+``PROFILE_DIR/<view>/`` and the oldest are deleted once the directory
+exceeds ``PROFILE_MAX_BYTES``.
+
+The middleware is sync-only so that under ASGI it runs in the same thread
+as the view; a profiler started on the event loop never sees the view's
+frames. Streaming responses are not profiled: the profile would end
+before the body is produced.
+"""
+import cProfile
+import logging
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from django.conf import settings
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile'
+
+_rotate_lock = threading.Lock()
+
+
+def profile_dir():
+    return Path(getattr(settings, 'PROFILE_DIR', settings.BASE_DIR / '.profiles'))
+
+
+def engine():
+    configured = getattr(settings, 'PROFILE_ENGINE', 'auto')
+    if configured == 'cprofile' or pyinstrument is None:
+        return 'cprofile'
+    return 'pyinstrument'
+
+
+def slug(label):
+    return re.sub(r'[^A-Za-z0-9]+', '-', label).strip('-')[:80] or 'root'
+
+
+def sampled(rate):
+    return rate > 0 and random.random() < rate
+
+
+class Profile:
+    """One profiling run; ``start()``, then ``finish(label)`` returns the artifact path."""
+
+    def __init__(self, async_mode=False):
+        self.engine = engine()
+        self.async_mode = async_mode
+        self.profiler = None
+        self.started = None
+
+    def start(self):
+        try:
+            if self.engine == 'pyinstrument':
+                self.profiler = pyinstrument.Profiler(
+                    async_mode='enabled' if self.async_mode else 'disabled',
+                )
+                self.profiler.start()
+            else:
+                self.profiler = cProfile.Profile()
+                self.profiler.enable()
+        except (RuntimeError, ValueError) as e:
+            # Another profiler already owns this thread.
+            logger.debug("Profiler not started: %s", e)
+            self.profiler = None
+            return False
+        self.started = time.perf_counter()
+        return True
+
+    def stop(self):
+        if self.engine == 'pyinstrument':
+            self.profiler.stop()
+        else:
+            self.profiler.disable()
+
+    def discard(self):
+        """Stop without writing an artifact."""
+        if self.profiler is not None:
+            self.stop()
+            self.profiler = None
+
+    def finish(self, label):
+        if self.profiler is None:
+            return None
+        elapsed_ms = (time.perf_counter() - self.started) * 1000
+        self.stop()
+
+        directory = profile_dir() / slug(label)
+        directory.mkdir(parents=True, exist_ok=True)
+        ext = 'html' if self.engine == 'pyinstrument' else 'prof'
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{elapsed_ms:.0f}ms-{os.getpid()}.{ext}"
+        path = directory / name
+
+        # Write then rename so a half-written profile is never picked up.
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        os.close(fd)
+        if self.engine == 'pyinstrument':
+            Path(tmp).write_text(self.profiler.output_html())
+        else:
+            self.profiler.dump_stats(tmp)
+        os.replace(tmp, path)
+        rotate()
+        return path
+
+
+def rotate(directory=None, max_bytes=None):
+    """Delete the oldest artifacts until the directory fits in ``PROFILE_MAX_BYTES``."""
+    directory = Path(directory or profile_dir())
+    max_bytes = max_bytes or getattr(settings, 'PROFILE_MAX_BYTES', 100 * 1024 * 1024)
+    with _rotate_lock:
+        files = []
+        for path in directory.rglob('*'):
+            if path.suffix in ('.html', '.prof'):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= max_bytes:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def requested_by_admin(request):
+    """True if the request asks to be profiled and comes from an admin."""
+    if request.headers.get(PROFILE_HEADER) != '1' and request.GET.get('profile') != '1':
+        return False
+
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated and user.is_staff:
+        return True
+
+    # API clients authenticate with JWTs, which DRF only reads inside views.
+    from users.authentication import ClaimsJWTAuthentication
+
+    try:
+        result = ClaimsJWTAuthentication().authenticate(request)
+    except Exception:
+        return False
+    if result is None:
+        return False
+    user = result[0]
+    return user.is_staff or getattr(user, 'role', None) == 'admin'
+
+
+class ProfilerMiddleware:
+    sync_capable = True
+    async_capable = False
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'PROFILE_SAMPLE_RATE', 0.0)
+
+    def __call__(self, request):
+        explicit = requested_by_admin(request)
+        if not explicit and not sampled(self.sample_rate):
+            return self.get_response(request)
+
+        from .middleware import route_name
+
+        profile = Profile()
+        if not profile.start():
+            return self.get_response(request)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            profile.finish(f'{request.method} {route_name(request)}')
+            raise
+        if response.streaming:
+            profile.discard()
+            return response
+        path = profile.finish(f'{request.method} {route_name(request)}')
+        if explicit and path is not None:
+            response[PROFILE_HEADER] = str(path.relative_to(profile_dir()))
+        return response
+
+
+@asynccontextmanager
+async def sample_handler(label):
+    """
+    Profile the enclosed WebSocket handler for ``PROFILE_WS_SAMPLE_RATE``
+    of calls. With cProfile, anything else the event loop runs meanwhile is
+    included; pyinstrument attributes awaits correctly.
+    """
+    rate = getattr(settings, 'PROFILE_WS_SAMPLE_RATE', 0.0)
+    profile = Profile(async_mode=True) if sampled(rate) else None
+    if profile is not None and not profile.start():
+        profile = None
+    try:
+        yield
+    finally:
+        if profile is not None:
+            profile.finish(label)
@@ -1,5 +1,6 @@
 """DineQR Backend — Django Settings"""
 import os
+import sys
 from pathlib import Path
 from datetime import timedelta
 
@@ -41,6 +42,7 @@ INSTALLED_APPS = [
 # ─── MIDDLEWARE ────────────────────────────────────────────────
 
 MIDDLEWARE = [
+    'backend.middleware.RequestTimingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -49,8 +51,29 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'backend.profiling.ProfilerMiddleware',
 ]
 
+# Request instrumentation (see backend/middleware.py).
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+SERVER_TIMING_HEADERS = os.getenv('SERVER_TIMING_HEADERS', str(DEBUG)) == 'True'
+SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', '500'))
+SLOW_REQUEST_QUERIES = int(os.getenv('SLOW_REQUEST_QUERIES', '50'))
+NPLUSONE_DETECT = os.getenv('NPLUSONE_DETECT', str(DEBUG or TESTING)) == 'True'
+NPLUSONE_THRESHOLD = int(os.getenv('NPLUSONE_THRESHOLD', '5'))
+NPLUSONE_RAISE = os.getenv('NPLUSONE_RAISE', str(TESTING)) == 'True'
+# Scrapers send "Authorization: Bearer <METRICS_TOKEN>"; without it /metrics
+# is only open to admin sessions.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Profiling (see backend/profiling.py). Admins can always request a profile
+# with "X-Profile: 1"; the rates additionally sample requests / WS handlers.
+PROFILE_DIR = Path(os.getenv('PROFILE_DIR', str(BASE_DIR / '.profiles')))
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_WS_SAMPLE_RATE = float(os.getenv('PROFILE_WS_SAMPLE_RATE', '0'))
+PROFILE_MAX_BYTES = int(os.getenv('PROFILE_MAX_BYTES', str(100 * 1024 * 1024)))
+PROFILE_ENGINE = os.getenv('PROFILE_ENGINE', 'auto')  # auto, pyinstrument or cprofile
+
 ROOT_URLCONF = 'backend.urls'
 
 TEMPLATES = [
@@ -117,7 +140,7 @@ AUTH_PASSWORD_VALIDATORS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.ClaimsJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.AllowAny',
@@ -134,6 +157,11 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': True,
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
+# How long a user's active flag / role / password hash is trusted before
+# ClaimsJWTAuthentication re-reads it. Saving the user clears it at once.
+AUTH_STATE_CACHE_SECONDS = int(os.getenv('AUTH_STATE_CACHE_SECONDS', '30'))
+# Decoded WebSocket tokens kept per worker (until they expire).
+WS_TOKEN_CACHE_SIZE = int(os.getenv('WS_TOKEN_CACHE_SIZE', '10000'))
 
 # ─── CORS ─────────────────────────────────────────────────────
 
@@ -151,6 +179,37 @@ CHANNEL_LAYERS = {
     },
 }
 
+# The same Redis backs the cache, so every worker sees one menu version,
+# auth-state record and payment-intent entry; without Redis each process
+# keeps its own.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+        'KEY_PREFIX': 'dineqr',
+    } if 'redis' in REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+# ─── KITCHEN ─────────────────────────────────────────────────
+
+# Orders the kitchen can cook at once; drives queue-aware ETAs.
+KITCHEN_PARALLEL_CAPACITY = int(os.getenv('KITCHEN_PARALLEL_CAPACITY', '4'))
+ETA_BUFFER_MINUTES = int(os.getenv('ETA_BUFFER_MINUTES', '5'))
+# How often each worker rebuilds its in-memory kitchen queue from the DB.
+ETA_RELOAD_SECONDS = int(os.getenv('ETA_RELOAD_SECONDS', '60'))
+# How often each worker reconciles its all-day item counts with the DB.
+ALL_DAY_RELOAD_SECONDS = int(os.getenv('ALL_DAY_RELOAD_SECONDS', '30'))
+
+# ─── MENU ────────────────────────────────────────────────────
+
+# Public menu responses are cached until the menu changes, at most this long.
+MENU_CACHE_SECONDS = int(os.getenv('MENU_CACHE_SECONDS', '300'))
+# Build resized image variants on a background thread pool instead of inline.
+MENU_IMAGE_VARIANTS_ASYNC = os.getenv('MENU_IMAGE_VARIANTS_ASYNC', 'False') == 'True'
+MENU_IMAGE_WORKERS = int(os.getenv('MENU_IMAGE_WORKERS', '2'))
+
 # ─── STATIC & MEDIA ──────────────────────────────────────────
 
 LANGUAGE_CODE = 'en-us'
@@ -165,6 +224,15 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 # Media (served from Cloudinary)
 MEDIA_URL = '/media/'
 
+# Shared on-disk cache of rendered QR images, keyed by content hash.
+QR_CACHE_DIR = Path(os.getenv('QR_CACHE_DIR', BASE_DIR / '.qr_cache'))
+# Bulk QR generation: render processes (default: CPU count) and upload threads.
+QR_RENDER_PROCESSES = int(os.getenv('QR_RENDER_PROCESSES', '0')) or None
+QR_UPLOAD_THREADS = int(os.getenv('QR_UPLOAD_THREADS', '8'))
+# Base URL encoded by /table/<n>/qr.(png|svg); defaults to the request host.
+QR_BASE_URL = os.getenv('QR_BASE_URL', '')
+QR_CACHE_MAX_AGE = int(os.getenv('QR_CACHE_MAX_AGE', '86400'))
+
 CLOUDINARY_CLOUD_NAME = os.getenv('CLOUDINARY_CLOUD_NAME')
 CLOUDINARY_API_KEY = os.getenv('CLOUDINARY_API_KEY')
 CLOUDINARY_API_SECRET = os.getenv('CLOUDINARY_API_SECRET')
@@ -184,5 +252,16 @@ else:
 
 STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY')
 STRIPE_PUBLISHABLE_KEY = os.getenv('STRIPE_PUBLISHABLE_KEY')
+STRIPE_CURRENCY = os.getenv('STRIPE_CURRENCY', 'usd')
+# Point at a local fake (e.g. stripe-mock on http://localhost:12111) in tests.
+STRIPE_API_BASE = os.getenv('STRIPE_API_BASE', '')
+# Keep slow Stripe responses from pinning a worker.
+STRIPE_TIMEOUT_SECONDS = float(os.getenv('STRIPE_TIMEOUT_SECONDS', '10'))
+STRIPE_CONNECT_TIMEOUT_SECONDS = float(os.getenv('STRIPE_CONNECT_TIMEOUT_SECONDS', '3'))
+STRIPE_MAX_NETWORK_RETRIES = int(os.getenv('STRIPE_MAX_NETWORK_RETRIES', '1'))
+STRIPE_WEBHOOK_SECRET = os.getenv('STRIPE_WEBHOOK_SECRET', '')
+# Webhook events are applied in the background, this many per transaction.
+STRIPE_WEBHOOK_BATCH_SIZE = int(os.getenv('STRIPE_WEBHOOK_BATCH_SIZE', '100'))
+STRIPE_WEBHOOK_POLL_SECONDS = int(os.getenv('STRIPE_WEBHOOK_POLL_SECONDS', '30'))
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
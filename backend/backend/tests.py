@@ -0,0 +1,135 @@
+import pstats
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from orders.notifications import group_kind, publish
+from users.models import User
+
+from .metrics import CHANNEL_MESSAGES_PUBLISHED
+from .middleware import RequestTimingMiddleware
+from .profiling import ProfilerMiddleware
+
+
+def sync_view(request):
+    return HttpResponse('ok')
+
+
+def sync_stream_view(request):
+    return StreamingHttpResponse(iter(['data: 1\n\n']), content_type='text/event-stream')
+
+
+@override_settings(SERVER_TIMING_HEADERS=True, NPLUSONE_DETECT=False)
+class RequestTimingMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        self.request = RequestFactory().get('/api/orders/')
+
+    def test_adds_server_timing(self):
+        response = RequestTimingMiddleware(sync_view)(self.request)
+        self.assertIn('total;dur=', response['Server-Timing'])
+        self.assertEqual(self.request.timing['queries'], 0)
+
+    def test_streaming_response_is_passed_through(self):
+        response = RequestTimingMiddleware(sync_stream_view)(self.request)
+        self.assertFalse(response.has_header('Server-Timing'))
+        self.assertFalse(hasattr(self.request, 'timing'))
+
+
+@override_settings(SERVER_TIMING_HEADERS=True)
+class RequestTimingQueryTests(TestCase):
+    def test_counts_view_queries(self):
+        response = self.client.get('/api/orders/tables/')
+        self.assertGreater(response.wsgi_request.timing['queries'], 0)
+        self.assertIn(f"{response.wsgi_request.timing['queries']} queries", response['Server-Timing'])
+
+    async def test_async_request_counts_view_queries(self):
+        # Under ASGI the view's ORM calls run in a worker thread; the
+        # middleware must be running in that thread to see them.
+        response = await AsyncClient().get('/api/orders/tables/')
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(response.asgi_request.timing['queries'], 0)
+
+
+class ProfilerMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        self.request = RequestFactory().get('/api/orders/')
+        self.profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.profile_dir, ignore_errors=True)
+        override = self.settings(
+            PROFILE_DIR=Path(self.profile_dir), PROFILE_SAMPLE_RATE=1.0, PROFILE_ENGINE='cprofile',
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def artifacts(self):
+        return list(Path(self.profile_dir).rglob('*.prof'))
+
+    def test_writes_one_artifact(self):
+        ProfilerMiddleware(sync_view)(self.request)
+        self.assertEqual(len(self.artifacts()), 1)
+
+    def test_streaming_response_is_not_profiled(self):
+        ProfilerMiddleware(sync_stream_view)(self.request)
+        self.assertEqual(self.artifacts(), [])
+
+
+class ProfilerViewTests(TestCase):
+    def setUp(self):
+        self.profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.profile_dir, ignore_errors=True)
+        override = self.settings(
+            PROFILE_DIR=Path(self.profile_dir), PROFILE_SAMPLE_RATE=1.0, PROFILE_ENGINE='cprofile',
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def profiled_functions(self):
+        (artifact,) = Path(self.profile_dir).rglob('*.prof')
+        return {(Path(filename).parts[-2:], name) for filename, _, name in pstats.Stats(str(artifact)).stats}
+
+    def test_profile_contains_the_view(self):
+        self.client.get('/api/orders/tables/')
+        self.assertIn((('orders', 'views.py'), 'get_queryset'), self.profiled_functions())
+
+    async def test_async_request_profile_contains_the_view(self):
+        # Under ASGI the view runs on a worker thread; so must the profiler.
+        await AsyncClient().get('/api/orders/tables/')
+        self.assertIn((('orders', 'views.py'), 'get_queryset'), self.profiled_functions())
+
+
+class MetricsViewTests(TestCase):
+    def test_closed_without_a_token(self):
+        with self.settings(METRICS_TOKEN=''):
+            self.assertEqual(self.client.get('/metrics').status_code, 403)
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+
+    @override_settings(METRICS_TOKEN='scrape-me')
+    def test_bearer_token(self):
+        self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-me')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'# TYPE http_request_duration_seconds histogram', response.content)
+
+    def test_admin_session(self):
+        self.client.force_login(User.objects.create_user('owner', password='x', role='admin'))
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+        self.client.force_login(User.objects.create_user('chef', password='x', role='kitchen'))
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+
+class GroupLabelTests(SimpleTestCase):
+    def test_group_kinds_are_bounded(self):
+        self.assertEqual(
+            [group_kind(group) for group in ('table_12', 'kitchen_grill', 'all_day_bar', 'kitchen', 'cashier', 'x9')],
+            ['table', 'station', 'all_day', 'kitchen', 'cashier', 'other'],
+        )
+
+    def test_publish_counts_by_kind_of_group(self):
+        sent = CHANNEL_MESSAGES_PUBLISHED.labels('table', 'order_update')
+        before = sent.value
+        self.assertTrue(publish('table_41', {'type': 'order_update'}))
+        self.assertTrue(publish('table_42', {'type': 'order_update'}))
+        self.assertEqual(sent.value, before + 2)
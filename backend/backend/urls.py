@@ -2,21 +2,25 @@
 DineQR — Main URL Configuration
 """
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
-from orders.views import TableByNumberView
+from backend.metrics import metrics_view
+from orders.views import TableByNumberView, TableQRView
 
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
     path('api/auth/', include('users.urls')),
     path('api/menu/', include('menu.urls')),
     path('api/orders/', include('orders.urls')),
 
     # Public table endpoint used by QR codes, e.g. /table/7
     path('table/<int:number>/', TableByNumberView.as_view(), name='public-table-by-number'),
+    # Rendered on the fly for the current base URL, e.g. /table/7/qr.svg
+    re_path(r'^table/(?P<number>[0-9]+)/qr\.(?P<fmt>png|svg)$', TableQRView.as_view(), name='table-qr'),
 ]
 
 # Serve media files in development
@@ -1,20 +1,29 @@
 from django.contrib import admin
+from .images import update_image_variants
 from .models import Category, MenuItem
 
 
+@admin.action(description='Rebuild image variants')
+def rebuild_image_variants(modeladmin, request, queryset):
+    rebuilt = sum(update_image_variants(obj, force=True) for obj in queryset)
+    modeladmin.message_user(request, f'Rebuilt image variants for {rebuilt} row(s).')
+
+
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ('name', 'sort_order', 'is_active', 'created_at')
-    list_filter = ('is_active',)
+    list_display = ('name', 'station', 'sort_order', 'is_active', 'created_at')
+    list_filter = ('is_active', 'station')
     search_fields = ('name',)
     list_editable = ('sort_order', 'is_active')
     ordering = ('sort_order',)
+    actions = [rebuild_image_variants]
 
 
 @admin.register(MenuItem)
 class MenuItemAdmin(admin.ModelAdmin):
     list_display = ('name', 'category', 'price', 'available', 'is_popular', 'preparation_time')
-    list_filter = ('category', 'available', 'is_popular')
+    list_filter = ('category', 'available', 'is_popular', 'station')
     search_fields = ('name', 'description')
     list_editable = ('price', 'available', 'is_popular')
     ordering = ('category', 'name')
+    actions = [rebuild_image_variants]
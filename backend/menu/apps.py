@@ -3,3 +3,15 @@ from django.apps import AppConfig
 class MenuConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'menu'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+
+        from .cache import handle_menu_changed
+        from .images import handle_image_saved
+        from .models import Category, MenuItem
+
+        for model in (Category, MenuItem):
+            post_save.connect(handle_menu_changed, sender=model, dispatch_uid=f'menu.cache.save.{model.__name__}')
+            post_delete.connect(handle_menu_changed, sender=model, dispatch_uid=f'menu.cache.delete.{model.__name__}')
+            post_save.connect(handle_image_saved, sender=model, dispatch_uid=f'menu.images.{model.__name__}')
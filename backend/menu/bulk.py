@@ -0,0 +1,259 @@
+"""
+Bulk menu import and export.
+
+Files are read as a stream (CSV, JSON Lines, or a JSON array decoded item by
+item) and applied in chunks: each chunk is validated row by row, its
+categories and existing items are resolved with one query each, and rows
+are written with ``bulk_create`` / ``bulk_update``. Items are matched by
+``id`` when given, otherwise by (category, name). Errors are reported per
+row and the menu cache is invalidated once per import. Items whose image
+changed get their variants built afterwards (bulk writes skip signals).
+"""
+import csv
+import io
+import json
+from collections.abc import Mapping
+
+from django.db import transaction
+from rest_framework import serializers
+
+from .cache import bump_menu_version
+from .images import schedule_image_variants, stale
+from .models import Category, MenuItem
+
+
+CHUNK_SIZE = 500
+MAX_REPORTED_ERRORS = 1000
+FORMATS = ('csv', 'json', 'jsonl')
+
+EXPORT_FIELDS = [
+    'id', 'category', 'name', 'description', 'price', 'available',
+    'is_popular', 'preparation_time', 'station', 'image',
+]
+UPDATE_FIELDS = [
+    'category', 'description', 'price', 'available',
+    'is_popular', 'preparation_time', 'station', 'image',
+]
+
+
+class MenuImportRowSerializer(serializers.Serializer):
+    id = serializers.IntegerField(required=False, allow_null=True, min_value=1)
+    category = serializers.CharField(max_length=100)
+    name = serializers.CharField(max_length=150)
+    # Optional columns left out (or empty) keep the item's current value,
+    # or the model default for new items.
+    description = serializers.CharField(required=False)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
+    available = serializers.BooleanField(required=False)
+    is_popular = serializers.BooleanField(required=False)
+    preparation_time = serializers.IntegerField(required=False, min_value=0)
+    station = serializers.SlugField(required=False, max_length=30)
+    image = serializers.CharField(required=False, max_length=100)
+
+    def to_internal_value(self, data):
+        # Spreadsheets export empty cells as '', which means "not given".
+        # Anything but an object is left for DRF to reject as a row error.
+        if isinstance(data, Mapping):
+            data = {key: value for key, value in data.items() if value not in ('', None)}
+        return super().to_internal_value(data)
+
+
+def detect_format(filename, default='csv'):
+    for fmt, suffixes in (('csv', ('.csv',)), ('jsonl', ('.jsonl', '.ndjson')), ('json', ('.json',))):
+        if filename and filename.lower().endswith(suffixes):
+            return fmt
+    return default
+
+
+def iter_json_array(fh, chunk_size=64 * 1024):
+    """Yield the items of a top-level JSON array without loading it whole."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    eof = False
+    while True:
+        buffer = buffer.lstrip()
+        if not started:
+            if buffer:
+                if buffer[0] != '[':
+                    raise ValueError('Expected a JSON array of menu items.')
+                buffer = buffer[1:]
+                started = True
+                continue
+        elif buffer.startswith(','):
+            buffer = buffer[1:]
+            continue
+        elif buffer.startswith(']'):
+            return
+        elif buffer:
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except ValueError:
+                if eof:
+                    raise
+            else:
+                yield item
+                buffer = buffer[end:]
+                continue
+        if eof:
+            raise ValueError('Unexpected end of JSON input.')
+        data = fh.read(chunk_size)
+        if not data:
+            eof = True
+        buffer += data
+
+
+def iter_rows(fh, fmt):
+    """Rows of a text stream as dicts."""
+    if fmt == 'csv':
+        yield from csv.DictReader(fh)
+    elif fmt == 'jsonl':
+        for line in fh:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        yield from iter_json_array(fh)
+
+
+def text_stream(binary):
+    return io.TextIOWrapper(binary, encoding='utf-8-sig', newline='')
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def import_menu(rows, dry_run=False, chunk_size=CHUNK_SIZE):
+    """
+    Upsert menu items from an iterable of row dicts.
+
+    Returns ``{'rows', 'created', 'updated', 'categories_created', 'errors'}``
+    where ``errors`` lists ``{'row': n, 'errors': ...}`` (1-based). Valid rows
+    are applied even if others fail; ``dry_run`` rolls everything back.
+    """
+    report = {'rows': 0, 'created': 0, 'updated': 0, 'categories_created': 0, 'errors': []}
+    error_count = 0
+    images_changed = False
+    categories = {category.name: category for category in Category.objects.all()}
+
+    with transaction.atomic():
+        for chunk in chunked(enumerate(rows, 1), chunk_size):
+            valid = []
+            for number, row in chunk:
+                report['rows'] += 1
+                serializer = MenuImportRowSerializer(data=row)
+                if serializer.is_valid():
+                    valid.append((number, serializer.validated_data))
+                else:
+                    error_count += 1
+                    if len(report['errors']) < MAX_REPORTED_ERRORS:
+                        report['errors'].append({'row': number, 'errors': serializer.errors})
+            if valid:
+                images_changed = images_changed or any('image' in data for _, data in valid)
+                report['categories_created'] += _create_categories(categories, valid)
+                created, updated, errors = _upsert_items(categories, valid)
+                report['created'] += created
+                report['updated'] += updated
+                error_count += len(errors)
+                report['errors'].extend(errors[:MAX_REPORTED_ERRORS - len(report['errors'])])
+
+        if dry_run:
+            transaction.set_rollback(True)
+
+    report['error_count'] = error_count
+    if not dry_run and (report['created'] or report['updated'] or report['categories_created']):
+        bump_menu_version()
+    if not dry_run and images_changed:
+        for item in stale(MenuItem):
+            schedule_image_variants(item)
+    return report
+
+
+def _create_categories(categories, valid):
+    missing = {data['category'] for _, data in valid} - categories.keys()
+    if not missing:
+        return 0
+    created = Category.objects.bulk_create([Category(name=name) for name in sorted(missing)])
+    if any(category.pk is None for category in created):
+        # Backends that can't return ids from bulk inserts.
+        created = Category.objects.filter(name__in=missing)
+    categories.update({category.name: category for category in created})
+    return len(missing)
+
+
+def _upsert_items(categories, valid):
+    """Write one chunk; returns ``(created, updated, errors)``."""
+    ids = {data['id'] for _, data in valid if data.get('id')}
+    names = {data['name'] for _, data in valid if not data.get('id')}
+    by_id = MenuItem.objects.in_bulk(ids) if ids else {}
+    by_name = {}
+    if names:
+        for item in MenuItem.objects.filter(name__in=names):
+            by_name.setdefault((item.category_id, item.name), item)
+
+    to_create, to_update, errors = [], {}, []
+    for number, data in valid:
+        category = categories[data['category']]
+        if data.get('id'):
+            item = by_id.get(data['id'])
+            if item is None:
+                errors.append({'row': number, 'errors': {'id': ['No menu item with this id.']}})
+                continue
+            item.name = data['name']
+            to_update[item.pk] = item
+        else:
+            item = by_name.get((category.pk, data['name']))
+            if item is None:
+                item = MenuItem(name=data['name'])
+                by_name[(category.pk, data['name'])] = item
+                to_create.append(item)
+            elif item.pk:
+                to_update[item.pk] = item
+        item.category = category
+        for field in UPDATE_FIELDS:
+            if field != 'category' and field in data:
+                setattr(item, field, data[field])
+
+    MenuItem.objects.bulk_create(to_create)
+    MenuItem.objects.bulk_update(list(to_update.values()), UPDATE_FIELDS + ['name'])
+    return len(to_create), len(to_update), errors
+
+
+def export_rows():
+    """Every menu item as a dict of ``EXPORT_FIELDS``, streamed from the database."""
+    for row in MenuItem.objects.order_by('category__sort_order', 'category__name', 'name').values(
+        'id', 'category__name', 'name', 'description', 'price', 'available',
+        'is_popular', 'preparation_time', 'station', 'image',
+    ).iterator(chunk_size=2000):
+        row['category'] = row.pop('category__name')
+        row['price'] = str(row['price'])
+        yield {field: row[field] for field in EXPORT_FIELDS}
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def export_lines(fmt):
+    """Encoded export, one piece at a time (for streaming responses and files)."""
+    if fmt == 'csv':
+        writer = csv.DictWriter(_Echo(), fieldnames=EXPORT_FIELDS)
+        yield writer.writeheader()
+        for row in export_rows():
+            yield writer.writerow(row)
+    elif fmt == 'jsonl':
+        for row in export_rows():
+            yield json.dumps(row) + '\n'
+    else:
+        yield '['
+        for index, row in enumerate(export_rows()):
+            yield (',\n' if index else '\n') + json.dumps(row)
+        yield '\n]\n'
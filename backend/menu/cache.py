@@ -0,0 +1,49 @@
+"""
+Version-keyed cache for public menu responses.
+
+Every cached entry embeds the current menu version in its key, so one
+``bump_menu_version()`` invalidates all of them at once. Single-row edits
+bump through model signals; bulk imports bypass signals and bump once at
+the end.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from backend.metrics import CACHE_REQUESTS
+
+
+VERSION_KEY = 'menu:version'
+
+
+def menu_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, 1, None)
+        version = cache.get(VERSION_KEY, 1)
+    return version
+
+
+def bump_menu_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 2, None)
+
+
+def cached_menu(name, params, build):
+    """Cached result of ``build()`` for this endpoint name and query params."""
+    query = '&'.join(f'{k}={v}' for k, v in sorted(params.items()))
+    key = f"menu:v{menu_version()}:{name}:{hashlib.md5(query.encode()).hexdigest()}"
+    data = cache.get(key)
+    CACHE_REQUESTS.labels('menu', 'miss' if data is None else 'hit').inc()
+    if data is None:
+        data = build()
+        cache.set(key, data, getattr(settings, 'MENU_CACHE_SECONDS', 300))
+    return data
+
+
+def handle_menu_changed(sender, **kwargs):
+    """post_save / post_delete receiver for Category and MenuItem."""
+    bump_menu_version()
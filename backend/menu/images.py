@@ -0,0 +1,202 @@
+"""
+Resized WebP and JPEG variants of menu images.
+
+Each uploaded image is rendered once into a few sizes (``VARIANT_SIZES``)
+and both formats, and the stored names are kept on the model in
+``image_variants`` so serializers can hand out a thumbnail instead of the
+full photo. Variant files live under a hash of the source bytes, so the
+same photo uploaded twice (or to two items) is only rendered and stored
+once.
+
+Saving a new image schedules the work after commit: inline by default, or
+on a small thread pool when ``MENU_IMAGE_VARIANTS_ASYNC`` is set.
+``manage.py build_menu_images`` backfills anything left without variants.
+Images stored as remote URLs (e.g. from ``import_food``) are not resized.
+"""
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from PIL import Image, ImageOps
+
+from .cache import bump_menu_version
+
+
+logger = logging.getLogger(__name__)
+
+
+# Bump when resizing or encoding changes, so existing variants are rebuilt.
+VARIANT_VERSION = 1
+
+# Longest side in pixels; images are never upscaled.
+VARIANT_SIZES = {
+    'thumb': 160,
+    'card': 480,
+    'large': 1200,
+}
+
+ENCODERS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+_executor = None
+
+
+def is_remote(name):
+    return name.startswith(('http://', 'https://'))
+
+
+def variant_name(digest, variant, fmt):
+    return f'menu/variants/{digest[:2]}/{digest}/{variant}.{fmt}'
+
+
+def render_variants(data):
+    """Yield ``(variant, fmt, bytes)`` for every size and format of ``data``."""
+    with Image.open(BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        image.load()
+
+    has_alpha = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+    if has_alpha:
+        flat = Image.new('RGB', image.size, 'white')
+        flat.paste(image, mask=image.getchannel('A'))
+    else:
+        flat = image
+
+    for variant, size in VARIANT_SIZES.items():
+        for fmt, (pil_format, options) in ENCODERS.items():
+            # JPEG has no alpha channel; WebP keeps it.
+            resized = (image if fmt == 'webp' else flat).copy()
+            resized.thumbnail((size, size), Image.LANCZOS)
+            buffer = BytesIO()
+            resized.save(buffer, format=pil_format, **options)
+            yield variant, fmt, buffer.getvalue()
+
+
+def build_variants(field_file):
+    """
+    Render and store the variants of an image field's file.
+
+    Returns the ``image_variants`` value: the source name, the content
+    hash and ``{variant: {fmt: stored name}}``. Nothing is rendered when
+    every variant for this content already exists in storage.
+    """
+    storage = field_file.storage
+    with field_file.open('rb') as fh:
+        data = fh.read()
+    digest = hashlib.sha256(data + f':v{VARIANT_VERSION}'.encode()).hexdigest()
+
+    files = {
+        variant: {fmt: variant_name(digest, variant, fmt) for fmt in ENCODERS}
+        for variant in VARIANT_SIZES
+    }
+    missing = {
+        name for formats in files.values() for name in formats.values()
+        if not storage.exists(name)
+    }
+    if missing:
+        for variant, fmt, body in render_variants(data):
+            name = files[variant][fmt]
+            if name in missing:
+                files[variant][fmt] = storage.save(name, ContentFile(body))
+
+    return {'source': field_file.name, 'hash': digest, 'files': files}
+
+
+def needs_variants(instance):
+    name = instance.image.name if instance.image else ''
+    return (instance.image_variants or {}).get('source', '') != name
+
+
+def update_image_variants(instance, force=False):
+    """
+    Bring ``instance.image_variants`` in line with its image.
+
+    The row is written with a conditional UPDATE (no signals), so a newer
+    upload that landed meanwhile is never overwritten. Returns True if the
+    row changed.
+    """
+    if not force and not needs_variants(instance):
+        return False
+
+    name = instance.image.name if instance.image else ''
+    if not name:
+        variants = {}
+    elif is_remote(name):
+        variants = {'source': name}
+    else:
+        variants = build_variants(instance.image)
+
+    rows = type(instance).objects.filter(pk=instance.pk)
+    rows = rows.filter(image=name) if name else rows.filter(Q(image='') | Q(image=None))
+    if not rows.update(image_variants=variants):
+        return False
+    instance.image_variants = variants
+    bump_menu_version()
+    return True
+
+
+def _run(model, pk):
+    try:
+        instance = model.objects.filter(pk=pk).first()
+        if instance is not None:
+            update_image_variants(instance)
+    except Exception:
+        logger.exception("Building image variants for %s %s failed", model.__name__, pk)
+    finally:
+        close_old_connections()
+
+
+def schedule_image_variants(instance):
+    """Build variants for ``instance`` once the current transaction commits."""
+    model, pk = type(instance), instance.pk
+
+    def start():
+        global _executor
+        if not getattr(settings, 'MENU_IMAGE_VARIANTS_ASYNC', False):
+            _run(model, pk)
+            return
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'MENU_IMAGE_WORKERS', 2),
+                thread_name_prefix='menu-images',
+            )
+        _executor.submit(_run, model, pk)
+
+    transaction.on_commit(start)
+
+
+def handle_image_saved(sender, instance, raw=False, **kwargs):
+    """post_save receiver for Category and MenuItem."""
+    if not raw and needs_variants(instance):
+        schedule_image_variants(instance)
+
+
+def stale(model):
+    """Rows of ``model`` whose variants don't match their current image."""
+    rows = model.objects.only('pk', 'image', 'image_variants').iterator()
+    return [row for row in rows if needs_variants(row)]
+
+
+def variant_urls(variants, request=None):
+    """``{variant: {fmt: url}}`` for a stored ``image_variants`` value, or None."""
+    files = (variants or {}).get('files')
+    if not files:
+        return None
+
+    def url(name):
+        value = default_storage.url(name)
+        return request.build_absolute_uri(value) if request is not None else value
+
+    return {
+        variant: {fmt: url(name) for fmt, name in formats.items()}
+        for variant, formats in files.items()
+    }
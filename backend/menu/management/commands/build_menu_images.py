@@ -0,0 +1,35 @@
+"""
+Build resized WebP/JPEG variants for menu images that don't have them.
+
+New uploads get variants automatically; run this after deploying the
+pipeline, after a bulk import, or with ``--force`` after changing sizes.
+
+Usage:
+    python manage.py build_menu_images
+    python manage.py build_menu_images --force
+"""
+from django.core.management.base import BaseCommand
+
+from menu.images import stale, update_image_variants
+from menu.models import Category, MenuItem
+
+
+class Command(BaseCommand):
+    help = 'Build resized image variants for categories and menu items'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Rebuild variants for every image')
+
+    def handle(self, *args, **options):
+        for model in (Category, MenuItem):
+            rows = model.objects.all() if options['force'] else stale(model)
+            built = failed = 0
+            for row in rows:
+                try:
+                    built += update_image_variants(row, force=options['force'])
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f"  {model.__name__} {row.pk} ({row.image.name}): {e}")
+            self.stdout.write(self.style.SUCCESS(
+                f"{model._meta.verbose_name_plural}: {built} updated, {failed} failed"
+            ))
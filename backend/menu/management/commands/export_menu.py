@@ -0,0 +1,31 @@
+"""
+Export every menu item as CSV, JSON or JSON Lines.
+
+The output round-trips through ``import_menu``.
+
+Usage:
+    python manage.py export_menu --output menu.csv
+    python manage.py export_menu --format jsonl > menu.jsonl
+"""
+from django.core.management.base import BaseCommand
+
+from menu.bulk import FORMATS, detect_format, export_lines
+
+
+class Command(BaseCommand):
+    help = 'Export menu items to CSV, JSON or JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the output extension, else csv')
+        parser.add_argument('--output', help='File to write (default: stdout)')
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or detect_format(options['output'])
+        if not options['output']:
+            for piece in export_lines(fmt):
+                self.stdout.write(piece, ending='')
+            return
+
+        with open(options['output'], 'w', encoding='utf-8', newline='') as fh:
+            fh.writelines(export_lines(fmt))
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
@@ -0,0 +1,55 @@
+"""
+Bulk upsert menu items from a CSV, JSON or JSON Lines file.
+
+Rows are matched to existing items by ``id`` or by (category, name);
+categories are created as needed. The file is streamed and written in
+chunks, so large menus don't need to fit in memory.
+
+Usage:
+    python manage.py import_menu menu.csv
+    python manage.py import_menu menu.json --dry-run
+"""
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from menu.bulk import CHUNK_SIZE, FORMATS, detect_format, import_menu, iter_rows
+
+
+class Command(BaseCommand):
+    help = 'Bulk import menu items from CSV, JSON or JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import (- for stdin)')
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension, else csv')
+        parser.add_argument('--dry-run', action='store_true', help='Validate without saving')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or detect_format(path)
+        try:
+            if path == '-':
+                report = self._import(sys.stdin, fmt, options)
+            else:
+                with open(path, encoding='utf-8-sig', newline='') as fh:
+                    report = self._import(fh, fmt, options)
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Could not read {path}: {e}')
+
+        for error in report['errors']:
+            self.stderr.write(f"  row {error['row']}: {json.dumps(error['errors'])}")
+        if report['error_count'] > len(report['errors']):
+            self.stderr.write(f"  ... and {report['error_count'] - len(report['errors'])} more")
+
+        prefix = '[dry run] ' if options['dry_run'] else ''
+        summary = (
+            f"{prefix}{report['rows']} rows: {report['created']} created, "
+            f"{report['updated']} updated, {report['categories_created']} categories created, "
+            f"{report['error_count']} errors"
+        )
+        self.stdout.write(self.style.WARNING(summary) if report['error_count'] else self.style.SUCCESS(summary))
+
+    def _import(self, fh, fmt, options):
+        return import_menu(iter_rows(fh, fmt), dry_run=options['dry_run'], chunk_size=options['chunk_size'])
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-19 19:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('menu', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='station',
+            field=models.SlugField(default='kitchen', help_text='Kitchen station that prepares this category (e.g. grill, bar)', max_length=30),
+        ),
+        migrations.AddField(
+            model_name='menuitem',
+            name='station',
+            field=models.SlugField(blank=True, help_text="Overrides the category's station when set", max_length=30),
+        ),
+    ]
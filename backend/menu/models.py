@@ -5,9 +5,16 @@ class Category(models.Model):
     """Menu category (e.g., Burgers, Drinks, Specials)"""
     name = models.CharField(max_length=100)
     image = models.ImageField(upload_to='categories/', blank=True, null=True)
+    # Resized WebP/JPEG copies of ``image``; see menu.images.
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     description = models.TextField(blank=True)
     sort_order = models.IntegerField(default=0)
     is_active = models.BooleanField(default=True)
+    station = models.SlugField(
+        max_length=30,
+        default='kitchen',
+        help_text='Kitchen station that prepares this category (e.g. grill, bar)',
+    )
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -25,6 +32,7 @@ class MenuItem(models.Model):
     description = models.TextField(blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     image = models.ImageField(upload_to='items/', blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     category = models.ForeignKey(
         Category,
         on_delete=models.CASCADE,
@@ -33,6 +41,11 @@ class MenuItem(models.Model):
     available = models.BooleanField(default=True)
     is_popular = models.BooleanField(default=False)
     preparation_time = models.IntegerField(default=15, help_text='Estimated prep time in minutes')
+    station = models.SlugField(
+        max_length=30,
+        blank=True,
+        help_text="Overrides the category's station when set",
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -42,3 +55,8 @@ class MenuItem(models.Model):
 
     def __str__(self):
         return f'{self.name} — {self.price} ETB'
+
+    @property
+    def kitchen_station(self):
+        """Station whose display receives this item."""
+        return self.station or self.category.station
@@ -1,27 +1,39 @@
 from rest_framework import serializers
+from .images import variant_urls
 from .models import Category, MenuItem
 
 
+class ImageVariantsField(serializers.ReadOnlyField):
+    """URLs of an image's resized variants: ``{'thumb': {'webp': ..., 'jpeg': ...}, ...}``."""
+
+    def to_representation(self, value):
+        return variant_urls(value, self.context.get('request'))
+
+
 class CategorySerializer(serializers.ModelSerializer):
     item_count = serializers.SerializerMethodField()
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Category
-        fields = ['id', 'name', 'image', 'description', 'sort_order', 'is_active', 'item_count']
+        fields = ['id', 'name', 'image', 'image_variants', 'description', 'sort_order', 'is_active', 'station', 'item_count']
 
     def get_item_count(self, obj):
+        if hasattr(obj, 'available_item_count'):
+            return obj.available_item_count
         return obj.items.filter(available=True).count()
 
 
 class MenuItemSerializer(serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = MenuItem
         fields = [
-            'id', 'name', 'description', 'price', 'image',
+            'id', 'name', 'description', 'price', 'image', 'image_variants',
             'category', 'category_name', 'available',
-            'is_popular', 'preparation_time',
+            'is_popular', 'preparation_time', 'station',
         ]
 
 
@@ -30,5 +42,5 @@ class MenuItemCreateSerializer(serializers.ModelSerializer):
         model = MenuItem
         fields = [
             'name', 'description', 'price', 'image',
-            'category', 'available', 'is_popular', 'preparation_time',
+            'category', 'available', 'is_popular', 'preparation_time', 'station',
         ]
@@ -0,0 +1,198 @@
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from users.models import User
+
+from . import images
+from .models import Category, MenuItem
+
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MenuTestCase(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = APIClient()
+
+
+def png(size=(800, 600), color='red'):
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, format='PNG')
+    return ContentFile(buffer.getvalue(), name='photo.png')
+
+
+class MenuImportTests(MenuTestCase):
+    url = '/api/menu/import/?file_format=csv'
+    csv = (
+        'category,name,price,preparation_time\n'
+        'Mains,Tibs,120.00,15\n'
+        'Mains,Shiro,90.00,\n'
+        'Drinks,Buna,,\n'
+    )
+
+    def post(self, url=None):
+        return self.client.generic('POST', url or self.url, self.csv, content_type='text/csv')
+
+    def login(self, role):
+        self.client.force_authenticate(User.objects.create_user(role, password='x', role=role))
+
+    def test_anonymous_request_is_rejected(self):
+        self.assertEqual(self.post().status_code, 401)
+        self.assertFalse(MenuItem.objects.exists())
+
+    def test_only_admins_may_import_or_export(self):
+        self.login('cashier')
+        self.assertEqual(self.post().status_code, 403)
+        self.assertEqual(self.client.get('/api/menu/export/').status_code, 403)
+
+    def test_admin_import_reports_rows(self):
+        self.login('admin')
+        response = self.post()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['categories_created'], 1)
+        self.assertEqual(response.data['error_count'], 1)
+        self.assertEqual(response.data['errors'][0]['row'], 3)
+        self.assertEqual(MenuItem.objects.get(name='Tibs').preparation_time, 15)
+
+    def test_second_import_updates_in_place(self):
+        self.login('admin')
+        self.post()
+        response = self.post()
+        self.assertEqual(response.data['created'], 0)
+        self.assertEqual(response.data['updated'], 2)
+        self.assertEqual(MenuItem.objects.count(), 2)
+
+    def test_rows_that_are_not_objects_are_row_errors(self):
+        self.login('admin')
+        response = self.client.generic(
+            'POST', '/api/menu/import/?file_format=json',
+            '[1, "x", null, {"category": "Mains", "name": "Tibs", "price": "120.00"}]',
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual([error['row'] for error in response.data['errors']], [1, 2, 3])
+
+    def test_jsonl_line_that_is_not_an_object(self):
+        self.login('admin')
+        response = self.client.generic(
+            'POST', '/api/menu/import/?file_format=jsonl', '[1, 2]\n', content_type='application/x-ndjson',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error_count'], 1)
+        self.assertIn('non_field_errors', response.data['errors'][0]['errors'])
+
+    def test_dry_run_saves_nothing(self):
+        self.login('admin')
+        response = self.post(self.url + '&dry_run=true')
+        self.assertEqual(response.data['created'], 2)
+        self.assertFalse(MenuItem.objects.exists())
+        self.assertFalse(Category.objects.exists())
+
+
+class MenuCacheTests(MenuTestCase):
+    url = '/api/menu/items/'
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.category = Category.objects.create(name='Mains')
+        MenuItem.objects.create(name='Tibs', price='120.00', category=self.category)
+
+    def names(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results'] if isinstance(response.data, dict) else response.data
+        return sorted(item['name'] for item in results)
+
+    def test_second_request_is_served_from_cache(self):
+        self.names()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names(), ['Tibs'])
+
+    def test_edit_invalidates_cached_lists(self):
+        self.assertEqual(self.names(), ['Tibs'])
+        self.assertEqual(self.names(all='true'), ['Tibs'])
+        MenuItem.objects.create(name='Shiro', price='90.00', category=self.category)
+        self.assertEqual(self.names(), ['Shiro', 'Tibs'])
+        self.assertEqual(self.names(all='true'), ['Shiro', 'Tibs'])
+
+    def test_import_invalidates_cached_lists(self):
+        self.names()
+        self.client.force_authenticate(User.objects.create_user('admin', password='x', role='admin'))
+        self.client.generic(
+            'POST', '/api/menu/import/?file_format=jsonl',
+            '{"category": "Mains", "name": "Shiro", "price": "90.00"}\n',
+            content_type='application/x-ndjson',
+        )
+        self.assertEqual(self.names(), ['Shiro', 'Tibs'])
+
+
+class ImageVariantTests(MenuTestCase):
+    def setUp(self):
+        super().setUp()
+        self.category = Category.objects.create(name='Mains')
+
+    def add_item(self, name, image):
+        with self.captureOnCommitCallbacks(execute=True):
+            item = MenuItem.objects.create(name=name, price='100.00', category=self.category, image=image)
+        item.refresh_from_db()
+        return item
+
+    def test_upload_builds_every_variant(self):
+        item = self.add_item('Tibs', png())
+        variants = item.image_variants
+        self.assertEqual(variants['source'], item.image.name)
+        self.assertEqual(set(variants['files']), set(images.VARIANT_SIZES))
+        for variant, formats in variants['files'].items():
+            self.assertEqual(set(formats), set(images.ENCODERS))
+            for name in formats.values():
+                self.assertTrue(default_storage.exists(name))
+        with default_storage.open(variants['files']['thumb']['webp']) as fh, Image.open(fh) as thumb:
+            self.assertEqual(thumb.size, (160, 120))
+        with default_storage.open(variants['files']['large']['jpeg']) as fh, Image.open(fh) as large:
+            # Never upscaled.
+            self.assertEqual(large.size, (800, 600))
+
+    def test_same_photo_is_rendered_once(self):
+        first = self.add_item('Tibs', png())
+        with mock.patch.object(images, 'render_variants', wraps=images.render_variants) as render:
+            second = self.add_item('Shiro', png())
+        render.assert_not_called()
+        self.assertNotEqual(second.image.name, first.image.name)
+        self.assertEqual(second.image_variants['files'], first.image_variants['files'])
+
+    def test_remote_images_are_left_alone(self):
+        item = self.add_item('Tibs', 'https://cdn.example/tibs.jpg')
+        self.assertEqual(item.image_variants, {'source': 'https://cdn.example/tibs.jpg'})
+
+    def test_import_builds_variants_for_changed_images(self):
+        item = self.add_item('Tibs', None)
+        name = default_storage.save('items/imported.png', png(color='blue'))
+        self.client.force_authenticate(User.objects.create_user('admin', password='x', role='admin'))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.generic(
+                'POST', '/api/menu/import/?file_format=jsonl',
+                f'{{"category": "Mains", "name": "Tibs", "price": "100.00", "image": "{name}"}}\n',
+                content_type='application/x-ndjson',
+            )
+        self.assertEqual(response.data['updated'], 1)
+        item.refresh_from_db()
+        self.assertEqual(item.image_variants['source'], name)
+        self.assertIn('thumb', item.image_variants['files'])
@@ -4,6 +4,8 @@ from .views import (
     CategoryDetailView,
     MenuItemListView,
     MenuItemDetailView,
+    MenuImportView,
+    MenuExportView,
 )
 
 urlpatterns = [
@@ -11,4 +13,6 @@ urlpatterns = [
     path('categories/<int:pk>/', CategoryDetailView.as_view(), name='category-detail'),
     path('items/', MenuItemListView.as_view(), name='menu-item-list'),
     path('items/<int:pk>/', MenuItemDetailView.as_view(), name='menu-item-detail'),
+    path('import/', MenuImportView.as_view(), name='menu-import'),
+    path('export/', MenuExportView.as_view(), name='menu-export'),
 ]
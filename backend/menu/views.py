@@ -1,8 +1,16 @@
+import io
+
+from django.db.models import Count, Q
+from django.http import StreamingHttpResponse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import AllowAny, IsAuthenticated
 
+from users.permissions import IsAdminRole
+
+from .bulk import FORMATS, detect_format, export_lines, import_menu, iter_rows, text_stream
+from .cache import cached_menu
 from .models import Category, MenuItem
 from .serializers import CategorySerializer, MenuItemSerializer, MenuItemCreateSerializer
 
@@ -12,9 +20,13 @@ class CategoryListView(APIView):
     permission_classes = [AllowAny]
 
     def get(self, request):
-        categories = Category.objects.filter(is_active=True)
-        serializer = CategorySerializer(categories, many=True)
-        return Response(serializer.data)
+        def build():
+            categories = Category.objects.filter(is_active=True).annotate(
+                available_item_count=Count('items', filter=Q(items__available=True)),
+            )
+            return list(CategorySerializer(categories, many=True).data)
+
+        return Response(cached_menu('categories', {}, build))
 
     def post(self, request):
         serializer = CategorySerializer(data=request.data)
@@ -62,30 +74,32 @@ class MenuItemListView(APIView):
     permission_classes = [AllowAny]
 
     def get(self, request):
-        items = MenuItem.objects.select_related('category')
+        def build():
+            items = MenuItem.objects.select_related('category')
+
+            # By default only show available items; admin can pass ?all=true
+            show_all = request.query_params.get('all')
+            if show_all != 'true':
+                items = items.filter(available=True)
 
-        # By default only show available items; admin can pass ?all=true
-        show_all = request.query_params.get('all')
-        if show_all != 'true':
-            items = items.filter(available=True)
+            # Filter by category
+            category_id = request.query_params.get('category')
+            if category_id:
+                items = items.filter(category_id=category_id)
 
-        # Filter by category
-        category_id = request.query_params.get('category')
-        if category_id:
-            items = items.filter(category_id=category_id)
+            # Search
+            search = request.query_params.get('search')
+            if search:
+                items = items.filter(name__icontains=search)
 
-        # Search
-        search = request.query_params.get('search')
-        if search:
-            items = items.filter(name__icontains=search)
+            # Popular filter
+            popular = request.query_params.get('popular')
+            if popular == 'true':
+                items = items.filter(is_popular=True)
 
-        # Popular filter
-        popular = request.query_params.get('popular')
-        if popular == 'true':
-            items = items.filter(is_popular=True)
+            return list(MenuItemSerializer(items, many=True).data)
 
-        serializer = MenuItemSerializer(items, many=True)
-        return Response(serializer.data)
+        return Response(cached_menu('items', request.query_params.dict(), build))
 
     def post(self, request):
         serializer = MenuItemCreateSerializer(data=request.data)
@@ -129,3 +143,63 @@ class MenuItemDetailView(APIView):
             return Response(status=status.HTTP_404_NOT_FOUND)
         item.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class MenuImportView(APIView):
+    """
+    Bulk upsert menu items from a CSV, JSON or JSON Lines file.
+
+    Send the file as multipart ``file`` or as the raw request body with
+    ``?file_format=``. ``?dry_run=true`` validates without saving.
+    (``format`` is taken by DRF's renderer override.)
+    """
+    permission_classes = [IsAuthenticated, IsAdminRole]
+
+    def post(self, request):
+        if request.content_type.startswith('multipart/'):
+            upload = request.FILES.get('file')
+            if upload is None:
+                return Response({'error': 'file is required'}, status=status.HTTP_400_BAD_REQUEST)
+            source, filename = upload.file, upload.name
+        else:
+            source, filename = io.BytesIO(request.body), ''
+
+        fmt = request.query_params.get('file_format') or detect_format(filename)
+        if fmt not in FORMATS:
+            return Response(
+                {'error': f"file_format must be one of {', '.join(FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        dry_run = request.query_params.get('dry_run') == 'true'
+
+        try:
+            report = import_menu(iter_rows(text_stream(source), fmt), dry_run=dry_run)
+        except (ValueError, UnicodeDecodeError) as e:
+            return Response({'error': f'Could not read file: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        report['dry_run'] = dry_run
+        code = status.HTTP_400_BAD_REQUEST if report['error_count'] and not (
+            report['created'] or report['updated']
+        ) else status.HTTP_200_OK
+        return Response(report, status=code)
+
+
+class MenuExportView(APIView):
+    """Stream every menu item as CSV (default), JSON or JSON Lines."""
+    permission_classes = [IsAuthenticated, IsAdminRole]
+
+    def get(self, request):
+        fmt = request.query_params.get('file_format', 'csv')
+        if fmt not in FORMATS:
+            return Response(
+                {'error': f"file_format must be one of {', '.join(FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        content_types = {
+            'csv': 'text/csv',
+            'json': 'application/json',
+            'jsonl': 'application/x-ndjson',
+        }
+        response = StreamingHttpResponse(export_lines(fmt), content_type=content_types[fmt])
+        response['Content-Disposition'] = f'attachment; filename="menu.{fmt}"'
+        return response
@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Table, Order, OrderItem
+from django.http import JsonResponse
+from django.urls import path, reverse
+from .models import Table, Order, OrderItem, OrderEvent, StripeEvent
 
 
 class OrderItemInline(admin.TabularInline):
@@ -20,10 +22,34 @@ class TableAdmin(admin.ModelAdmin):
 
     @admin.action(description='Generate QR codes for selected tables')
     def generate_qr_codes(self, request, queryset):
+        from .qr import start_qr_job
+
         base_url = request.build_absolute_uri('/').rstrip('/')
-        for table in queryset:
-            table.generate_qr_code(base_url)
-        self.message_user(request, f"QR codes generated for {queryset.count()} tables.")
+        table_ids = list(queryset.values_list('pk', flat=True))
+        job_id = start_qr_job(table_ids, base_url)
+        progress_url = reverse('admin:orders_table_qr_job', args=[job_id])
+        self.message_user(
+            request,
+            f"Generating QR codes for {len(table_ids)} tables in the background. "
+            f"Progress: {progress_url}",
+        )
+
+    def get_urls(self):
+        return [
+            path(
+                'qr-jobs/<str:job_id>/',
+                self.admin_site.admin_view(self.qr_job_progress),
+                name='orders_table_qr_job',
+            ),
+        ] + super().get_urls()
+
+    def qr_job_progress(self, request, job_id):
+        from .qr import qr_job_status
+
+        job = qr_job_status(job_id)
+        if job is None:
+            return JsonResponse({'error': 'Unknown or expired job.'}, status=404)
+        return JsonResponse(job)
 
 
 @admin.register(Order)
@@ -46,3 +72,19 @@ class OrderItemAdmin(admin.ModelAdmin):
     list_display = ('order', 'menu_item', 'quantity', 'unit_price', 'total_price')
     list_filter = ('order__status',)
     raw_id_fields = ('order', 'menu_item')
+
+
+@admin.register(OrderEvent)
+class OrderEventAdmin(admin.ModelAdmin):
+    list_display = ('order', 'from_status', 'to_status', 'actor', 'duration_seconds', 'created_at')
+    list_filter = ('to_status', 'created_at')
+    raw_id_fields = ('order', 'actor')
+    date_hierarchy = 'created_at'
+
+
+@admin.register(StripeEvent)
+class StripeEventAdmin(admin.ModelAdmin):
+    list_display = ('event_id', 'type', 'received_at', 'processed_at')
+    list_filter = ('type', 'processed_at')
+    search_fields = ('event_id',)
+    readonly_fields = ('event_id', 'type', 'payload', 'received_at', 'processed_at')
@@ -0,0 +1,160 @@
+"""
+"All-day" counts: how many of each menu item are still to be cooked.
+
+Each worker keeps a counter per (station, menu item) over active orders
+(pending, confirmed or cooking). New orders add their lines, orders that
+leave the queue subtract theirs, and every change is pushed to the
+``all_day`` group and to ``all_day_<station>``. Every
+``ALL_DAY_RELOAD_SECONDS`` the counters are reconciled against a single
+``GROUP BY`` so workers that missed a change converge.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Sum
+
+from .eta import QUEUED_STATUSES
+
+
+logger = logging.getLogger(__name__)
+
+ALL_DAY_GROUP = 'all_day'
+
+
+def all_day_group(station=None):
+    return f'{ALL_DAY_GROUP}_{station}' if station else ALL_DAY_GROUP
+
+
+class AllDayCounts:
+    """Pending quantity per (station, menu item) as seen by this worker."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {}  # (station, menu_item_id) -> quantity
+        self.names = {}   # menu_item_id -> name
+        self.loaded_at = None
+
+    def ensure_loaded(self):
+        """Reconcile if stale; returns the rows that moved, or None if fresh."""
+        reload_seconds = getattr(settings, 'ALL_DAY_RELOAD_SECONDS', 30)
+        if self.loaded_at is None or time.monotonic() - self.loaded_at > reload_seconds:
+            return self.reconcile()
+        return None
+
+    def reconcile(self):
+        """Replace the counters with one ``GROUP BY``; returns the rows that moved."""
+        from .models import OrderItem
+
+        counts = {}
+        names = {}
+        for row in OrderItem.objects.filter(
+            order__status__in=QUEUED_STATUSES,
+        ).values('station', 'menu_item_id', 'menu_item__name').annotate(
+            quantity=Sum('quantity'),
+        ).order_by():
+            counts[(row['station'], row['menu_item_id'])] = row['quantity']
+            names[row['menu_item_id']] = row['menu_item__name']
+
+        with self.lock:
+            moved = {
+                key for key in counts.keys() | self.counts.keys()
+                if counts.get(key, 0) != self.counts.get(key, 0)
+            }
+            if self.loaded_at is not None and moved:
+                logger.info("All-day counts drifted on %d item(s); reconciled", len(moved))
+            self.counts = counts
+            self.names.update(names)
+            self.loaded_at = time.monotonic()
+            return self._rows(moved)
+
+    def apply(self, lines, sign):
+        """
+        Add (``sign=1``) or remove (``sign=-1``) order lines.
+
+        ``lines`` is ``[(station, menu_item_id, name, quantity), ...]``.
+        Returns the rows that moved.
+        """
+        moved = set()
+        with self.lock:
+            for station, menu_item_id, name, quantity in lines:
+                key = (station, menu_item_id)
+                remaining = self.counts.get(key, 0) + sign * quantity
+                if remaining > 0:
+                    self.counts[key] = remaining
+                else:
+                    self.counts.pop(key, None)
+                self.names[menu_item_id] = name
+                moved.add(key)
+            return self._rows(moved)
+
+    def snapshot(self, station=None):
+        """Current counts, largest first."""
+        with self.lock:
+            keys = [key for key in self.counts if station is None or key[0] == station]
+            rows = self._rows(keys)
+        return sorted(rows, key=lambda row: (-row['quantity'], row['name']))
+
+    def _rows(self, keys):
+        return [
+            {
+                'station': station,
+                'menu_item_id': menu_item_id,
+                'name': self.names.get(menu_item_id, ''),
+                'quantity': self.counts.get((station, menu_item_id), 0),
+            }
+            for station, menu_item_id in keys
+        ]
+
+
+all_day_counts = AllDayCounts()
+
+
+def lines_for(order_ids):
+    """Order lines for ``AllDayCounts.apply``, read in one query."""
+    from .models import OrderItem
+
+    return list(OrderItem.objects.filter(order_id__in=order_ids).values_list(
+        'station', 'menu_item_id', 'menu_item__name', 'quantity',
+    ))
+
+
+def publish_all_day_changes(rows):
+    """Push moved counts to the all-day group and each station's group."""
+    if not rows:
+        return
+    from .notifications import publish_many
+
+    by_station = {}
+    for row in rows:
+        by_station.setdefault(row['station'], []).append(row)
+
+    publish_many([(all_day_group(), {'type': 'all_day_update', 'items': rows})] + [
+        (all_day_group(station), {'type': 'all_day_update', 'items': station_rows})
+        for station, station_rows in by_station.items()
+    ])
+
+
+def record_new_order(lines):
+    """Count a committed order's lines and publish the new totals."""
+    moved = all_day_counts.ensure_loaded()
+    if moved is None:
+        moved = all_day_counts.apply(lines, 1)
+    # else: the reconcile just run already counted the committed order.
+    publish_all_day_changes(moved)
+
+
+def handle_status_changed(sender, changes, **kwargs):
+    """``order_status_changed`` receiver: drop orders that left the queue."""
+    moved = all_day_counts.ensure_loaded()
+    if moved is not None:
+        publish_all_day_changes(moved)
+        return
+    leaving = [
+        change['order_id'] for change in changes
+        if change['from_status'] in QUEUED_STATUSES
+        and change['to_status'] not in QUEUED_STATUSES
+    ]
+    if leaving:
+        publish_all_day_changes(all_day_counts.apply(lines_for(leaving), -1))
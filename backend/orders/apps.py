@@ -5,3 +5,12 @@ class OrdersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'orders'
     verbose_name = 'Orders'
+
+    def ready(self):
+        from . import all_day, eta, stations
+        from .signals import count_status_changes, order_status_changed
+
+        order_status_changed.connect(eta.handle_status_changed, dispatch_uid='orders.eta')
+        order_status_changed.connect(stations.handle_status_changed, dispatch_uid='orders.stations')
+        order_status_changed.connect(all_day.handle_status_changed, dispatch_uid='orders.all_day')
+        order_status_changed.connect(count_status_changes, dispatch_uid='orders.metrics')
@@ -0,0 +1,81 @@
+"""
+Helpers shared by the load-test and benchmark management commands.
+
+Nothing here is imported by the request path.
+"""
+import gc
+import math
+import tracemalloc
+from contextlib import contextmanager
+
+from channels.layers import DEFAULT_CHANNEL_LAYER, InMemoryChannelLayer, channel_layers
+from django.db import connection
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of ``values`` (``pct`` in 0-100)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize_ms(samples):
+    """p50/p95/p99/max of a list of second-based samples, in milliseconds."""
+    return {
+        'count': len(samples),
+        'p50_ms': _ms(percentile(samples, 50)),
+        'p95_ms': _ms(percentile(samples, 95)),
+        'p99_ms': _ms(percentile(samples, 99)),
+        'max_ms': _ms(max(samples) if samples else None),
+    }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+@contextmanager
+def throwaway_database(verbosity=0):
+    """Run against a freshly migrated test database instead of the real one."""
+    old_name = connection.creation.create_test_db(
+        verbosity=verbosity,
+        autoclobber=True,
+        serialize=False,
+    )
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity)
+
+
+def use_in_memory_channel_layer(capacity=1000):
+    """Swap the default channel layer for a fresh in-process one."""
+    layer = InMemoryChannelLayer(capacity=capacity)
+    channel_layers.backends[DEFAULT_CHANNEL_LAYER] = layer
+    return layer
+
+
+class MemoryProbe:
+    """Python heap growth (via tracemalloc) across a block of work."""
+
+    def __init__(self):
+        self.baseline = 0
+        self.bytes = 0
+
+    def __enter__(self):
+        gc.collect()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.baseline = tracemalloc.get_traced_memory()[0]
+        return self
+
+    def sample(self):
+        gc.collect()
+        self.bytes = tracemalloc.get_traced_memory()[0] - self.baseline
+        return self.bytes
+
+    def __exit__(self, *exc):
+        tracemalloc.stop()
+        return False
@@ -0,0 +1,110 @@
+"""
+Table-level checkout.
+
+A party that placed several orders pays once: the unpaid, non-cancelled
+orders of a table are totalled with one aggregate query and settled with
+one conditional UPDATE (cash) or one PaymentIntent (card). Bills can also
+be split by line item; every split is computed from a single fetch of the
+table's lines.
+"""
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db.models import Count, DecimalField, F, Max, Min, Sum
+
+from .models import Order, OrderItem
+
+
+CENT = Decimal('0.01')
+
+
+def money(value):
+    return Decimal(value).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def unpaid_orders(table, order_ids=None):
+    orders = Order.objects.filter(table=table, payment_status='unpaid').exclude(status='cancelled')
+    if order_ids is not None:
+        orders = orders.filter(pk__in=order_ids)
+    return orders
+
+
+def bill_amounts(subtotal):
+    """
+    Subtotal, service charge and total for a bill, rounded once per bill.
+
+    The bill, its splits and the amount charged at checkout all come from
+    here, so what a guest is shown is what they pay.
+    """
+    subtotal = money(subtotal)
+    service_charge = money(subtotal * Order.SERVICE_CHARGE_RATE)
+    return {
+        'subtotal': subtotal,
+        'service_charge': service_charge,
+        'total': subtotal + service_charge,
+    }
+
+
+def bill_totals(orders):
+    """Order count, id range and money totals (two aggregate queries)."""
+    totals = orders.aggregate(
+        order_count=Count('id'),
+        first_order_id=Min('id'),
+        last_order_id=Max('id'),
+    )
+    subtotal = OrderItem.objects.filter(order__in=orders).aggregate(subtotal=Sum(
+        F('quantity') * F('unit_price'),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    ))['subtotal']
+    return {**totals, **bill_amounts(subtotal or 0)}
+
+
+def bill_lines(table):
+    """Every line on the table's unpaid orders, read in one query."""
+    return list(OrderItem.objects.filter(
+        order__in=unpaid_orders(table),
+    ).order_by('order_id', 'id').values(
+        'id', 'order_id', 'order__order_number', 'order__version',
+        'menu_item__name', 'quantity', 'unit_price', 'notes',
+    ))
+
+
+def line_total(line):
+    return line['quantity'] * line['unit_price']
+
+
+def summarize_lines(lines):
+    return bill_amounts(sum((line_total(line) for line in lines), Decimal(0)))
+
+
+def split_by_lines(lines, splits):
+    """
+    Totals for each group of line ids in ``splits``.
+
+    Lines left out of every split are returned as ``unassigned``. Raises
+    ``ValueError`` for unknown lines and for lines claimed twice, whether
+    by two splits or within one.
+    """
+    by_id = {line['id']: line for line in lines}
+    claimed = set()
+    results = []
+    for line_ids in splits:
+        unknown = set(line_ids) - by_id.keys()
+        if unknown:
+            raise ValueError(f"Unknown or already paid lines: {sorted(unknown)}")
+        seen = set()
+        repeated = {line_id for line_id in line_ids if line_id in seen or seen.add(line_id)}
+        repeated |= claimed & seen
+        if repeated:
+            raise ValueError(f"Lines claimed more than once: {sorted(repeated)}")
+        claimed.update(line_ids)
+        split_lines = [by_id[line_id] for line_id in line_ids]
+        results.append({'item_ids': list(line_ids), **summarize_lines(split_lines)})
+
+    unassigned = [line for line in lines if line['id'] not in claimed]
+    return {
+        'splits': results,
+        'unassigned': {
+            'item_ids': [line['id'] for line in unassigned],
+            **summarize_lines(unassigned),
+        },
+    }
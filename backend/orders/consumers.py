@@ -1,61 +1,134 @@
 import json
+from urllib.parse import parse_qs
+
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 
+from backend.metrics import (
+    WEBSOCKET_CONNECTIONS, WEBSOCKET_CONNECTS, WEBSOCKET_GROUP_SUBSCRIPTIONS,
+    WEBSOCKET_MESSAGES_RECEIVED, WEBSOCKET_MESSAGES_SENT,
+)
+from backend.profiling import sample_handler
+from users.permissions import IsKitchenStaff, has_role
+from .models import Order
+from .serializers import OrderSerializer, OrderStatusUpdateSerializer
+from .all_day import all_day_group
+from .notifications import apublish, group_kind
+from .stations import is_valid_station, station_group
+
 
 class OrderConsumer(AsyncWebsocketConsumer):
     """WebSocket consumer for real-time order updates."""
 
+    # Roles allowed to change order status over the socket.
+    STATUS_COMMAND_ROLES = IsKitchenStaff.roles
+    # Client message types counted by name; anything else is "other".
+    MESSAGE_TYPES = (
+        'join_kitchen', 'join_cashier', 'join_station', 'join_all_day', 'join_table',
+        'new_order', 'update_order_status', 'order_status_update', 'call_waiter',
+    )
+
+    # Extra groups joined automatically for token-authenticated staff.
+    ROLE_GROUPS = {
+        'admin': ('cashier',),
+        'cashier': ('cashier',),
+    }
+
     async def connect(self):
         self.table_number = self.scope['url_route']['kwargs'].get('table_number')
         self.groups_joined = []
 
-        # Join kitchen group (all orders)
-        await self.channel_layer.group_add('kitchen', self.channel_name)
-        self.groups_joined.append('kitchen')
+        # Station displays (?station=grill) only get their own tickets;
+        # everyone else joins the kitchen group (all orders).
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        station = query.get('station', [None])[0]
+        kitchen_group = station_group(station) if is_valid_station(station) else 'kitchen'
+        await self.join_group(kitchen_group)
 
         # Join table-specific group if table number provided
         if self.table_number:
-            table_group = f'table_{self.table_number}'
-            await self.channel_layer.group_add(table_group, self.channel_name)
-            self.groups_joined.append(table_group)
+            await self.join_group(f'table_{self.table_number}')
 
-        await self.accept()
+        for group in self.ROLE_GROUPS.get(self.scope.get('role'), ()):
+            await self.join_group(group)
+
+        # Echo the "bearer" subprotocol when the token came that way.
+        await self.accept(self.scope.get('auth_subprotocol'))
+        self.counted = True
+        WEBSOCKET_CONNECTIONS.inc()
+        WEBSOCKET_CONNECTS.labels(self.scope.get('role') or 'anonymous').inc()
 
         # Send connection confirmation
         await self.send(text_data=json.dumps({
             'type': 'connection_established',
             'message': 'Connected to DineQR order system',
             'table_number': self.table_number,
+            'role': self.scope.get('role'),
+            'groups': self.groups_joined,
         }))
 
     async def disconnect(self, close_code):
+        if getattr(self, 'counted', False):
+            WEBSOCKET_CONNECTIONS.dec()
         # Leave all groups
         for group in self.groups_joined:
             await self.channel_layer.group_discard(group, self.channel_name)
+            WEBSOCKET_GROUP_SUBSCRIPTIONS.labels(group_kind(group)).dec()
 
     async def receive(self, text_data):
         """Handle incoming WebSocket messages."""
         try:
             data = json.loads(text_data)
             message_type = data.get('type')
+            WEBSOCKET_MESSAGES_RECEIVED.labels(
+                message_type if message_type in self.MESSAGE_TYPES else 'other'
+            ).inc()
 
             if message_type == 'join_kitchen':
-                await self.channel_layer.group_add('kitchen', self.channel_name)
-                if 'kitchen' not in self.groups_joined:
-                    self.groups_joined.append('kitchen')
+                await self.join_group('kitchen')
                 await self.send(text_data=json.dumps({
                     'type': 'joined',
                     'group': 'kitchen',
                 }))
 
+            elif message_type == 'join_cashier':
+                await self.join_group('cashier')
+                await self.send(text_data=json.dumps({
+                    'type': 'joined',
+                    'group': 'cashier',
+                }))
+
+            elif message_type == 'join_station':
+                station = data.get('station')
+                if not is_valid_station(station):
+                    await self.send_error('Invalid station name.')
+                else:
+                    group = station_group(station)
+                    await self.join_group(group)
+                    await self.send(text_data=json.dumps({
+                        'type': 'joined',
+                        'group': group,
+                    }))
+
+            elif message_type == 'join_all_day':
+                # Live "14 burgers, 9 fries" board; optionally one station.
+                station = data.get('station')
+                if station and not is_valid_station(station):
+                    await self.send_error('Invalid station name.')
+                else:
+                    group = all_day_group(station)
+                    await self.join_group(group)
+                    await self.send(text_data=json.dumps({
+                        'type': 'joined',
+                        'group': group,
+                        'items': await self.get_all_day_counts(station),
+                    }))
+
             elif message_type == 'join_table':
                 table_num = data.get('table_number')
                 if table_num:
                     table_group = f'table_{table_num}'
-                    await self.channel_layer.group_add(table_group, self.channel_name)
-                    if table_group not in self.groups_joined:
-                        self.groups_joined.append(table_group)
+                    await self.join_group(table_group)
                     await self.send(text_data=json.dumps({
                         'type': 'joined',
                         'group': table_group,
@@ -63,45 +136,28 @@ class OrderConsumer(AsyncWebsocketConsumer):
 
             elif message_type == 'new_order':
                 # Broadcast new order to kitchen
-                await self.channel_layer.group_send(
+                await apublish(
                     'kitchen',
                     {
                         'type': 'new_order',
                         'order': data.get('order'),
-                    }
+                    },
+                    self.channel_layer,
                 )
 
-            elif message_type == 'order_status_update':
-                order_data = data.get('order', {})
-                table_number = data.get('table_number')
-
-                # Broadcast to kitchen
-                await self.channel_layer.group_send(
-                    'kitchen',
-                    {
-                        'type': 'order_status_update',
-                        'order': order_data,
-                    }
-                )
-                # Broadcast to specific table
-                if table_number:
-                    await self.channel_layer.group_send(
-                        f'table_{table_number}',
-                        {
-                            'type': 'order_status_update',
-                            'order': order_data,
-                        }
-                    )
+            elif message_type in ('update_order_status', 'order_status_update'):
+                await self.handle_status_command(data)
 
             elif message_type == 'call_waiter':
                 table_number = data.get('table_number')
-                await self.channel_layer.group_send(
+                await apublish(
                     'kitchen',
                     {
                         'type': 'waiter_call',
                         'table_number': table_number,
                         'message': data.get('message', 'Customer needs assistance'),
-                    }
+                    },
+                    self.channel_layer,
                 )
 
         except json.JSONDecodeError:
@@ -110,6 +166,107 @@ class OrderConsumer(AsyncWebsocketConsumer):
                 'message': 'Invalid JSON format',
             }))
 
+    async def handle_status_command(self, data):
+        """
+        Validate, persist and broadcast a kitchen status change.
+
+        Accepts ``{"type": "update_order_status", "order_id": 1,
+        "status": "cooking", "request_id": "..."}`` as well as the legacy
+        ``order_status_update`` shape (``{"order": {"order_id", "status"}}``).
+        The sender gets an ``order_status_ack`` carrying the new version.
+        """
+        request_id = data.get('request_id')
+        if not self._can_change_status():
+            await self.send_error('Authentication required to change order status.', request_id)
+            return
+
+        payload = data.get('order') or {}
+        order_id = data.get('order_id') or payload.get('order_id') or payload.get('id')
+        new_status = data.get('status') or payload.get('status')
+
+        order = await self.get_order(order_id)
+        if order is None:
+            await self.send_error('Order not found.', request_id)
+            return
+
+        serializer = OrderStatusUpdateSerializer(
+            data={'status': new_status, 'version': data.get('version')},
+            context={'order': order},
+        )
+        if not serializer.is_valid():
+            await self.send_error(serializer.errors, request_id)
+            return
+
+        old_status = order.status
+        if not await order.atransition_to(
+            serializer.validated_data['status'],
+            expected_version=serializer.validated_data.get('version'),
+            actor=self.scope.get('user'),
+        ):
+            await self.send_error('Order was updated by someone else. Refresh and retry.', request_id)
+            return
+
+        await self.send(text_data=json.dumps({
+            'type': 'order_status_ack',
+            'request_id': request_id,
+            'order_id': order.id,
+            'status': order.status,
+            'version': order.version,
+        }))
+
+        event = {
+            'type': 'order_status_update',
+            'order': OrderSerializer(order).data,
+            'old_status': old_status,
+        }
+        await apublish('kitchen', event, self.channel_layer)
+        await apublish(f'table_{order.table.number}', event, self.channel_layer)
+
+    async def dispatch(self, message):
+        # Everything that isn't socket plumbing is a channel-layer event
+        # being delivered to this client.
+        if not message['type'].startswith('websocket.'):
+            WEBSOCKET_MESSAGES_SENT.labels(message['type']).inc()
+        async with sample_handler(f"ws {message['type']}"):
+            await super().dispatch(message)
+
+    async def join_group(self, group):
+        """Subscribe to ``group`` once, counting the subscription by kind of group."""
+        await self.channel_layer.group_add(group, self.channel_name)
+        if group not in self.groups_joined:
+            self.groups_joined.append(group)
+            WEBSOCKET_GROUP_SUBSCRIPTIONS.labels(group_kind(group)).inc()
+
+    def _can_change_status(self):
+        return has_role(self.scope.get('user'), self.STATUS_COMMAND_ROLES)
+
+    @database_sync_to_async
+    def get_order(self, order_id):
+        """Load an order with everything the serializer touches."""
+        try:
+            return Order.objects.select_related('table').prefetch_related(
+                'items__menu_item'
+            ).get(pk=order_id)
+        except (Order.DoesNotExist, ValueError, TypeError):
+            return None
+
+    @database_sync_to_async
+    def get_all_day_counts(self, station):
+        """Current all-day board, so a new subscriber doesn't start empty."""
+        from .all_day import all_day_counts, publish_all_day_changes
+
+        moved = all_day_counts.ensure_loaded()
+        if moved:
+            publish_all_day_changes(moved)
+        return all_day_counts.snapshot(station)
+
+    async def send_error(self, message, request_id=None):
+        await self.send(text_data=json.dumps({
+            'type': 'error',
+            'message': message,
+            'request_id': request_id,
+        }))
+
     # === Group message handlers ===
 
     async def new_order(self, event):
@@ -131,6 +288,51 @@ class OrderConsumer(AsyncWebsocketConsumer):
         await self.send(text_data=json.dumps({
             'type': 'order_status_update',
             'order': event['order'],
+            'old_status': event.get('old_status'),
+        }))
+
+    async def bulk_status_update(self, event):
+        """Handle a batch of status changes sent as one message."""
+        await self.send(text_data=json.dumps({
+            'type': 'bulk_status_update',
+            'orders': event['orders'],
+            'updated_at': event.get('updated_at'),
+        }))
+
+    async def station_ticket(self, event):
+        """Handle a new order's items for one kitchen station."""
+        await self.send(text_data=json.dumps({
+            'type': 'station_ticket',
+            'ticket': event['ticket'],
+        }))
+
+    async def station_status_update(self, event):
+        """Handle status changes for orders a station has items on."""
+        await self.send(text_data=json.dumps({
+            'type': 'station_status_update',
+            'orders': event['orders'],
+        }))
+
+    async def payment_status_update(self, event):
+        """Handle orders that were just paid."""
+        await self.send(text_data=json.dumps({
+            'type': 'payment_status_update',
+            'orders': event['orders'],
+        }))
+
+    async def all_day_update(self, event):
+        """Handle changed all-day item counts."""
+        await self.send(text_data=json.dumps({
+            'type': 'all_day_update',
+            'items': event['items'],
+        }))
+
+    async def order_eta_update(self, event):
+        """Handle a refreshed estimated time for one order."""
+        await self.send(text_data=json.dumps({
+            'type': 'order_eta_update',
+            'order_id': event['order_id'],
+            'estimated_time': event['estimated_time'],
         }))
 
     async def waiter_call(self, event):
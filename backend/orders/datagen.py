@@ -0,0 +1,314 @@
+"""
+Deterministic bulk data for benchmarks and load tests.
+
+Everything is drawn from one ``random.Random(seed)``, so the same seed and
+counts always produce the same menu, tables and orders. Orders are spread
+over the last ``days`` days with weekly and hourly peaks and slow growth
+over the period; most are served and paid, a few cancelled, and card
+payments gain on cash over time. Menu items follow a popularity skew.
+
+Rows are written with ``bulk_create`` in batches, or with ``COPY`` on
+PostgreSQL, all in one transaction per call, and repeated calls append: the benchmark grows one database
+from 1k to 1M orders instead of reseeding each scale.
+
+Nothing here is imported by the request path.
+"""
+import io
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from menu.models import Category, MenuItem
+
+from .models import Order, OrderItem, Table
+
+
+# (category, station, [(item, price in ETB), ...])
+MENU = [
+    ('Breakfast', 'kitchen', [
+        ('Firfir', 180), ('Chechebsa', 170), ('Ful', 150), ('Pancakes', 220), ('Omelette', 160),
+    ]),
+    ('Mains', 'kitchen', [
+        ('Doro Wat', 450), ('Shiro', 220), ('Tibs', 420), ('Beyaynetu', 300),
+        ('Kitfo', 480), ('Margherita Pizza', 520), ('Creamy Pasta', 380),
+    ]),
+    ('Grill', 'grill', [
+        ('Beef Burger', 390), ('Chicken Burger', 350), ('Mixed Grill', 650), ('Lamb Skewers', 470),
+    ]),
+    ('Drinks', 'bar', [
+        ('Macchiato', 60), ('Buna', 50), ('Shai', 40), ('Fresh Juice', 120),
+        ('Soft Drink', 70), ('Bottled Water', 40), ('Ambo', 60),
+    ]),
+    ('Desserts', 'kitchen', [
+        ('Chocolate Cake', 200), ('Ice Cream', 150), ('Fruit Salad', 160),
+    ]),
+]
+
+ACTIVE_STATUSES = ['pending', 'confirmed', 'cooking', 'ready']
+
+# Relative order volume by weekday (Monday first) and by hour of day.
+WEEKDAY_WEIGHTS = [0.8, 0.85, 0.9, 1.0, 1.3, 1.45, 1.2]
+HOUR_WEIGHTS = {
+    7: 2, 8: 5, 9: 5, 10: 3, 11: 6, 12: 12, 13: 12, 14: 6, 15: 3,
+    16: 3, 17: 5, 18: 9, 19: 13, 20: 12, 21: 6, 22: 2,
+}
+ITEMS_PER_ORDER = ([1, 2, 3, 4, 5], [30, 35, 20, 10, 5])
+QUANTITIES = ([1, 2, 3], [80, 15, 5])
+CANCELLED_SHARE = 0.05
+# Card share of payments at the start and end of the period.
+CARD_SHARE = (0.35, 0.6)
+CUSTOMER_NAMES = ['Abebe', 'Almaz', 'Dawit', 'Hana', 'Meron', 'Samuel', 'Selam', 'Yonas']
+NOTES = ['No onions', 'Extra spicy', 'Not spicy', 'Less salt', 'Takeaway', 'Birthday']
+
+
+@contextmanager
+def manual_timestamps(*models):
+    """Let ``bulk_create`` keep the ``auto_now``/``auto_now_add`` values we set."""
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def ensure_menu():
+    """Create the sample menu if missing; returns available items in a stable order."""
+    for sort_order, (category_name, station, items) in enumerate(MENU):
+        category, _ = Category.objects.get_or_create(
+            name=category_name, defaults={'station': station, 'sort_order': sort_order},
+        )
+        existing = set(category.items.values_list('name', flat=True))
+        MenuItem.objects.bulk_create([
+            MenuItem(name=name, description=name, price=price, category=category)
+            for name, price in items if name not in existing
+        ])
+    return list(MenuItem.objects.filter(available=True).select_related('category').order_by('id'))
+
+
+def ensure_tables(count):
+    """Tables 1..count; returns their ids in number order."""
+    existing = set(Table.objects.values_list('number', flat=True))
+    Table.objects.bulk_create([
+        Table(number=number, name=f'Table {number}')
+        for number in range(1, count + 1) if number not in existing
+    ])
+    return list(Table.objects.filter(number__lte=count).order_by('number').values_list('id', flat=True))
+
+
+def next_order_numbers(days):
+    """Highest sequence already used for each ``yymmdd`` prefix in ``days``."""
+    sequences = {}
+    for day in days:
+        prefix = day.strftime('%y%m%d')
+        last = Order.objects.filter(order_number__startswith=prefix).order_by(
+            '-order_number',
+        ).values_list('order_number', flat=True).first()
+        sequences[prefix] = int(last[-4:]) if last else 0
+    return sequences
+
+
+def copy_rows(model, objs):
+    """Insert ``objs`` (primary keys already set) with one PostgreSQL ``COPY``."""
+    fields = model._meta.concrete_fields
+    buffer = io.StringIO()
+    for obj in objs:
+        values = []
+        for field in fields:
+            value = field.get_db_prep_save(getattr(obj, field.attname), connection)
+            if value is None:
+                values.append('\\N')
+            else:
+                values.append(
+                    str(value).replace('\\', '\\\\').replace('\t', '\\t')
+                    .replace('\n', '\\n').replace('\r', '\\r')
+                )
+        buffer.write('\t'.join(values) + '\n')
+    buffer.seek(0)
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f'COPY {connection.ops.quote_name(model._meta.db_table)} ({columns}) FROM STDIN',
+            buffer,
+        )
+
+
+def reserve_ids(model, count):
+    """Take ``count`` ids from the model's PostgreSQL sequence."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)',
+            [model._meta.db_table, model._meta.pk.column, count],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+class OrderGenerator:
+    """
+    Builds orders spread over the last ``days`` days.
+
+    Orders older than an hour are served (a few cancelled) and paid; the
+    newest ``active`` orders are still in the kitchen and unpaid.
+    """
+
+    def __init__(self, seed=0, tables=30, days=365, active=60, now=None):
+        self.rng = random.Random(seed)
+        self.table_ids = ensure_tables(tables)
+        # Some tables (by the window, the big ones) turn over more often.
+        self.table_weights = list(accumulate(self.rng.uniform(0.5, 1.5) for _ in self.table_ids))
+        self.menu = ensure_menu()
+        self.rng.shuffle(self.menu)
+        # Zipf-like popularity: the n-th favourite is ordered ~n^-0.8 as often as the first.
+        self.menu_weights = list(accumulate(rank ** -0.8 for rank in range(1, len(self.menu) + 1)))
+        self.days = days
+        self.active = active
+        self.now = now or timezone.now()
+
+        midnight = timezone.localtime(self.now).replace(hour=0, minute=0, second=0, microsecond=0)
+        self.day_starts = [midnight - timedelta(days=offset) for offset in range(days)]
+        # Busier weekends, plus 40% growth from the first day to the last.
+        self.day_weights = list(accumulate(
+            WEEKDAY_WEIGHTS[start.weekday()] * (1.4 - 0.4 * offset / days)
+            for offset, start in enumerate(self.day_starts)
+        ))
+        self.hours = list(HOUR_WEIGHTS)
+        self.hour_weights = list(accumulate(HOUR_WEIGHTS.values()))
+
+    def created_at(self, active):
+        """Creation time, and how far through the period it falls (0 to 1)."""
+        if active:
+            return self.now - timedelta(seconds=self.rng.uniform(0, 3600)), 1.0
+        offset = self.rng.choices(range(self.days), cum_weights=self.day_weights)[0]
+        created = self.day_starts[offset] + timedelta(
+            hours=self.rng.choices(self.hours, cum_weights=self.hour_weights)[0],
+            seconds=self.rng.randrange(3600),
+        )
+        if created > self.now - timedelta(hours=1):
+            created -= timedelta(days=1)
+            offset += 1
+        return created, 1 - offset / self.days
+
+    def build(self, count, sequences):
+        """Unsaved orders with their items attached as ``_items``."""
+        rng = self.rng
+        orders = []
+        for index in range(count):
+            active = index >= count - self.active
+            created, progress = self.created_at(active)
+            estimated = max(5, round(rng.gauss(25, 8)))
+            if active:
+                status, payment, changed = rng.choice(ACTIVE_STATUSES), 'unpaid', created
+                version = ACTIVE_STATUSES.index(status) + 1
+            elif rng.random() < CANCELLED_SHARE:
+                status, payment, version = 'cancelled', 'unpaid', 2
+                changed = created + timedelta(seconds=rng.randrange(60, 600))
+            else:
+                status, payment, version = 'served', 'paid', 5
+                changed = created + timedelta(minutes=max(5, rng.gauss(estimated, 6)))
+            card_share = CARD_SHARE[0] + (CARD_SHARE[1] - CARD_SHARE[0]) * progress
+            method = 'card' if rng.random() < card_share else 'cash'
+
+            prefix = timezone.localtime(created).strftime('%y%m%d')
+            sequences[prefix] = sequences.get(prefix, 0) + 1
+            if sequences[prefix] > 9999:
+                raise ValueError(
+                    f'More than 9999 orders on {prefix}; spread them over more days.'
+                )
+            order = Order(
+                order_number=f'{prefix}{sequences[prefix]:04d}',
+                table_id=rng.choices(self.table_ids, cum_weights=self.table_weights)[0],
+                status=status,
+                payment_status=payment,
+                payment_method=method,
+                payment_intent_id=(
+                    f'pi_{rng.getrandbits(96):024x}' if method == 'card' and payment == 'paid' else ''
+                ),
+                customer_name=rng.choice(CUSTOMER_NAMES) if rng.random() < 0.3 else '',
+                notes=rng.choice(NOTES) if rng.random() < 0.08 else '',
+                estimated_time=estimated,
+                version=version,
+                created_at=created,
+                updated_at=changed,
+                status_changed_at=changed,
+            )
+            picked = rng.choices(
+                self.menu,
+                cum_weights=self.menu_weights,
+                k=rng.choices(*ITEMS_PER_ORDER)[0],
+            )
+            order._items = [
+                OrderItem(
+                    menu_item=item,
+                    quantity=rng.choices(*QUANTITIES)[0],
+                    unit_price=item.price,
+                    station=item.kitchen_station,
+                    created_at=created,
+                )
+                for item in picked
+            ]
+            order.subtotal = sum(i.quantity * i.unit_price for i in order._items)
+            order.service_charge = (order.subtotal * Order.SERVICE_CHARGE_RATE).quantize(Decimal('0.01'))
+            order.total = order.subtotal + order.service_charge
+            orders.append(order)
+        return orders
+
+
+def generate_orders(count, seed=0, tables=30, days=365, active=60, batch_size=5000,
+                    now=None, use_copy=None, progress=None):
+    """
+    Append ``count`` orders (and their items) to the database.
+
+    ``use_copy`` defaults to True on PostgreSQL. Batches are written inside
+    one transaction, so the call adds all ``count`` orders or none.
+    ``progress(orders, items)`` is called after every batch. Returns the
+    number of order items written.
+    """
+    if use_copy is None:
+        use_copy = connection.vendor == 'postgresql'
+    active = min(active, count)
+    generator = OrderGenerator(seed, tables, days, active, now)
+    local_now = timezone.localtime(generator.now)
+    sequences = next_order_numbers(
+        (local_now - timedelta(days=day)).date() for day in range(days + 2)
+    )
+    written = 0
+    # One transaction for the whole run: a failure leaves nothing behind, so
+    # rerunning the same command never appends a partial run twice.
+    with manual_timestamps(Order, OrderItem), transaction.atomic():
+        for start in range(0, count, batch_size):
+            size = min(batch_size, count - start)
+            # The active orders are the newest, so they go in the last batch.
+            generator.active = max(0, active - (count - start - size))
+            orders = generator.build(size, sequences)
+            if use_copy:
+                for order, pk in zip(orders, reserve_ids(Order, len(orders))):
+                    order.pk = pk
+                copy_rows(Order, orders)
+            else:
+                Order.objects.bulk_create(orders)
+            items = []
+            for order in orders:
+                for item in order._items:
+                    item.order_id = order.pk
+                    items.append(item)
+            if use_copy:
+                for item, pk in zip(items, reserve_ids(OrderItem, len(items))):
+                    item.pk = pk
+                copy_rows(OrderItem, items)
+            else:
+                OrderItem.objects.bulk_create(items)
+            written += len(items)
+            if progress:
+                progress(start + size, written)
+    return written
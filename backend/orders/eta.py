@@ -0,0 +1,208 @@
+"""
+Queue-aware ETA engine.
+
+Each worker keeps an in-memory model of the kitchen queue: every active
+order (pending, confirmed or cooking) with its cook-minutes of work and the
+longest single item. A new order's ETA is the queued work shared across
+``KITCHEN_PARALLEL_CAPACITY`` cooks plus its own longest item, computed in
+O(items) from a running total. When an order leaves the queue the waiting
+orders are re-estimated and tables whose ETA moved are told over the
+channel layer.
+
+The model is rebuilt from the database every ``ETA_RELOAD_SECONDS`` so
+workers that didn't see a change converge.
+"""
+import math
+import threading
+import time
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.utils import timezone
+
+
+QUEUED_STATUSES = ('pending', 'confirmed', 'cooking')
+
+
+def capacity():
+    return max(getattr(settings, 'KITCHEN_PARALLEL_CAPACITY', 4), 1)
+
+
+def buffer_minutes():
+    return getattr(settings, 'ETA_BUFFER_MINUTES', 5)
+
+
+@dataclass
+class QueuedOrder:
+    order_id: int
+    table_number: int
+    created_at: object
+    work: float          # cook-minutes: sum of prep_time * quantity
+    duration: float      # wall-clock minutes: the slowest item
+    estimated_time: int
+    cooking_since: object = None
+
+    def remaining_work(self, now):
+        """Work still ahead of the kitchen for this order, in cook-minutes."""
+        if self.cooking_since is None or not self.duration:
+            return self.work
+        elapsed = (now - self.cooking_since).total_seconds() / 60
+        return self.work * max(0.0, 1 - elapsed / self.duration)
+
+
+def work_for(items):
+    """``(work, duration)`` for ``[(preparation_time, quantity), ...]``."""
+    work = 0.0
+    duration = 0.0
+    for prep_time, quantity in items:
+        work += prep_time * quantity
+        duration = max(duration, prep_time)
+    return work, duration
+
+
+class KitchenLoad:
+    """The kitchen queue as seen by this worker."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.orders = {}  # insertion order == queue order
+        self.total_work = 0.0
+        self.loaded_at = None
+
+    # --- loading -----------------------------------------------------------
+
+    def ensure_loaded(self):
+        reload_seconds = getattr(settings, 'ETA_RELOAD_SECONDS', 60)
+        if self.loaded_at is None or time.monotonic() - self.loaded_at > reload_seconds:
+            self.reload()
+
+    def reload(self):
+        """Rebuild the queue from active orders (two queries)."""
+        from .models import Order, OrderItem
+
+        rows = list(
+            Order.objects.filter(status__in=QUEUED_STATUSES).order_by('created_at').values(
+                'id', 'table__number', 'created_at', 'status',
+                'status_changed_at', 'estimated_time',
+            )
+        )
+        items = {}
+        for order_id, prep_time, quantity in OrderItem.objects.filter(
+            order__status__in=QUEUED_STATUSES,
+        ).values_list('order_id', 'menu_item__preparation_time', 'quantity'):
+            items.setdefault(order_id, []).append((prep_time, quantity))
+
+        orders = {}
+        for row in rows:
+            work, duration = work_for(items.get(row['id'], ()))
+            orders[row['id']] = QueuedOrder(
+                order_id=row['id'],
+                table_number=row['table__number'],
+                created_at=row['created_at'],
+                work=work,
+                duration=duration,
+                estimated_time=row['estimated_time'],
+                cooking_since=row['status_changed_at'] if row['status'] == 'cooking' else None,
+            )
+        with self.lock:
+            self.orders = orders
+            self.total_work = sum(order.work for order in orders.values())
+            self.loaded_at = time.monotonic()
+
+    # --- estimates ---------------------------------------------------------
+
+    def admit(self, order, items):
+        """
+        Estimate a new order and add it to the queue.
+
+        ``items`` is ``[(preparation_time, quantity), ...]``. Returns the ETA
+        in minutes from now.
+        """
+        self.ensure_loaded()
+        work, duration = work_for(items)
+        with self.lock:
+            # A reload just now may already have picked this order up.
+            loaded = self.orders.pop(order.pk, None)
+            if loaded is not None:
+                self.total_work -= loaded.work
+            minutes = math.ceil(self.total_work / capacity() + duration + buffer_minutes())
+            self.orders[order.pk] = QueuedOrder(
+                order_id=order.pk,
+                table_number=order.table.number,
+                created_at=order.created_at,
+                work=work,
+                duration=duration,
+                estimated_time=minutes,
+            )
+            self.total_work += work
+        return minutes
+
+    def on_status_change(self, order_id, to_status, now):
+        """Update the queue; returns True when waiting ETAs should move."""
+        with self.lock:
+            order = self.orders.get(order_id)
+            if order is None:
+                return False
+            if to_status == 'cooking':
+                order.cooking_since = now
+                return False
+            if to_status not in QUEUED_STATUSES:
+                del self.orders[order_id]
+                self.total_work -= order.work
+                return True
+            return False
+
+    def refresh(self, now):
+        """Re-estimate every queued order; returns the ones whose ETA moved."""
+        changed = []
+        with self.lock:
+            ahead = 0.0
+            for order in self.orders.values():
+                remaining = order.remaining_work(now)
+                own = order.duration
+                if order.cooking_since is not None:
+                    own = max(0.0, own - (now - order.cooking_since).total_seconds() / 60)
+                elapsed = (now - order.created_at).total_seconds() / 60
+                estimate = math.ceil(elapsed + ahead / capacity() + own + buffer_minutes())
+                if estimate != order.estimated_time:
+                    order.estimated_time = estimate
+                    changed.append(order)
+                ahead += remaining
+            # Re-anchor the running total on what is actually left.
+            self.total_work = ahead
+        return changed
+
+
+kitchen_load = KitchenLoad()
+
+
+def publish_eta_changes(orders):
+    """Persist new ETAs and push them to each order's table group."""
+    from .models import Order
+    from .notifications import publish_many
+
+    Order.objects.bulk_update(
+        [Order(pk=order.order_id, estimated_time=order.estimated_time) for order in orders],
+        ['estimated_time'],
+    )
+    publish_many([
+        (f'table_{order.table_number}', {
+            'type': 'order_eta_update',
+            'order_id': order.order_id,
+            'estimated_time': order.estimated_time,
+        })
+        for order in orders
+    ])
+
+
+def handle_status_changed(sender, changes, **kwargs):
+    """``order_status_changed`` receiver: shrink the queue, re-estimate."""
+    now = timezone.now()
+    kitchen_load.ensure_loaded()
+    queue_moved = False
+    for change in changes:
+        queue_moved |= kitchen_load.on_status_change(change['order_id'], change['to_status'], now)
+    if queue_moved:
+        changed = kitchen_load.refresh(now)
+        if changed:
+            publish_eta_changes(changed)
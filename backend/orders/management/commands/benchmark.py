@@ -0,0 +1,259 @@
+"""
+Benchmark the hot API endpoints at several data scales.
+
+Builds a throwaway SQLite database with the in-memory channel layer, grows
+it with :mod:`orders.datagen` to each scale in turn (1k, 100k, 1M orders by
+default) and times every endpoint the kitchen, cashier, table and admin
+screens poll, plus order creation and status changes, through the full
+middleware stack. For each endpoint and scale it records p50/p95/p99 and
+queries per request, and writes everything as JSON; ``--compare`` prints
+the change against an earlier run.
+
+Usage:
+    DATABASE_URL=sqlite:///bench.sqlite3 python manage.py benchmark
+    python manage.py benchmark --scales 1k 100k --json after.json --compare before.json
+"""
+import json
+import logging
+import platform
+import sqlite3
+import statistics
+import time
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from menu.cache import bump_menu_version
+from menu.models import MenuItem
+from orders.benchmarking import summarize_ms, throwaway_database, use_in_memory_channel_layer
+from orders.datagen import generate_orders
+from orders.models import Order, Table
+
+
+SEARCH_TERMS = ['wat', 'burger', 'juice', 'cake', 'tibs', 'pizza', 'shai', 'grill']
+
+
+def parse_scale(value):
+    """``1k`` -> 1000, ``1m`` -> 1000000."""
+    multiplier = {'k': 1_000, 'm': 1_000_000}.get(value[-1:].lower(), 1)
+    try:
+        return int(float(value.rstrip('kKmM')) * multiplier)
+    except ValueError:
+        raise CommandError(f'Invalid scale {value!r}; use e.g. 1000, 100k or 1m.')
+
+
+class Command(BaseCommand):
+    help = 'Time the hot API endpoints against 1k/100k/1M orders and write JSON results'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scales',
+            nargs='+',
+            default=['1k', '100k', '1m'],
+            help='Order counts to benchmark at (default: 1k 100k 1m)',
+        )
+        parser.add_argument(
+            '--iterations',
+            type=int,
+            default=30,
+            help='Timed requests per endpoint and scale (default: 30)',
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=3,
+            help='Untimed requests before each endpoint (default: 3)',
+        )
+        parser.add_argument(
+            '--max-seconds',
+            type=float,
+            default=30.0,
+            help='Stop an endpoint early once it has used this long (default: 30)',
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Data generator seed (default: 0)')
+        parser.add_argument('--tables', type=int, default=30, help='Tables to spread orders over (default: 30)')
+        parser.add_argument('--only', nargs='+', help='Benchmark only these endpoints')
+        parser.add_argument('--json', dest='json_path', default='benchmark.json',
+                            help='Results file (default: benchmark.json)')
+        parser.add_argument('--compare', help='Earlier results file to compare against')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError(
+                'Benchmarks run on SQLite so results are comparable; '
+                'set DATABASE_URL=sqlite:///bench.sqlite3.'
+            )
+        scales = sorted({parse_scale(value) for value in options['scales']})
+        self.options = options
+        use_in_memory_channel_layer()
+        # Slow-request warnings would drown the report at the larger scales.
+        logging.getLogger('backend.requests').setLevel(logging.ERROR)
+
+        report = {
+            'started_at': timezone.now().isoformat(),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'sqlite': sqlite3.sqlite_version,
+                'machine': platform.machine(),
+            },
+            'options': {key: options[key] for key in (
+                'iterations', 'warmup', 'max_seconds', 'seed', 'tables',
+            )},
+            'scales': [],
+        }
+
+        with throwaway_database():
+            seeded = 0
+            for index, scale in enumerate(scales):
+                start = time.perf_counter()
+                items = generate_orders(
+                    scale - seeded,
+                    seed=options['seed'] + index,
+                    tables=options['tables'],
+                    active=60 if seeded == 0 else 0,
+                )
+                seconds = time.perf_counter() - start
+                seeded = scale
+                self.stdout.write(self.style.MIGRATE_HEADING(
+                    f'{scale:,} orders (seeded {items:,} items in {seconds:.1f}s)'
+                ))
+                report['scales'].append({
+                    'orders': scale,
+                    'seed_seconds': round(seconds, 2),
+                    'endpoints': self.run_scale(),
+                })
+
+        with open(options['json_path'], 'w') as fh:
+            json.dump(report, fh, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Results written to {options['json_path']}"))
+
+        if options['compare']:
+            self.compare(report, options['compare'])
+
+    def endpoints(self):
+        """
+        ``(created_ids, create_factory, endpoints)``, where each endpoint is
+        ``(name, method, factory)`` and ``factory(i)`` returns ``(path, data)``.
+        """
+        table_ids = list(Table.objects.values_list('id', flat=True))
+        item_ids = list(MenuItem.objects.filter(available=True).values_list('id', flat=True))
+        created = []
+
+        def create(i):
+            return '/api/orders/create/', {
+                'table_id': table_ids[i % len(table_ids)],
+                'items': [
+                    {'menu_item_id': item_ids[i % len(item_ids)], 'quantity': 1},
+                    {'menu_item_id': item_ids[(i * 7 + 3) % len(item_ids)], 'quantity': 2},
+                ],
+            }
+
+        def update(i):
+            return f'/api/orders/{created[i % len(created)]}/status/', {'status': 'confirmed'}
+
+        # Invalidated the way a menu edit does, so these time the query and
+        # not the cached response (and never flush a shared cache).
+        def menu_list(i):
+            bump_menu_version()
+            return '/api/menu/items/', None
+
+        def menu_search(i):
+            bump_menu_version()
+            return f'/api/menu/items/?search={SEARCH_TERMS[i % len(SEARCH_TERMS)]}', None
+
+        return created, create, [
+            ('kitchen_list', 'get', lambda i: ('/api/orders/kitchen/', None)),
+            ('cashier_list', 'get', lambda i: ('/api/orders/cashier/?payment_status=unpaid', None)),
+            ('table_list', 'get', lambda i: ('/api/orders/tables/', None)),
+            ('table_orders', 'get', lambda i: (f'/api/orders/table/{table_ids[i % len(table_ids)]}/', None)),
+            ('menu_list', 'get', menu_list),
+            ('menu_list_cached', 'get', lambda i: ('/api/menu/items/', None)),
+            ('menu_search', 'get', menu_search),
+            ('dashboard', 'get', lambda i: ('/api/orders/dashboard/', None)),
+            ('order_create', 'post', create),
+            ('status_update', 'patch', update),
+        ]
+
+    def run_scale(self):
+        client = APIClient()
+        created, create, endpoints = self.endpoints()
+        only = self.options['only']
+        results = {}
+        for name, method, factory in endpoints:
+            if only and name not in only:
+                continue
+            if name == 'status_update':
+                # Each status change needs a fresh pending order to move.
+                missing = self.options['warmup'] + self.options['iterations'] - len(created)
+                for i in range(max(missing, 0)):
+                    self.request(client.post, create(i), 'order_create', created)
+
+            samples, queries = self.measure(client, method, factory, name, created)
+            summary = summarize_ms(samples)
+            summary['queries'] = statistics.median(queries)
+            summary['queries_max'] = max(queries)
+            results[name] = summary
+            self.stdout.write(
+                f"  {name:<16} p50 {summary['p50_ms']:>9.2f} ms  p95 {summary['p95_ms']:>9.2f} ms  "
+                f"queries {summary['queries']:>5g}  (n={summary['count']})"
+            )
+
+        # Leave the next scale with the same number of active orders.
+        Order.objects.filter(pk__in=created).delete()
+        return results
+
+    def measure(self, client, method, factory, name, created):
+        options = self.options
+        budget_end = time.perf_counter() + options['max_seconds']
+        call = getattr(client, method)
+
+        for i in range(options['warmup']):
+            self.request(call, factory(i), name, created)
+            if time.perf_counter() > budget_end:
+                break
+
+        samples, queries = [], []
+        for i in range(options['warmup'], options['warmup'] + options['iterations']):
+            if samples and time.perf_counter() > budget_end:
+                break
+            path, data = factory(i)
+            start = time.perf_counter()
+            response = self.request(call, (path, data), name, created)
+            samples.append(time.perf_counter() - start)
+            queries.append(response.wsgi_request.timing['queries'])
+        return samples, queries
+
+    def request(self, call, request, name, created):
+        path, data = request
+        response = call(path, data, format='json') if data is not None else call(path)
+        if response.status_code >= 400:
+            raise CommandError(f'{name}: {path} returned {response.status_code}: {response.content[:300]!r}')
+        if name == 'order_create':
+            created.append(response.data['id'])
+        return response
+
+    def compare(self, report, path):
+        with open(path) as fh:
+            before = {
+                (scale['orders'], name): result
+                for scale in json.load(fh)['scales']
+                for name, result in scale['endpoints'].items()
+            }
+        self.stdout.write(self.style.MIGRATE_HEADING(f'Compared with {path}'))
+        for scale in report['scales']:
+            for name, result in scale['endpoints'].items():
+                old = before.get((scale['orders'], name))
+                if old is None:
+                    continue
+                change = (result['p95_ms'] - old['p95_ms']) / old['p95_ms'] * 100 if old['p95_ms'] else 0
+                line = (
+                    f"  {scale['orders']:>9,} {name:<16} p95 {old['p95_ms']:>9.2f} -> "
+                    f"{result['p95_ms']:>9.2f} ms ({change:+.0f}%)  "
+                    f"queries {old['queries']:g} -> {result['queries']:g}"
+                )
+                worse = change > 10 or result['queries'] > old['queries']
+                self.stdout.write(self.style.WARNING(line) if worse else line)
@@ -1,13 +1,35 @@
 """
 Import real food data from TheMealDB free API into DineQR.
-Usage:  python manage.py import_food
+
+Requests run concurrently over one pooled session. Every response is kept
+in an on-disk cache, so re-runs are fast and ``--offline`` can replay a
+recorded import without network access. New items are written with one
+bulk insert.
+
+Usage:
+    python manage.py import_food --limit 50
+    python manage.py import_food --offline --cache-dir fixtures/themealdb
 """
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from pathlib import Path
+
 import requests
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
+from requests.adapters import HTTPAdapter
+
 from menu.models import Category, MenuItem
-from decimal import Decimal
-import random
+
+
+API_BASE = 'https://www.themealdb.com/api/json/v1/1'
 
 
 CATEGORIES_MAP = {
@@ -64,6 +86,59 @@ PREP_RANGES = {
 }
 
 
+class OfflineMiss(Exception):
+    pass
+
+
+class CachedFetcher:
+    """
+    JSON GETs over a pooled session, backed by an on-disk response cache.
+
+    Cache files are named by a hash of the URL, so a cache directory doubles
+    as a set of recorded fixtures for ``--offline`` runs.
+    """
+
+    def __init__(self, cache_dir, workers, offline=False, refresh=False, timeout=10):
+        self.cache_dir = Path(cache_dir)
+        self.offline = offline
+        self.refresh = refresh
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers, max_retries=2)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.lock = threading.Lock()
+        self.stats = defaultdict(int)
+
+    def path_for(self, url):
+        return self.cache_dir / f'{hashlib.sha1(url.encode()).hexdigest()}.json'
+
+    def get(self, url):
+        path = self.path_for(url)
+        if not self.refresh or self.offline:
+            try:
+                data = json.loads(path.read_text())
+                self.count('cache_hits')
+                return data
+            except FileNotFoundError:
+                if self.offline:
+                    raise OfflineMiss(url)
+
+        resp = self.session.get(url, timeout=self.timeout)
+        resp.raise_for_status()
+        data = resp.json()
+        self.count('network_requests')
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f'.{threading.get_ident()}.tmp')
+        tmp.write_text(json.dumps(data))
+        tmp.replace(path)
+        return data
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+
 class Command(BaseCommand):
     help = 'Import real food data from TheMealDB API into DineQR menu'
 
@@ -80,127 +155,175 @@ class Command(BaseCommand):
             default=None,
             help='Specific categories to import (e.g. Beef Chicken Dessert)',
         )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=16,
+            help='Concurrent API requests (default: 16)',
+        )
+        parser.add_argument(
+            '--cache-dir',
+            default=None,
+            help='Response cache / fixture directory (default: <BASE_DIR>/.import_cache/themealdb)',
+        )
+        parser.add_argument(
+            '--offline',
+            action='store_true',
+            help='Only read responses from --cache-dir; never touch the network',
+        )
+        parser.add_argument(
+            '--refresh',
+            action='store_true',
+            help='Ignore cached responses and fetch everything again',
+        )
 
-    @transaction.atomic
     def handle(self, *args, **options):
         limit = options['limit']
         filter_cats = options.get('categories')
+        cache_dir = options['cache_dir'] or settings.BASE_DIR / '.import_cache' / 'themealdb'
+        fetcher = CachedFetcher(
+            cache_dir, options['workers'], offline=options['offline'], refresh=options['refresh'],
+        )
+        timings = {}
 
         self.stdout.write(self.style.MIGRATE_HEADING(
             '🍽  Importing food from TheMealDB API...\n'))
 
-        # 1. Fetch categories from API
-        try:
-            resp = requests.get(
-                'https://www.themealdb.com/api/json/v1/1/categories.php',
-                timeout=10,
-            )
-            resp.raise_for_status()
-            api_categories = resp.json().get('categories', [])
-        except Exception as e:
-            self.stderr.write(self.style.ERROR(f'Failed to fetch categories: {e}'))
-            return
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            # 1. Fetch categories from API
+            started = time.perf_counter()
+            try:
+                api_categories = fetcher.get(f'{API_BASE}/categories.php').get('categories', [])
+            except OfflineMiss as e:
+                raise CommandError(f'No recorded response for {e} in {cache_dir}')
+            except Exception as e:
+                self.stderr.write(self.style.ERROR(f'Failed to fetch categories: {e}'))
+                return
+            api_categories = [
+                api_cat for api_cat in api_categories
+                if api_cat['strCategory'] in CATEGORIES_MAP
+                and (not filter_cats or api_cat['strCategory'] in filter_cats)
+            ]
+            timings['categories'] = time.perf_counter() - started
 
-        total_items = 0
+            # 2. Fetch meals for every category at once
+            started = time.perf_counter()
+            meal_lists = list(pool.map(
+                lambda api_cat: self.fetch_meals(fetcher, api_cat['strCategory']),
+                api_categories,
+            ))
+            timings['meal lists'] = time.perf_counter() - started
 
-        for api_cat in api_categories:
-            cat_name = api_cat['strCategory']
+            # 3. Fetch full details for every meal at once
+            started = time.perf_counter()
+            wanted = [
+                (api_cat, meal)
+                for api_cat, meals in zip(api_categories, meal_lists)
+                for meal in meals[:limit]
+            ]
+            descriptions = list(pool.map(
+                lambda entry: self.fetch_description(fetcher, entry[1]),
+                wanted,
+            ))
+            timings['meal details'] = time.perf_counter() - started
 
-            # Skip if user specified categories and this isn't one
-            if filter_cats and cat_name not in filter_cats:
-                continue
+        # 4. Write categories and new items
+        started = time.perf_counter()
+        with transaction.atomic():
+            total_items = self.save(api_categories, wanted, descriptions)
+        timings['database'] = time.perf_counter() - started
 
-            # Skip if not in our mapping
-            if cat_name not in CATEGORIES_MAP:
-                continue
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            f'🎉 Done! Imported {total_items} new menu items.'))
+        self.stdout.write(self.style.SUCCESS(
+            f'   Total categories: {Category.objects.count()}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'   Total menu items: {MenuItem.objects.count()}'))
+        self.report_timings(timings, fetcher.stats)
 
-            mapped = CATEGORIES_MAP[cat_name]
+    def fetch_meals(self, fetcher, cat_name):
+        try:
+            return fetcher.get(f'{API_BASE}/filter.php?c={cat_name}').get('meals', []) or []
+        except Exception as e:
+            self.stderr.write(f'    Failed to fetch meals for {cat_name}: {e}')
+            return []
 
-            # Create or get category
+    def fetch_description(self, fetcher, meal):
+        try:
+            detail_meals = fetcher.get(
+                f'{API_BASE}/lookup.php?i={meal["idMeal"]}'
+            ).get('meals', [])
+        except Exception:
+            return f'Delicious {meal["strMeal"]}'
+        if not detail_meals:
+            return ''
+        full_desc = detail_meals[0].get('strInstructions', '') or ''
+        # Take first 2 sentences as description
+        sentences = full_desc.split('.')
+        description = '. '.join(sentences[:2]).strip()
+        if description and not description.endswith('.'):
+            description += '.'
+        return description
+
+    def save(self, api_categories, wanted, descriptions):
+        """Create missing categories and items; existing items are left as they are."""
+        categories = {}
+        for api_cat in api_categories:
+            mapped = CATEGORIES_MAP[api_cat['strCategory']]
             category, created = Category.objects.get_or_create(
                 name=mapped['name'],
-                defaults={'description': api_cat.get('strCategoryDescription', '')[:200]},
+                defaults={'description': (api_cat.get('strCategoryDescription') or '')[:200]},
             )
+            categories[api_cat['strCategory']] = category
             status = 'Created' if created else 'Exists'
             self.stdout.write(
                 self.style.SUCCESS(f'  📁 {status} category: {category.name}'))
 
-            # 2. Fetch meals for this category
-            try:
-                meals_resp = requests.get(
-                    f'https://www.themealdb.com/api/json/v1/1/filter.php?c={cat_name}',
-                    timeout=10,
-                )
-                meals_resp.raise_for_status()
-                meals = meals_resp.json().get('meals', []) or []
-            except Exception as e:
-                self.stderr.write(f'    Failed to fetch meals for {cat_name}: {e}')
+        existing = set(MenuItem.objects.filter(
+            name__in=[meal['strMeal'] for _, meal in wanted],
+        ).values_list('name', flat=True))
+
+        new_items = []
+        for (api_cat, meal), description in zip(wanted, descriptions):
+            cat_name = api_cat['strCategory']
+            meal_name = meal['strMeal']
+            if meal_name in existing:
+                self.stdout.write(f'    ⏭  {meal_name} (already exists)')
                 continue
+            existing.add(meal_name)
+
+            # Generate realistic price
+            price_range = PRICE_RANGES.get(cat_name, (8, 20))
+            price = Decimal(str(round(
+                random.uniform(price_range[0], price_range[1]), 2
+            )))
+
+            # Generate prep time
+            prep_range = PREP_RANGES.get(cat_name, (10, 25))
+            prep_time = random.randint(prep_range[0], prep_range[1])
 
-            # Limit items per category
-            meals = meals[:limit]
-
-            for meal in meals:
-                meal_name = meal['strMeal']
-                meal_thumb = meal.get('strMealThumb', '')
-
-                # Fetch full details for description
-                description = ''
-                try:
-                    detail_resp = requests.get(
-                        f'https://www.themealdb.com/api/json/v1/1/lookup.php?i={meal["idMeal"]}',
-                        timeout=10,
-                    )
-                    detail_resp.raise_for_status()
-                    detail_meals = detail_resp.json().get('meals', [])
-                    if detail_meals:
-                        full_desc = detail_meals[0].get('strInstructions', '')
-                        # Take first 2 sentences as description
-                        sentences = full_desc.split('.')
-                        description = '. '.join(sentences[:2]).strip()
-                        if description and not description.endswith('.'):
-                            description += '.'
-                except Exception:
-                    description = f'Delicious {meal_name}'
-
-                # Generate realistic price
-                price_range = PRICE_RANGES.get(cat_name, (8, 20))
-                price = Decimal(str(round(
-                    random.uniform(price_range[0], price_range[1]), 2
-                )))
-
-                # Generate prep time
-                prep_range = PREP_RANGES.get(cat_name, (10, 25))
-                prep_time = random.randint(prep_range[0], prep_range[1])
-
-                # Popular flag (20% chance)
-                is_popular = random.random() < 0.2
-
-                item, created = MenuItem.objects.get_or_create(
-                    name=meal_name,
-                    defaults={
-                        'description': description[:500],
-                        'price': price,
-                        'category': category,
-                        'available': True,
-                        'is_popular': is_popular,
-                        'preparation_time': prep_time,
-                        'image': meal_thumb,
-                    },
-                )
-
-                if created:
-                    total_items += 1
-                    self.stdout.write(
-                        f'    ✅ {meal_name} — ${price} — {prep_time}min')
-                else:
-                    self.stdout.write(
-                        f'    ⏭  {meal_name} (already exists)')
+            new_items.append(MenuItem(
+                name=meal_name,
+                description=description[:500],
+                price=price,
+                category=categories[cat_name],
+                available=True,
+                is_popular=random.random() < 0.2,  # Popular flag (20% chance)
+                preparation_time=prep_time,
+                image=meal.get('strMealThumb', ''),
+            ))
+            self.stdout.write(f'    ✅ {meal_name} — ${price} — {prep_time}min')
 
+        MenuItem.objects.bulk_create(new_items, batch_size=500)
+        return len(new_items)
+
+    def report_timings(self, timings, stats):
         self.stdout.write('')
-        self.stdout.write(self.style.SUCCESS(
-            f'🎉 Done! Imported {total_items} new menu items.'))
-        self.stdout.write(self.style.SUCCESS(
-            f'   Total categories: {Category.objects.count()}'))
-        self.stdout.write(self.style.SUCCESS(
-            f'   Total menu items: {MenuItem.objects.count()}'))
+        self.stdout.write(self.style.MIGRATE_HEADING('Timing'))
+        for phase, seconds in timings.items():
+            self.stdout.write(f'   {phase:<14} {seconds * 1000:>9.1f} ms')
+        self.stdout.write(f'   {"total":<14} {sum(timings.values()) * 1000:>9.1f} ms')
+        self.stdout.write(
+            f'   {stats["network_requests"]} network requests, {stats["cache_hits"]} cache hits'
+        )
@@ -0,0 +1,188 @@
+"""
+Compare guest SSE streams with guest WebSockets inside one worker.
+
+Opens N table-tracking connections of each kind against the real ASGI app
+(in-memory channel layer, throwaway database), then reports Python heap
+per connection, connect time, and how long one update per table takes to
+reach every subscriber. A run is sustained when every connection opened and
+received its update in time; the largest sustained count per transport is
+reported at the end. Pass a rising ``--connections`` list to find the limit.
+
+Usage:  python manage.py loadtest_guest_streams --connections 100 500 1000
+"""
+import asyncio
+import time
+
+from asgiref.testing import ApplicationCommunicator
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand
+
+from orders.benchmarking import (
+    MemoryProbe,
+    summarize_ms,
+    throwaway_database,
+    use_in_memory_channel_layer,
+)
+from orders.models import Table
+
+
+class SSEClient:
+    """Minimal ASGI HTTP client that keeps reading a streaming response."""
+
+    def __init__(self, application, table_number):
+        self.communicator = ApplicationCommunicator(application, {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': f'/api/orders/table/{table_number}/events/',
+            'raw_path': f'/api/orders/table/{table_number}/events/'.encode(),
+            'query_string': b'',
+            'root_path': '',
+            'headers': [(b'host', b'testserver'), (b'accept', b'text/event-stream')],
+            'client': ('127.0.0.1', 0),
+            'server': ('testserver', 80),
+        })
+
+    async def connect(self, timeout):
+        await self.communicator.send_input({'type': 'http.request', 'body': b''})
+        start = await self.communicator.receive_output(timeout)
+        if start['status'] != 200:
+            raise RuntimeError(f"SSE stream refused with HTTP {start['status']}")
+        await self.receive(timeout)  # retry: preamble
+
+    async def receive(self, timeout):
+        while True:
+            message = await self.communicator.receive_output(timeout)
+            if message.get('body'):
+                return message['body']
+
+    async def close(self):
+        await self.communicator.send_input({'type': 'http.disconnect'})
+        await self.communicator.wait(timeout=0.1)
+
+
+class WebSocketClient:
+    def __init__(self, application, table_number):
+        self.communicator = WebsocketCommunicator(application, f'/ws/orders/{table_number}/')
+
+    async def connect(self, timeout):
+        connected, _ = await self.communicator.connect(timeout)
+        if not connected:
+            raise RuntimeError('WebSocket refused')
+        await self.communicator.receive_from(timeout)  # connection_established
+
+    async def receive(self, timeout):
+        while True:
+            text = await self.communicator.receive_from(timeout)
+            if '"order_status_update"' in text:
+                return text
+
+    async def close(self):
+        await self.communicator.disconnect()
+
+
+class Command(BaseCommand):
+    help = 'Load-test guest order tracking: SSE streams vs WebSockets in one worker'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--connections',
+            type=int,
+            nargs='+',
+            default=[100, 500, 1000],
+            help='Concurrent guest connections to hold per run (default: 100 500 1000)',
+        )
+        parser.add_argument(
+            '--tables',
+            type=int,
+            default=50,
+            help='Tables the guests are spread across (default: 50)',
+        )
+        parser.add_argument(
+            '--timeout',
+            type=float,
+            default=10.0,
+            help='Seconds to wait for any single connect or delivery (default: 10)',
+        )
+
+    def handle(self, *args, **options):
+        use_in_memory_channel_layer()
+
+        from backend.asgi import application
+
+        with throwaway_database():
+            Table.objects.bulk_create(
+                [Table(number=n, name=f'Table {n}') for n in range(1, options['tables'] + 1)]
+            )
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{'transport':<10} {'conns':>6} {'open':>6} {'got':>6} {'KiB/conn':>9} "
+                f"{'connect p95':>12} {'deliver p50':>12} {'deliver p95':>12} {'deliver p99':>12}"
+            ))
+            sustained = {'sse': 0, 'websocket': 0}
+            for count in options['connections']:
+                for label, client_class in (('sse', SSEClient), ('websocket', WebSocketClient)):
+                    result = asyncio.run(self.run_transport(
+                        application, client_class, count, options['tables'], options['timeout'],
+                    ))
+                    if result['delivered'] == count:
+                        sustained[label] = max(sustained[label], count)
+                    line = (
+                        f"{label:<10} {count:>6} {result['connected']:>6} {result['delivered']:>6} "
+                        f"{result['kib_per_connection']:>9.1f} "
+                        f"{result['connect']['p95_ms']!s:>12} {result['delivery']['p50_ms']!s:>12} "
+                        f"{result['delivery']['p95_ms']!s:>12} {result['delivery']['p99_ms']!s:>12}"
+                    )
+                    self.stdout.write(line if result['delivered'] == count else self.style.WARNING(line))
+            self.stdout.write(self.style.SUCCESS(
+                'Most concurrent connections sustained: '
+                + ', '.join(f'{label} {count:,}' for label, count in sustained.items())
+            ))
+
+    async def run_transport(self, application, client_class, count, tables, timeout):
+        from channels.layers import get_channel_layer
+
+        channel_layer = get_channel_layer()
+        clients = [client_class(application, (i % tables) + 1) for i in range(count)]
+
+        # Heap is sampled with tracemalloc on, latency with it off. The run
+        # stops opening connections at the first one that fails.
+        with MemoryProbe() as memory:
+            connect_times = []
+            for client in clients:
+                started = time.perf_counter()
+                try:
+                    await client.connect(timeout)
+                except (asyncio.TimeoutError, RuntimeError, OSError):
+                    break
+                connect_times.append(time.perf_counter() - started)
+            heap = memory.sample()
+        connected = clients[:len(connect_times)]
+
+        # One status update per table, timed until every guest has it.
+        sent_at = time.perf_counter()
+        for number in range(1, tables + 1):
+            await channel_layer.group_send(f'table_{number}', {
+                'type': 'order_status_update',
+                'order': {'id': number, 'status': 'ready'},
+                'old_status': 'cooking',
+            })
+
+        async def deliver(client):
+            await client.receive(timeout)
+            return time.perf_counter() - sent_at
+
+        results = await asyncio.gather(*(deliver(client) for client in connected), return_exceptions=True)
+        delivery_times = [result for result in results if not isinstance(result, BaseException)]
+
+        for client in connected:
+            await client.close()
+
+        return {
+            'connected': len(connected),
+            'delivered': len(delivery_times),
+            'kib_per_connection': heap / max(len(connected), 1) / 1024,
+            'connect': summarize_ms(connect_times),
+            'delivery': summarize_ms(delivery_times),
+        }
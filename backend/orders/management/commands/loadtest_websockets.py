@@ -0,0 +1,244 @@
+"""
+WebSocket fan-out load test for OrderConsumer.
+
+Opens N table sockets and M kitchen sockets in-process, then creates orders
+and moves them to "cooking" through the real HTTP views. Every socket
+records when each broadcast reaches it; the report gives delivery latency
+percentiles, throughput and heap use for every connection count.
+
+Usage:
+    python manage.py loadtest_websockets --table-sockets 50 200 --kitchen-sockets 5
+    python manage.py loadtest_websockets --layer redis --redis-url redis://localhost:6379/1
+"""
+import asyncio
+import json
+import time
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from channels.layers import DEFAULT_CHANNEL_LAYER, channel_layers
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIClient
+
+from menu.models import Category, MenuItem
+from orders.benchmarking import (
+    MemoryProbe,
+    percentile,
+    summarize_ms,
+    throwaway_database,
+    use_in_memory_channel_layer,
+)
+from orders.models import Table
+
+
+class Listener:
+    """One socket plus the arrival time of every order event it sees."""
+
+    def __init__(self, application, path, role):
+        self.role = role
+        self.communicator = WebsocketCommunicator(application, path)
+        self.arrivals = {}
+        self.task = None
+
+    async def connect(self, timeout):
+        connected, _ = await self.communicator.connect(timeout)
+        if not connected:
+            raise RuntimeError(f'{self.role} socket refused')
+        await self.communicator.receive_from(timeout)  # connection_established
+        self.task = asyncio.ensure_future(self.listen())
+
+    async def listen(self):
+        while True:
+            data = json.loads(await self.communicator.receive_from(timeout=3600))
+            order = data.get('order') or {}
+            key = (data['type'], order.get('id'))
+            self.arrivals.setdefault(key, time.perf_counter())
+
+    async def close(self):
+        self.task.cancel()
+        await self.communicator.disconnect()
+
+
+class Command(BaseCommand):
+    help = 'Measure OrderConsumer fan-out latency for N table and M kitchen sockets'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--table-sockets',
+            type=int,
+            nargs='+',
+            default=[10, 100, 500],
+            help='Table socket counts to test, one table per socket (default: 10 100 500)',
+        )
+        parser.add_argument(
+            '--kitchen-sockets',
+            type=int,
+            default=5,
+            help='Kitchen sockets held open during every run (default: 5)',
+        )
+        parser.add_argument(
+            '--orders',
+            type=int,
+            default=50,
+            help='Orders to create (and move to cooking) per run (default: 50)',
+        )
+        parser.add_argument(
+            '--layer',
+            choices=['memory', 'redis'],
+            default='memory',
+            help='Channel layer to broadcast through (default: memory)',
+        )
+        parser.add_argument(
+            '--redis-url',
+            default='redis://localhost:6379/15',
+            help='Redis used with --layer redis (default: redis://localhost:6379/15)',
+        )
+        parser.add_argument(
+            '--timeout',
+            type=float,
+            default=30.0,
+            help='Seconds to wait for outstanding deliveries (default: 30)',
+        )
+        parser.add_argument('--json', dest='json_path', help='Also write results to this file')
+
+    def handle(self, *args, **options):
+        self.configure_layer(options)
+
+        from backend.asgi import application
+
+        results = []
+        with throwaway_database():
+            category = Category.objects.create(name='Load test')
+            self.menu_item = MenuItem.objects.create(
+                name='Load test item', price=10, category=category,
+            )
+            Table.objects.bulk_create([
+                Table(number=n, name=f'Table {n}')
+                for n in range(1, max(options['table_sockets']) + 1)
+            ])
+            self.table_ids = dict(Table.objects.values_list('number', 'id'))
+
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{'tables':>6} {'kitchens':>8} {'KiB/sock':>9} {'orders/s':>9} {'msgs/s':>9} "
+                f"{'kitchen p50':>12} {'p95':>9} {'p99':>9} {'table p50':>10} {'p95':>9} {'p99':>9} {'lost':>5}"
+            ))
+            for table_sockets in options['table_sockets']:
+                result = asyncio.run(self.run(application, table_sockets, options))
+                results.append(result)
+                kitchen, table = result['kitchen_latency'], result['table_latency']
+                self.stdout.write(
+                    f"{table_sockets:>6} {options['kitchen_sockets']:>8} "
+                    f"{result['kib_per_socket']:>9.1f} {result['orders_per_second']:>9.1f} "
+                    f"{result['deliveries_per_second']:>9.0f} "
+                    f"{kitchen['p50_ms']:>12} {kitchen['p95_ms']:>9} {kitchen['p99_ms']:>9} "
+                    f"{table['p50_ms']:>10} {table['p95_ms']:>9} {table['p99_ms']:>9} "
+                    f"{result['lost']:>5}"
+                )
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as fh:
+                json.dump(results, fh, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['json_path']}"))
+
+    def configure_layer(self, options):
+        if options['layer'] == 'memory':
+            use_in_memory_channel_layer()
+            return
+        from channels_redis.core import RedisChannelLayer
+
+        channel_layers.backends[DEFAULT_CHANNEL_LAYER] = RedisChannelLayer(
+            hosts=[options['redis_url']],
+        )
+
+    async def run(self, application, table_sockets, options):
+        timeout = options['timeout']
+        kitchens = [
+            Listener(application, '/ws/orders/', 'kitchen')
+            for _ in range(options['kitchen_sockets'])
+        ]
+        tables = {
+            number: Listener(application, f'/ws/orders/{number}/', 'table')
+            for number in range(1, table_sockets + 1)
+        }
+        listeners = kitchens + list(tables.values())
+
+        # Heap is sampled with tracemalloc on, latency with it off.
+        with MemoryProbe() as memory:
+            for listener in listeners:
+                await listener.connect(timeout)
+            heap = memory.sample()
+
+        client = APIClient()
+        create = sync_to_async(client.post, thread_sensitive=True)
+        patch = sync_to_async(client.patch, thread_sensitive=True)
+
+        # (event type, order id, table number) -> time the request was sent
+        sent = {}
+        started = time.perf_counter()
+        for i in range(options['orders']):
+            number = (i % table_sockets) + 1
+            sent_at = time.perf_counter()
+            response = await create('/api/orders/create/', {
+                'table_id': self.table_ids[number],
+                'items': [{'menu_item_id': self.menu_item.id, 'quantity': 1}],
+            }, format='json')
+            order_id = response.data['id']
+            sent[('new_order', order_id, number)] = sent_at
+            sent[('order_update', order_id, number)] = sent_at
+
+            sent_at = time.perf_counter()
+            await patch(f'/api/orders/{order_id}/status/', {'status': 'cooking'}, format='json')
+            sent[('order_status_update', order_id, number)] = sent_at
+        requests_done = time.perf_counter()
+
+        expected = self.expected_deliveries(sent, kitchens, tables)
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            if all(key in listener.arrivals for listener, key, _ in expected):
+                break
+            await asyncio.sleep(0.01)
+
+        for listener in listeners:
+            await listener.close()
+
+        latencies = defaultdict(list)
+        lost = 0
+        last_arrival = requests_done
+        for listener, key, sent_at in expected:
+            arrived = listener.arrivals.get(key)
+            if arrived is None:
+                lost += 1
+                continue
+            latencies[listener.role].append(arrived - sent_at)
+            last_arrival = max(last_arrival, arrived)
+
+        elapsed = last_arrival - started
+        delivered = len(expected) - lost
+        return {
+            'table_sockets': table_sockets,
+            'kitchen_sockets': len(kitchens),
+            'orders': options['orders'],
+            'layer': options['layer'],
+            'kib_per_socket': heap / len(listeners) / 1024,
+            'orders_per_second': options['orders'] / (requests_done - started),
+            'deliveries_per_second': delivered / elapsed if elapsed else 0,
+            'deliveries': delivered,
+            'lost': lost,
+            'kitchen_latency': summarize_ms(latencies['kitchen']),
+            'table_latency': summarize_ms(latencies['table']),
+            'worst_p99_ms': round(max(
+                percentile(samples, 99) for samples in latencies.values()
+            ) * 1000, 3) if latencies else None,
+        }
+
+    @staticmethod
+    def expected_deliveries(sent, kitchens, tables):
+        """Which socket should see which event, and when it was triggered."""
+        expected = []
+        for (event_type, order_id, number), sent_at in sent.items():
+            if event_type in ('new_order', 'order_status_update'):
+                expected.extend((k, (event_type, order_id), sent_at) for k in kitchens)
+            if event_type in ('order_update', 'order_status_update'):
+                expected.append((tables[number], (event_type, order_id), sent_at))
+        return expected
@@ -0,0 +1,32 @@
+"""
+Apply stored Stripe webhook events that no worker has processed yet.
+
+Workers process events in the background as they arrive; run this after a
+restart or from cron to drain anything left behind.
+
+Usage:  python manage.py process_stripe_events
+"""
+from django.core.management.base import BaseCommand
+
+from orders.webhooks import batch_size, process_pending
+
+
+class Command(BaseCommand):
+    help = 'Process pending Stripe webhook events in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=batch_size(),
+            help='Events applied per transaction (default: STRIPE_WEBHOOK_BATCH_SIZE)',
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            processed = process_pending(options['batch_size'])
+            total += processed
+            if processed < options['batch_size']:
+                break
+        self.stdout.write(self.style.SUCCESS(f"Processed {total} Stripe event(s)."))
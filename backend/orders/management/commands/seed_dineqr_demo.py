@@ -3,6 +3,7 @@ from django.db import transaction
 
 from menu.models import Category, MenuItem
 from orders.models import Table
+from orders.qr import generate_table_qr_codes
 
 
 class Command(BaseCommand):
@@ -79,6 +80,7 @@ class Command(BaseCommand):
 
         self.stdout.write(self.style.MIGRATE_LABEL("Creating tables 1-20 and QR codes..."))
 
+        tables = []
         for number in range(1, 21):
             table, created = Table.objects.get_or_create(
                 number=number,
@@ -91,11 +93,14 @@ class Command(BaseCommand):
             if created:
                 self.stdout.write(self.style.SUCCESS(f"Created {table}"))
 
-            table.generate_qr_code(base_url=base_url)
-            self.stdout.write(
-                self.style.SUCCESS(
-                    f"QR generated for {table} → {base_url}/table/{table.number}"
-                )
+            tables.append(table)
+
+        generated = generate_table_qr_codes(tables, base_url)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"QR codes generated for {generated} tables → {base_url}/table/<n> "
+                f"({len(tables) - generated} already up to date)"
             )
+        )
 
         self.stdout.write(self.style.SUCCESS("DineQR demo data seeding completed."))
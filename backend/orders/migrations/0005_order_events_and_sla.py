@@ -0,0 +1,56 @@
+# Generated by Django 4.2.30 on 2026-10-19 19:16
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('orders', '0003_order_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KitchenSLABucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('station', models.CharField(default='kitchen', max_length=30)),
+                ('status', models.CharField(max_length=20)),
+                ('upper_bound', models.PositiveIntegerField(help_text='Bucket upper bound in seconds')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('total_seconds', models.FloatField(default=0)),
+            ],
+            options={
+                'ordering': ['day', 'station', 'status', 'upper_bound'],
+            },
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='status_changed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='OrderEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('from_status', models.CharField(blank=True, help_text='Empty for the creation event', max_length=20)),
+                ('to_status', models.CharField(max_length=20)),
+                ('duration_seconds', models.FloatField(blank=True, help_text='Time spent in from_status', null=True)),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='order_events', to=settings.AUTH_USER_MODEL)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='orders.order')),
+            ],
+            options={
+                'ordering': ['created_at'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='kitchenslabucket',
+            constraint=models.UniqueConstraint(fields=('day', 'station', 'status', 'upper_bound'), name='unique_sla_bucket'),
+        ),
+    ]
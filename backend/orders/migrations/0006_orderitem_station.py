@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 19:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_order_events_and_sla'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='station',
+            field=models.SlugField(default='kitchen', max_length=30),
+        ),
+    ]
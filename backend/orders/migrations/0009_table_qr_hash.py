@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 19:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0008_stripe_events'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='table',
+            name='qr_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+    ]
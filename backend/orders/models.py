@@ -1,42 +1,61 @@
 import uuid
-import qrcode
-from io import BytesIO
-from django.db import models
+from decimal import Decimal
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import models, transaction
 from django.core.files.base import ContentFile
+from django.utils import timezone
 from menu.models import MenuItem
 
 
+class TableQuerySet(models.QuerySet):
+    def with_active_orders_count(self):
+        """Annotate ``active_orders_total`` (orders not served or cancelled)."""
+        return self.annotate(active_orders_total=models.Count(
+            'orders', filter=~models.Q(orders__status__in=['served', 'cancelled']),
+        ))
+
+
 class Table(models.Model):
     number = models.PositiveIntegerField(unique=True)
     name = models.CharField(max_length=50, blank=True)
     capacity = models.PositiveIntegerField(default=4)
     is_active = models.BooleanField(default=True)
     qr_code = models.ImageField(upload_to='qr_codes/', blank=True, null=True)
+    # Hash of the payload and style qr_code was rendered from (see orders.qr).
+    qr_hash = models.CharField(max_length=64, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = TableQuerySet.as_manager()
+
     class Meta:
         ordering = ['number']
 
     def __str__(self):
         return self.name or f"Table {self.number}"
 
-    def generate_qr_code(self, base_url='http://localhost:8000'):
-        """Generate QR code for this table."""
-        qr_data = f"{base_url}/table/{self.number}"
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_H,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(qr_data)
-        qr.make(fit=True)
+    def generate_qr_code(self, base_url='http://localhost:8000', force=False):
+        """
+        Generate QR code for this table.
 
-        img = qr.make_image(fill_color="black", back_color="white")
-        buffer = BytesIO()
-        img.save(buffer, format='PNG')
+        Skips rendering and uploading when the stored image already matches
+        the payload and style. Returns True if a new image was saved.
+        """
+        from .qr import cached_png, qr_hash, table_payload
+
+        payload = table_payload(self.number, base_url)
+        if not force and self.qr_code and self.qr_hash == qr_hash(payload):
+            return False
+
+        digest, png = cached_png(payload)
         filename = f"table_{self.number}_qr.png"
-        self.qr_code.save(filename, ContentFile(buffer.getvalue()), save=True)
+        self.qr_code.save(filename, ContentFile(png), save=False)
+        self.qr_hash = digest
+        if self.pk:
+            self.save(update_fields=['qr_code', 'qr_hash'])
+        else:
+            self.save()
+        return True
 
     def save(self, *args, **kwargs):
         if not self.name:
@@ -44,6 +63,46 @@ class Table(models.Model):
         super().save(*args, **kwargs)
 
 
+def _send_status_changed_on_commit(transitions):
+    from .signals import order_status_changed
+
+    changes = [
+        {key: row[key] for key in ('order_id', 'from_status', 'to_status')}
+        for row in transitions
+    ]
+    transaction.on_commit(
+        lambda: order_status_changed.send(sender=Order, changes=changes)
+    )
+
+
+class OrderQuerySet(models.QuerySet):
+    def mark_paid(self, payment_method, now=None):
+        """
+        Mark the still-unpaid orders in this queryset as paid.
+
+        The unpaid rows are locked and read, then updated by id, so orders
+        someone already marked paid are left alone. Returns the orders that
+        changed as dicts with ``id``, ``table__number``, ``payment_status``,
+        ``payment_method`` and ``version``.
+        """
+        with transaction.atomic():
+            rows = list(
+                self.filter(payment_status='unpaid').select_for_update(of=('self',))
+                .order_by('pk').values('id', 'table__number', 'version')
+            )
+            if rows:
+                Order.objects.filter(pk__in=[row['id'] for row in rows]).update(
+                    payment_status='paid',
+                    payment_method=payment_method,
+                    version=models.F('version') + 1,
+                    updated_at=now or timezone.now(),
+                )
+        return [
+            {**row, 'payment_status': 'paid', 'payment_method': payment_method, 'version': row['version'] + 1}
+            for row in rows
+        ]
+
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -64,20 +123,37 @@ class Order(models.Model):
         ('card', 'Card'),  # e.g. Stripe
     ]
 
+    SERVICE_CHARGE_RATE = Decimal('0.10')  # 10% service charge
+
+    # Allowed status moves, keyed by the current status.
+    VALID_TRANSITIONS = {
+        'pending': ['confirmed', 'cooking', 'cancelled'],
+        'confirmed': ['cooking', 'cancelled'],
+        'cooking': ['ready', 'cancelled'],
+        'ready': ['served'],
+        'served': [],
+        'cancelled': [],
+    }
+
     order_number = models.CharField(max_length=20, unique=True, editable=False)
     table = models.ForeignKey(Table, on_delete=models.CASCADE, related_name='orders')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     payment_status = models.CharField(max_length=20, choices=PAYMENT_STATUS_CHOICES, default='unpaid')
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHOD_CHOICES, default='cash')
+    payment_intent_id = models.CharField(max_length=255, blank=True, db_index=True)
     subtotal = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     service_charge = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     notes = models.TextField(blank=True)
     customer_name = models.CharField(max_length=100, blank=True)
     estimated_time = models.PositiveIntegerField(default=20, help_text='Estimated time in minutes')
+    version = models.PositiveIntegerField(default=1, help_text='Bumped on every change to the order')
+    status_changed_at = models.DateTimeField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = OrderQuerySet.as_manager()
+
     class Meta:
         ordering = ['-created_at']
 
@@ -87,11 +163,143 @@ class Order(models.Model):
     def save(self, *args, **kwargs):
         if not self.order_number:
             self.order_number = self._generate_order_number()
+        if not self.status_changed_at:
+            self.status_changed_at = timezone.now()
         super().save(*args, **kwargs)
 
+    def _status_change_queryset(self, expected_version=None):
+        queryset = Order.objects.filter(pk=self.pk, status=self.status)
+        if expected_version is not None:
+            queryset = queryset.filter(version=expected_version)
+        return queryset
+
+    def _apply_status_change(self, new_status, now, expected_version=None):
+        self.status = new_status
+        self.version = (expected_version or self.version) + 1
+        self.updated_at = now
+        self.status_changed_at = now
+
+    def transition_to(self, new_status, expected_version=None, actor=None):
+        """
+        Move the order to ``new_status`` with one conditional UPDATE.
+
+        The row only changes if it still has the status this instance read
+        (and ``expected_version``, when the client sent one). Returns False,
+        leaving the instance untouched, when another writer got there first.
+        A successful move is logged as an :class:`OrderEvent`.
+        """
+        from .sla import record_transitions
+
+        now = timezone.now()
+        with transaction.atomic():
+            updated = self._status_change_queryset(expected_version).update(
+                status=new_status,
+                version=models.F('version') + 1,
+                updated_at=now,
+                status_changed_at=now,
+            )
+            if updated:
+                transitions = [{
+                    'order_id': self.pk,
+                    'from_status': self.status,
+                    'to_status': new_status,
+                    'entered_at': self.status_changed_at or self.updated_at,
+                }]
+                record_transitions(transitions, now, actor)
+                _send_status_changed_on_commit(transitions)
+        if updated:
+            self._apply_status_change(new_status, now, expected_version)
+        return bool(updated)
+
+    async def atransition_to(self, new_status, expected_version=None, actor=None):
+        """
+        Async variant of :meth:`transition_to` for consumers.
+
+        The conditional UPDATE and the event log write share a transaction,
+        so both run in a single hop to the ORM thread, which closes stale
+        connections first as every consumer query does.
+        """
+        return await database_sync_to_async(self.transition_to)(new_status, expected_version, actor)
+
+    @classmethod
+    def statuses_leading_to(cls, new_status):
+        """Statuses from which ``new_status`` is an allowed transition."""
+        return [
+            current for current, allowed in cls.VALID_TRANSITIONS.items()
+            if new_status in allowed
+        ]
+
+    @classmethod
+    def bulk_transition(cls, order_ids, new_status, actor=None):
+        """
+        Move every eligible order in ``order_ids`` to ``new_status``.
+
+        The batch's rows are locked (``SELECT ... FOR UPDATE``) and read
+        inside the transaction, so the status each one moves from is the one
+        the single ``UPDATE`` overwrites; no writer can slip in between.
+        Returns ``(changed, results, updated_at)``: the rows that moved
+        (with their old status), a per-id result in request order, and the
+        timestamp written to the moved rows.
+        """
+        from .sla import record_transitions
+
+        sources = cls.statuses_leading_to(new_status)
+        now = timezone.now()
+        with transaction.atomic():
+            current = {
+                row['id']: row for row in cls.objects.filter(pk__in=order_ids)
+                .select_for_update(of=('self',)).order_by('pk').values(
+                    'id', 'order_number', 'status', 'version', 'table__number',
+                    'status_changed_at', 'updated_at',
+                )
+            }
+            moved = [pk for pk, row in current.items() if row['status'] in sources]
+            if moved:
+                cls.objects.filter(pk__in=moved).update(
+                    status=new_status,
+                    version=models.F('version') + 1,
+                    updated_at=now,
+                    status_changed_at=now,
+                )
+                transitions = [
+                    {
+                        'order_id': pk,
+                        'from_status': current[pk]['status'],
+                        'to_status': new_status,
+                        'entered_at': current[pk]['status_changed_at'] or current[pk]['updated_at'],
+                    }
+                    for pk in moved
+                ]
+                record_transitions(transitions, now, actor)
+                _send_status_changed_on_commit(transitions)
+
+        changed, results = [], []
+        for pk in order_ids:
+            row = current.get(pk)
+            if row is None:
+                results.append({'id': pk, 'result': 'not_found'})
+            elif row['status'] in sources:
+                version = row['version'] + 1
+                changed.append({
+                    'id': pk,
+                    'order_number': row['order_number'],
+                    'table_number': row['table__number'],
+                    'status': new_status,
+                    'old_status': row['status'],
+                    'version': version,
+                })
+                results.append({'id': pk, 'result': 'updated', 'status': new_status, 'version': version})
+            else:
+                results.append({
+                    'id': pk,
+                    'result': 'invalid_transition',
+                    'status': row['status'],
+                    'version': row['version'],
+                })
+        return changed, results, now
+
     def _generate_order_number(self):
         """Generate a unique order number."""
-        from django.utils import timezone
         now = timezone.now()
         prefix = now.strftime('%y%m%d')
         last_order = Order.objects.filter(
@@ -107,11 +315,10 @@ class Order(models.Model):
 
     def calculate_totals(self):
         """Calculate subtotal, service charge, and total from order items."""
-        from decimal import Decimal
         self.subtotal = sum(
             item.quantity * item.unit_price for item in self.items.all()
         )
-        self.service_charge = self.subtotal * Decimal('0.10')  # 10% service charge
+        self.service_charge = self.subtotal * self.SERVICE_CHARGE_RATE
         self.total = self.subtotal + self.service_charge
         self.save(update_fields=['subtotal', 'service_charge', 'total'])
 
@@ -122,6 +329,8 @@ class OrderItem(models.Model):
     quantity = models.PositiveIntegerField(default=1)
     unit_price = models.DecimalField(max_digits=10, decimal_places=2)
     notes = models.TextField(blank=True)
+    # Copied from the menu item when ordered, so tickets stay put if the menu is remapped.
+    station = models.SlugField(max_length=30, default='kitchen')
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -138,3 +347,107 @@ class OrderItem(models.Model):
         if not self.unit_price:
             self.unit_price = self.menu_item.price
         super().save(*args, **kwargs)
+
+
+class OrderEvent(models.Model):
+    """Append-only log of order status changes."""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='events')
+    from_status = models.CharField(max_length=20, blank=True, help_text='Empty for the creation event')
+    to_status = models.CharField(max_length=20)
+    actor = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='order_events',
+    )
+    duration_seconds = models.FloatField(
+        null=True,
+        blank=True,
+        help_text='Time spent in from_status',
+    )
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"{self.order_id}: {self.from_status or '-'} → {self.to_status}"
+
+
+class KitchenSLABucket(models.Model):
+    """
+    One histogram bucket of time spent in a status, per day and station.
+
+    Maintained incrementally as transitions are logged, so performance
+    reports read a few dozen rows instead of scanning :class:`OrderEvent`.
+    """
+    day = models.DateField()
+    station = models.CharField(max_length=30, default='kitchen')
+    status = models.CharField(max_length=20)
+    upper_bound = models.PositiveIntegerField(help_text='Bucket upper bound in seconds')
+    count = models.PositiveIntegerField(default=0)
+    total_seconds = models.FloatField(default=0)
+
+    class Meta:
+        ordering = ['day', 'station', 'status', 'upper_bound']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'station', 'status', 'upper_bound'],
+                name='unique_sla_bucket',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.station} {self.status} ≤{self.upper_bound}s: {self.count}"
+
+
+class StripeEvent(models.Model):
+    """
+    A verified Stripe webhook event.
+
+    The unique ``event_id`` is the dedupe store: Stripe retries and
+    duplicate deliveries are dropped on insert. Rows with no
+    ``processed_at`` are still waiting for the background processor.
+    """
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        ordering = ['received_at']
+
+    def __str__(self):
+        return f"{self.event_id} ({self.type})"
+
+
+class QRJob(models.Model):
+    """
+    Progress of a bulk QR generation job (see :func:`orders.qr.start_qr_job`).
+
+    Kept in the database so the admin's progress page can be served by any
+    worker, not just the one running the job.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    done = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    skipped = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"QR job {self.pk} ({self.status})"
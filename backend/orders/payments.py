@@ -0,0 +1,234 @@
+"""
+Stripe PaymentIntents through one shared, pooled client.
+
+All calls go through a single :class:`stripe.StripeClient` backed by an
+``httpx`` connection pool with strict timeouts, so a slow Stripe response
+costs a worker at most ``STRIPE_TIMEOUT_SECONDS``. Intents are created with
+an idempotency key derived from the order and amount, and an order whose
+amount hasn't changed reuses its existing intent instead of creating a new
+one. The same client serves async code through its ``*_async`` methods
+(see :func:`aget_or_create_payment_intent`). ``STRIPE_API_BASE`` points
+the client at a local fake (e.g. stripe-mock) for testing.
+"""
+import threading
+
+import stripe
+from django.conf import settings
+from django.core.cache import cache
+
+
+# Intents the customer can still complete; anything else gets a new one.
+REUSABLE_STATUSES = ('requires_payment_method', 'requires_confirmation', 'requires_action')
+INTENT_CACHE_SECONDS = 60 * 60
+
+_client = None
+_client_lock = threading.Lock()
+
+
+class PaymentsNotConfigured(Exception):
+    pass
+
+
+def stripe_client():
+    """The process-wide Stripe client; built on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = _build_client()
+    return _client
+
+
+def _build_client():
+    import httpx
+
+    api_key = getattr(settings, 'STRIPE_SECRET_KEY', None)
+    if not api_key:
+        raise PaymentsNotConfigured('Stripe is not configured on the server.')
+
+    timeout = getattr(settings, 'STRIPE_TIMEOUT_SECONDS', 10)
+    http_client = stripe.HTTPXClient(
+        timeout=httpx.Timeout(timeout, connect=getattr(settings, 'STRIPE_CONNECT_TIMEOUT_SECONDS', 3)),
+        allow_sync_methods=True,
+    )
+    options = {}
+    api_base = getattr(settings, 'STRIPE_API_BASE', '')
+    if api_base:
+        options['base_addresses'] = {'api': api_base}
+    return stripe.StripeClient(
+        api_key,
+        http_client=http_client,
+        max_network_retries=getattr(settings, 'STRIPE_MAX_NETWORK_RETRIES', 1),
+        **options,
+    )
+
+
+def amount_in_cents(order):
+    return int(order.total * 100)
+
+
+def idempotency_key(order, amount, replacing=None):
+    """
+    Same order and amount -> same key, so double taps get one intent.
+
+    ``replacing`` is the id of a dead intent being replaced; without it
+    Stripe would hand the dead one back for the next 24 hours.
+    """
+    key = f'dineqr-order-{order.pk}-{amount}'
+    return f'{key}-after-{replacing}' if replacing else key
+
+
+def _cache_key(order, amount):
+    return f'orders:payment_intent:{order.pk}:{amount}'
+
+
+def _create_params(order, amount):
+    return {
+        'amount': amount,
+        'currency': getattr(settings, 'STRIPE_CURRENCY', 'usd'),
+        'metadata': {'order_id': order.pk},
+    }
+
+
+def _reusable(intent, amount):
+    return intent.amount == amount and intent.status in REUSABLE_STATUSES
+
+
+def _remember(order, amount, intent):
+    """Cache the intent and note it on the order (card payment)."""
+    from .models import Order
+
+    cache.set(_cache_key(order, amount), {
+        'id': intent.id,
+        'client_secret': intent.client_secret,
+    }, INTENT_CACHE_SECONDS)
+    if order.payment_intent_id != intent.id or order.payment_method != 'card':
+        Order.objects.filter(pk=order.pk).update(payment_intent_id=intent.id, payment_method='card')
+        order.payment_intent_id = intent.id
+        order.payment_method = 'card'
+    return {'id': intent.id, 'client_secret': intent.client_secret}
+
+
+def get_or_create_payment_intent(order):
+    """
+    ``{'id', 'client_secret'}`` for paying ``order`` by card.
+
+    Served from cache for an unchanged order, otherwise the order's
+    existing intent is reused when still payable, otherwise a new one is
+    created idempotently. Raises ``stripe.StripeError`` on API failures.
+    """
+    amount = amount_in_cents(order)
+    cached = cache.get(_cache_key(order, amount))
+    if cached and cached['id'] == order.payment_intent_id:
+        return cached
+
+    client = stripe_client()
+    replacing = None
+    if order.payment_intent_id:
+        intent = client.v1.payment_intents.retrieve(order.payment_intent_id)
+        if _reusable(intent, amount):
+            return _remember(order, amount, intent)
+        if intent.amount == amount:
+            replacing = intent.id
+
+    intent = client.v1.payment_intents.create(
+        params=_create_params(order, amount),
+        options={'idempotency_key': idempotency_key(order, amount, replacing)},
+    )
+    return _remember(order, amount, intent)
+
+
+def _checkout_key(table, totals):
+    amount = int(totals['total'] * 100)
+    key = (
+        f"dineqr-table-{table.pk}-{totals['first_order_id']}-{totals['last_order_id']}"
+        f"-{totals['order_count']}-{amount}"
+    )
+    return amount, key
+
+
+def cached_checkout_intent(table, totals):
+    """The bill's intent from an earlier checkout attempt, if still cached."""
+    _, key = _checkout_key(table, totals)
+    return cache.get(f'orders:checkout_intent:{key}')
+
+
+def get_or_create_checkout_intent(table, totals):
+    """
+    ``{'id', 'client_secret'}`` for paying a whole table's bill by card.
+
+    ``totals`` comes from :func:`orders.checkout.bill_totals`. The same set
+    of orders and amount always maps to the same idempotency key, so the
+    intent is reused until the bill changes.
+    """
+    amount, key = _checkout_key(table, totals)
+    cache_key = f'orders:checkout_intent:{key}'
+    cached = cache.get(cache_key)
+    if cached:
+        return cached
+
+    intent = stripe_client().v1.payment_intents.create(
+        params={
+            'amount': amount,
+            'currency': getattr(settings, 'STRIPE_CURRENCY', 'usd'),
+            'metadata': {'table_number': table.number, 'order_count': totals['order_count']},
+        },
+        options={'idempotency_key': key},
+    )
+    result = {'id': intent.id, 'client_secret': intent.client_secret}
+    cache.set(cache_key, result, INTENT_CACHE_SECONDS)
+    return result
+
+
+async def aget_or_create_payment_intent(order):
+    """Async :func:`get_or_create_payment_intent`; Stripe I/O stays on the event loop."""
+    from channels.db import database_sync_to_async
+
+    amount = amount_in_cents(order)
+    cached = await cache.aget(_cache_key(order, amount))
+    if cached and cached['id'] == order.payment_intent_id:
+        return cached
+
+    client = stripe_client()
+    replacing = None
+    if order.payment_intent_id:
+        intent = await client.v1.payment_intents.retrieve_async(order.payment_intent_id)
+        if _reusable(intent, amount):
+            return await database_sync_to_async(_remember)(order, amount, intent)
+        if intent.amount == amount:
+            replacing = intent.id
+
+    intent = await client.v1.payment_intents.create_async(
+        params=_create_params(order, amount),
+        options={'idempotency_key': idempotency_key(order, amount, replacing)},
+    )
+    return await database_sync_to_async(_remember)(order, amount, intent)
+
+
+def publish_payment_updates(orders):
+    """
+    Tell the cashier group and each table's group that orders were paid.
+
+    ``orders`` are dicts with ``id``, ``table__number``, ``payment_status``,
+    ``payment_method`` and ``version``.
+    """
+    from .notifications import publish_many
+
+    rows = [
+        {
+            'id': order['id'],
+            'table_number': order['table__number'],
+            'payment_status': order['payment_status'],
+            'payment_method': order['payment_method'],
+            'version': order['version'],
+        }
+        for order in orders
+    ]
+    by_table = {}
+    for row in rows:
+        by_table.setdefault(row['table_number'], []).append(row)
+
+    publish_many([('cashier', {'type': 'payment_status_update', 'orders': rows})] + [
+        (f'table_{table_number}', {'type': 'payment_status_update', 'orders': table_rows})
+        for table_number, table_rows in by_table.items()
+    ])
@@ -0,0 +1,307 @@
+"""
+Content-addressed QR code rendering.
+
+A rendered QR image depends only on its payload and style, so it is keyed
+by a hash of both. :meth:`Table.generate_qr_code` skips rendering and
+uploading entirely when the table already carries that hash, and renders
+are kept in a shared on-disk cache (``QR_CACHE_DIR``) so workers, the
+admin action and ``seed_dineqr_demo`` never render the same image twice.
+
+Bulk generation renders cache misses across a process pool and uploads to
+storage from a thread pool; the admin runs it as a background job whose
+progress is kept in the database (:class:`orders.models.QRJob`), so any
+worker can report it.
+"""
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import timedelta
+from functools import lru_cache
+from io import BytesIO
+from pathlib import Path
+
+import qrcode
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.db import close_old_connections
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+
+# Bump when the renderer changes output for the same payload and style.
+RENDER_VERSION = 1
+
+DEFAULT_STYLE = {
+    'error_correction': 'H',
+    'box_size': 10,
+    'border': 4,
+    'fill_color': 'black',
+    'back_color': 'white',
+}
+
+ERROR_CORRECTION = {
+    'L': qrcode.constants.ERROR_CORRECT_L,
+    'M': qrcode.constants.ERROR_CORRECT_M,
+    'Q': qrcode.constants.ERROR_CORRECT_Q,
+    'H': qrcode.constants.ERROR_CORRECT_H,
+}
+
+
+def table_payload(number, base_url):
+    return f"{base_url.rstrip('/')}/table/{number}"
+
+
+def qr_hash(payload, style=None):
+    """Hex digest identifying the image for ``payload`` drawn in ``style``."""
+    key = json.dumps(
+        {'payload': payload, 'style': style or DEFAULT_STYLE, 'version': RENDER_VERSION},
+        sort_keys=True,
+    )
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def _make_qr(payload, style):
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=ERROR_CORRECTION[style['error_correction']],
+        box_size=style['box_size'],
+        border=style['border'],
+    )
+    qr.add_data(payload)
+    qr.make(fit=True)
+    return qr
+
+
+def render_png(payload, style=None):
+    """Render ``payload`` as PNG bytes."""
+    style = style or DEFAULT_STYLE
+    img = _make_qr(payload, style).make_image(
+        fill_color=style['fill_color'], back_color=style['back_color'],
+    )
+    buffer = BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def render_svg(payload, style=None):
+    """
+    Render ``payload`` as a compact SVG.
+
+    One module is one user unit and every horizontal run of dark modules is
+    a single subpath, so the whole code is one ``<path>``.
+    """
+    style = style or DEFAULT_STYLE
+    matrix = _make_qr(payload, style).get_matrix()  # includes the border
+    size = len(matrix)
+    runs = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < size:
+            if not row[x]:
+                x += 1
+                continue
+            start = x
+            while x < size and row[x]:
+                x += 1
+            runs.append(f'M{start} {y}h{x - start}v1H{start}z')
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" '
+        f'shape-rendering="crispEdges">'
+        f'<rect width="{size}" height="{size}" fill="{style["back_color"]}"/>'
+        f'<path fill="{style["fill_color"]}" d="{"".join(runs)}"/></svg>'
+    ).encode()
+
+
+def cache_dir():
+    return Path(getattr(settings, 'QR_CACHE_DIR', settings.BASE_DIR / '.qr_cache'))
+
+
+def cache_path(digest, directory=None):
+    return Path(directory or cache_dir()) / digest[:2] / f'{digest}.png'
+
+
+def _store(path, png):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write then rename so concurrent readers never see a partial file.
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as fh:
+        fh.write(png)
+    os.replace(tmp, path)
+
+
+def cached_png(payload, style=None):
+    """``(digest, png_bytes)``, rendering only on a cache miss."""
+    digest = qr_hash(payload, style)
+    path = cache_path(digest)
+    try:
+        return digest, path.read_bytes()
+    except FileNotFoundError:
+        pass
+
+    png = render_png(payload, style)
+    _store(path, png)
+    return digest, png
+
+
+# --- on-the-fly rendering ---------------------------------------------------
+
+CONTENT_TYPES = {'png': 'image/png', 'svg': 'image/svg+xml'}
+LRU_SIZE = 512
+
+
+def base_url_for(request):
+    """``QR_BASE_URL`` if set, else the host the request came in on."""
+    return getattr(settings, 'QR_BASE_URL', '') or request.build_absolute_uri('/').rstrip('/')
+
+
+@lru_cache(maxsize=LRU_SIZE)
+def rendered(payload, fmt):
+    """``(etag, body)`` for ``payload`` as ``png`` or ``svg``; LRU cached per process."""
+    digest = qr_hash(payload)
+    if fmt == 'png':
+        body = cached_png(payload)[1]
+    else:
+        body = render_svg(payload)
+    return f'"{digest[:32]}-{fmt}"', body
+
+
+# --- bulk generation ---------------------------------------------------------
+
+# Below this many misses a pool costs more to start than it saves.
+POOL_THRESHOLD = 16
+# Finished jobs are kept this long for the progress page.
+JOB_RETENTION = timedelta(days=1)
+
+
+def _render_into(job):
+    """Process-pool task: render one payload into the cache directory."""
+    payload, style, directory = job
+    path = cache_path(qr_hash(payload, style), directory)
+    if not path.exists():
+        _store(path, render_png(payload, style))
+
+
+def render_many(payloads, style=None, processes=None):
+    """Make sure every payload is in the disk cache, rendering misses in parallel."""
+    directory = str(cache_dir())
+    misses = [
+        payload for payload in dict.fromkeys(payloads)
+        if not cache_path(qr_hash(payload, style), directory).exists()
+    ]
+    processes = processes or getattr(settings, 'QR_RENDER_PROCESSES', None) or os.cpu_count() or 1
+    if processes == 1 or len(misses) < POOL_THRESHOLD:
+        for payload in misses:
+            _render_into((payload, style, directory))
+        return len(misses)
+
+    # spawn, not fork: callers are often threaded (web workers, admin jobs).
+    with ProcessPoolExecutor(
+        max_workers=min(processes, len(misses)),
+        mp_context=multiprocessing.get_context('spawn'),
+    ) as pool:
+        jobs = [(payload, style, directory) for payload in misses]
+        list(pool.map(_render_into, jobs, chunksize=max(1, len(jobs) // (processes * 4))))
+    return len(misses)
+
+
+def generate_table_qr_codes(tables, base_url, force=False, processes=None, progress=None):
+    """
+    Bring the stored QR code of every table in ``tables`` up to date.
+
+    Unchanged tables are skipped, missing renders are produced by
+    :func:`render_many`, uploads run on ``QR_UPLOAD_THREADS`` threads and
+    the new file names and hashes are written with one ``bulk_update``.
+    ``progress(done, total)`` is called as uploads finish. Returns the
+    number of tables that got a new image.
+    """
+    from .models import Table
+
+    pending = []
+    for table in tables:
+        payload = table_payload(table.number, base_url)
+        digest = qr_hash(payload)
+        if force or not table.qr_code or table.qr_hash != digest:
+            pending.append((table, payload, digest))
+    if progress:
+        progress(0, len(pending))
+    if not pending:
+        return 0
+
+    render_many([payload for _, payload, _ in pending], processes=processes)
+
+    def upload(entry):
+        table, _, digest = entry
+        table.qr_code.save(
+            f"table_{table.number}_qr.png",
+            ContentFile(cache_path(digest).read_bytes()),
+            save=False,
+        )
+        table.qr_hash = digest
+
+    threads = getattr(settings, 'QR_UPLOAD_THREADS', 8)
+    with ThreadPoolExecutor(max_workers=min(threads, len(pending))) as pool:
+        futures = [pool.submit(upload, entry) for entry in pending]
+        for done, future in enumerate(as_completed(futures), 1):
+            future.result()
+            if progress:
+                progress(done, len(pending))
+
+    Table.objects.bulk_update(
+        [table for table, _, _ in pending], ['qr_code', 'qr_hash'], batch_size=200,
+    )
+    return len(pending)
+
+
+def qr_job_status(job_id):
+    """The job's progress as a dict, or None for an unknown or expired job."""
+    from .models import QRJob
+
+    try:
+        job = QRJob.objects.get(pk=job_id)
+    except (QRJob.DoesNotExist, ValidationError):
+        return None
+    status = {'status': job.status, 'done': job.done, 'total': job.total}
+    if job.status == 'done':
+        status['skipped'] = job.skipped
+    elif job.status == 'failed':
+        status['error'] = job.error
+    return status
+
+
+def start_qr_job(table_ids, base_url, force=False):
+    """Generate QR codes for ``table_ids`` on a background thread; returns the job id."""
+    from .models import QRJob
+
+    QRJob.objects.filter(created_at__lt=timezone.now() - JOB_RETENTION).delete()
+    job = QRJob.objects.create(total=len(table_ids))
+    jobs = QRJob.objects.filter(pk=job.pk)
+
+    def report(done, total):
+        jobs.update(status='running', done=done, total=total, updated_at=timezone.now())
+
+    def run():
+        from .models import Table
+
+        try:
+            tables = list(Table.objects.filter(pk__in=table_ids))
+            generated = generate_table_qr_codes(tables, base_url, force=force, progress=report)
+            jobs.update(
+                status='done', done=generated, total=generated,
+                skipped=len(tables) - generated, updated_at=timezone.now(),
+            )
+        except Exception as e:
+            logger.exception("QR generation job %s failed", job.pk)
+            jobs.update(status='failed', error=str(e), updated_at=timezone.now())
+        finally:
+            close_old_connections()
+
+    threading.Thread(target=run, name=f'qr-job-{job.pk.hex[:8]}', daemon=True).start()
+    return job.pk.hex
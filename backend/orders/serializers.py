@@ -1,5 +1,8 @@
+from django.db import transaction
 from rest_framework import serializers
 from .models import Table, Order, OrderItem
+from backend.metrics import ORDERS_CREATED
+from menu.images import is_remote, variant_urls
 from menu.serializers import MenuItemSerializer
 
 
@@ -15,21 +18,38 @@ class TableSerializer(serializers.ModelSerializer):
         read_only_fields = ['qr_code', 'created_at']
 
     def get_active_orders_count(self, obj):
+        # Annotated by Table.objects.with_active_orders_count() in list views.
+        if hasattr(obj, 'active_orders_total'):
+            return obj.active_orders_total
         return obj.orders.exclude(status__in=['served', 'cancelled']).count()
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
     menu_item_name = serializers.CharField(source='menu_item.name', read_only=True)
     menu_item_image = serializers.ImageField(source='menu_item.image', read_only=True)
+    menu_item_thumbnail = serializers.SerializerMethodField()
     total_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
 
     class Meta:
         model = OrderItem
         fields = [
-            'id', 'menu_item', 'menu_item_name', 'menu_item_image',
-            'quantity', 'unit_price', 'notes', 'total_price',
+            'id', 'menu_item', 'menu_item_name', 'menu_item_image', 'menu_item_thumbnail',
+            'quantity', 'unit_price', 'notes', 'total_price', 'station',
         ]
-        read_only_fields = ['unit_price']
+        read_only_fields = ['unit_price', 'station']
+
+    def get_menu_item_thumbnail(self, obj):
+        """Small WebP of the item's image, falling back to the image itself."""
+        urls = variant_urls(obj.menu_item.image_variants, self.context.get('request'))
+        if urls:
+            return urls['thumb']['webp']
+        image = obj.menu_item.image
+        if not image:
+            return None
+        if is_remote(image.name):
+            return image.name
+        request = self.context.get('request')
+        return request.build_absolute_uri(image.url) if request is not None else image.url
 
 
 class OrderSerializer(serializers.ModelSerializer):
@@ -45,12 +65,12 @@ class OrderSerializer(serializers.ModelSerializer):
             'id', 'order_number', 'table', 'table_number', 'table_name',
             'status', 'status_display', 'payment_status', 'payment_method',
             'subtotal', 'service_charge', 'total',
-            'notes', 'customer_name', 'estimated_time',
+            'notes', 'customer_name', 'estimated_time', 'version',
             'items', 'items_count',
             'created_at', 'updated_at',
         ]
         read_only_fields = [
-            'order_number', 'subtotal', 'service_charge', 'total',
+            'order_number', 'subtotal', 'service_charge', 'total', 'version',
             'created_at', 'updated_at',
         ]
 
@@ -89,58 +109,116 @@ class OrderCreateSerializer(serializers.Serializer):
 
     def create(self, validated_data):
         from menu.models import MenuItem
+        from .all_day import record_new_order
+        from .eta import kitchen_load
+        from .sla import record_creation
 
         table = Table.objects.get(id=validated_data['table_id'])
         items_data = validated_data['items']
 
+        menu_items = MenuItem.objects.select_related('category').in_bulk(
+            {item['menu_item_id'] for item in items_data}
+        )
+        missing = {item['menu_item_id'] for item in items_data} - set(menu_items)
+        if missing:
+            raise serializers.ValidationError(
+                {'items': f"Unknown menu items: {sorted(missing)}"}
+            )
+
         order = Order.objects.create(
             table=table,
             customer_name=validated_data.get('customer_name', ''),
             notes=validated_data.get('notes', ''),
             payment_method=validated_data.get('payment_method', 'cash'),
         )
+        record_creation(order)
 
         for item_data in items_data:
-            menu_item = MenuItem.objects.get(id=item_data['menu_item_id'])
+            menu_item = menu_items[item_data['menu_item_id']]
             OrderItem.objects.create(
                 order=order,
                 menu_item=menu_item,
                 quantity=item_data['quantity'],
                 unit_price=menu_item.price,
                 notes=item_data.get('notes', ''),
+                station=menu_item.kitchen_station,
             )
 
         order.calculate_totals()
 
-        # Calculate estimated time based on max preparation time
-        max_prep_time = max(
-            MenuItem.objects.get(id=item['menu_item_id']).preparation_time
+        # Estimate from the current kitchen queue, not just this order's items
+        order.estimated_time = kitchen_load.admit(order, [
+            (menu_items[item['menu_item_id']].preparation_time, item['quantity'])
             for item in items_data
-        )
-        order.estimated_time = max_prep_time + 5  # Extra 5 min buffer
+        ])
         order.save(update_fields=['estimated_time'])
 
+        lines = [
+            (menu_items[item['menu_item_id']].kitchen_station, item['menu_item_id'],
+             menu_items[item['menu_item_id']].name, item['quantity'])
+            for item in items_data
+        ]
+        transaction.on_commit(lambda: record_new_order(lines))
+        transaction.on_commit(ORDERS_CREATED.inc)
+
         return order
 
 
 class OrderStatusUpdateSerializer(serializers.Serializer):
     status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+    # Optional: the version the client last saw. A mismatch is a conflict.
+    version = serializers.IntegerField(required=False, allow_null=True, min_value=1)
 
     def validate_status(self, value):
         order = self.context.get('order')
         if order:
-            valid_transitions = {
-                'pending': ['confirmed', 'cooking', 'cancelled'],
-                'confirmed': ['cooking', 'cancelled'],
-                'cooking': ['ready', 'cancelled'],
-                'ready': ['served'],
-                'served': [],
-                'cancelled': [],
-            }
-            allowed = valid_transitions.get(order.status, [])
+            allowed = Order.VALID_TRANSITIONS.get(order.status, [])
             if value not in allowed:
                 raise serializers.ValidationError(
                     f"Cannot transition from '{order.status}' to '{value}'. "
                     f"Allowed: {allowed}"
                 )
         return value
+
+
+class TableCheckoutSerializer(serializers.Serializer):
+    payment_method = serializers.ChoiceField(choices=Order.PAYMENT_METHOD_CHOICES)
+    # Optional: the orders the cashier saw on the bill. Any difference is a conflict.
+    order_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        allow_empty=False,
+        max_length=200,
+    )
+
+    def validate_order_ids(self, value):
+        return list(dict.fromkeys(value))
+
+
+class BillSplitSerializer(serializers.Serializer):
+    # One list of order item ids per person paying.
+    splits = serializers.ListField(
+        child=serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False),
+        allow_empty=False,
+        max_length=50,
+    )
+
+
+class BulkOrderStatusSerializer(serializers.Serializer):
+    order_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=200,
+    )
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+
+    def validate_order_ids(self, value):
+        # Keep request order, drop repeats.
+        return list(dict.fromkeys(value))
+
+    def validate_status(self, value):
+        if not Order.statuses_leading_to(value):
+            raise serializers.ValidationError(
+                f"No order can transition to '{value}'."
+            )
+        return value
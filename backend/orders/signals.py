@@ -0,0 +1,20 @@
+"""
+Order lifecycle signals.
+
+Sent once the change has committed, so receivers (live ETAs, kitchen
+counters, ...) never see a transition that was rolled back.
+"""
+from django.dispatch import Signal
+
+
+# kwargs: ``changes`` — list of dicts with ``order_id``, ``from_status``
+# and ``to_status``.
+order_status_changed = Signal()
+
+
+def count_status_changes(sender, changes, **kwargs):
+    """``order_status_changed`` receiver feeding the throughput metrics."""
+    from backend.metrics import ORDER_STATUS_CHANGES
+
+    for change in changes:
+        ORDER_STATUS_CHANGES.labels(change['to_status']).inc()
@@ -0,0 +1,169 @@
+"""
+Order lifecycle log and incrementally maintained kitchen SLA histograms.
+
+Every status change appends an :class:`OrderEvent` and bumps one
+:class:`KitchenSLABucket` per (day, station, status left, duration bucket)
+for each station with items on the order. Percentiles are then estimated
+from the histogram, so reports never have to replay the event log.
+"""
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
+
+from .models import KitchenSLABucket, OrderEvent, OrderItem
+
+
+# Bucket upper bounds in seconds; anything slower lands in the last one.
+SLA_BUCKETS = (
+    30, 60, 120, 180, 240, 300, 420, 600, 900, 1200,
+    1500, 1800, 2400, 3600, 5400, 7200, 14400, 86400,
+)
+DEFAULT_STATION = 'kitchen'
+
+
+def bucket_for(seconds):
+    return SLA_BUCKETS[min(bisect_left(SLA_BUCKETS, seconds), len(SLA_BUCKETS) - 1)]
+
+
+def actor_id_for(actor):
+    if actor is None or not getattr(actor, 'is_authenticated', False):
+        return None
+    return actor.pk
+
+
+def record_transitions(transitions, now, actor=None):
+    """
+    Log status changes and fold their durations into the SLA buckets.
+
+    ``transitions`` is a list of dicts with ``order_id``, ``from_status``,
+    ``to_status`` and ``entered_at`` (when the order entered
+    ``from_status``). Call inside the transaction that made the change.
+    """
+    if not transitions:
+        return
+    actor_id = actor_id_for(actor)
+    day = timezone.localdate(now)
+    stations = _stations_for([row['order_id'] for row in transitions])
+
+    events = []
+    increments = defaultdict(lambda: [0, 0.0])
+    for row in transitions:
+        entered_at = row.get('entered_at')
+        duration = (now - entered_at).total_seconds() if entered_at else None
+        events.append(OrderEvent(
+            order_id=row['order_id'],
+            from_status=row['from_status'],
+            to_status=row['to_status'],
+            actor_id=actor_id,
+            duration_seconds=duration,
+            created_at=now,
+        ))
+        if duration is not None:
+            for station in stations.get(row['order_id']) or (DEFAULT_STATION,):
+                key = (station, row['from_status'], bucket_for(duration))
+                increments[key][0] += 1
+                increments[key][1] += duration
+
+    OrderEvent.objects.bulk_create(events)
+    for (station, status, upper_bound), (count, total) in increments.items():
+        _increment_bucket(day, station, status, upper_bound, count, total)
+
+
+def _stations_for(order_ids):
+    """Stations involved in each order; its time in a status counts for each."""
+    stations = {}
+    for order_id, station in OrderItem.objects.filter(
+        order_id__in=order_ids,
+    ).values_list('order_id', 'station').distinct():
+        stations.setdefault(order_id, set()).add(station)
+    return stations
+
+
+def record_creation(order, actor=None):
+    """Log the initial ``'' -> pending`` event for a new order."""
+    OrderEvent.objects.create(
+        order=order,
+        from_status='',
+        to_status=order.status,
+        actor_id=actor_id_for(actor),
+        created_at=order.status_changed_at or order.created_at,
+    )
+
+
+def _increment_bucket(day, station, status, upper_bound, count, total):
+    lookup = {'day': day, 'station': station, 'status': status, 'upper_bound': upper_bound}
+    updated = KitchenSLABucket.objects.filter(**lookup).update(
+        count=models.F('count') + count,
+        total_seconds=models.F('total_seconds') + total,
+    )
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            KitchenSLABucket.objects.create(count=count, total_seconds=total, **lookup)
+    except IntegrityError:
+        # Another writer created the bucket first; add to theirs.
+        KitchenSLABucket.objects.filter(**lookup).update(
+            count=models.F('count') + count,
+            total_seconds=models.F('total_seconds') + total,
+        )
+
+
+def percentile_from_buckets(buckets, pct):
+    """
+    Estimate a percentile from ``[(upper_bound, count), ...]``.
+
+    Interpolates linearly inside the bucket that holds the target rank.
+    """
+    total = sum(count for _, count in buckets)
+    if not total:
+        return None
+    target = pct / 100 * total
+    seen = 0
+    for upper_bound, count in sorted(buckets):
+        if count and seen + count >= target:
+            # Empty buckets aren't stored, so the lower edge comes from SLA_BUCKETS.
+            index = bisect_left(SLA_BUCKETS, upper_bound)
+            lower = SLA_BUCKETS[index - 1] if index else 0
+            fraction = (target - seen) / count
+            return round(lower + fraction * (upper_bound - lower), 1)
+        seen += count
+    return float(max(upper_bound for upper_bound, _ in buckets))
+
+
+def kitchen_performance(start_day, days=1, station=None):
+    """
+    Per day, station and status: count, mean, p50 and p90 seconds spent.
+
+    Reads only the precomputed buckets for the requested window.
+    """
+    rows = KitchenSLABucket.objects.filter(
+        day__gte=start_day,
+        day__lt=start_day + timedelta(days=days),
+    )
+    if station:
+        rows = rows.filter(station=station)
+
+    grouped = defaultdict(list)
+    for row in rows.values_list('day', 'station', 'status', 'upper_bound', 'count', 'total_seconds'):
+        day, row_station, status, upper_bound, count, total = row
+        grouped[(day, row_station, status)].append((upper_bound, count, total))
+
+    report = []
+    for (day, row_station, status), buckets in sorted(grouped.items()):
+        count = sum(b[1] for b in buckets)
+        total = sum(b[2] for b in buckets)
+        histogram = [(b[0], b[1]) for b in buckets]
+        report.append({
+            'day': day.isoformat(),
+            'station': row_station,
+            'status': status,
+            'count': count,
+            'avg_seconds': round(total / count, 1) if count else None,
+            'p50_seconds': percentile_from_buckets(histogram, 50),
+            'p90_seconds': percentile_from_buckets(histogram, 90),
+        })
+    return report
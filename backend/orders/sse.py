@@ -0,0 +1,226 @@
+"""
+Server-Sent Events stream for guest order tracking.
+
+Guests only ever read their own table's updates, so instead of holding a
+full ``OrderConsumer`` socket each one keeps a plain streaming HTTP response
+that relays the ``table_<n>`` channel group.
+
+Under ASGI the stream is served by :class:`TableEventStreamApp`, routed
+ahead of Django in ``backend.asgi``. Going through Django's handler would
+keep an HttpRequest, the middleware chain's state and a per-request
+executor thread with its own database connection alive for the whole
+stream, which made each guest stream cost about twice a WebSocket. The
+ASGI app holds one channel-layer inbox and one suspended coroutine.
+:class:`TableEventStreamView` serves the same stream under WSGI and the
+test client.
+"""
+import asyncio
+import json
+from datetime import datetime, timezone as dt_timezone
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
+
+from .models import Order, Table
+from .serializers import OrderSerializer
+
+
+# Seconds between keep-alive comments (keeps proxies from timing out).
+HEARTBEAT_SECONDS = getattr(settings, 'SSE_HEARTBEAT_SECONDS', 15)
+# Streams are closed after this long; EventSource reconnects on its own and
+# resumes from Last-Event-ID, which bounds the lifetime of abandoned streams.
+STREAM_SECONDS = getattr(settings, 'SSE_STREAM_SECONDS', 300)
+# Client reconnect delay advertised in the stream, in milliseconds.
+RETRY_MS = getattr(settings, 'SSE_RETRY_MS', 3000)
+
+STREAM_HEADERS = {
+    'Content-Type': 'text/event-stream',
+    'Cache-Control': 'no-cache',
+    # Tell nginx not to buffer the stream.
+    'X-Accel-Buffering': 'no',
+}
+
+
+class StreamRefused(Exception):
+    def __init__(self, status, error):
+        super().__init__(error)
+        self.status = status
+        self.error = error
+
+
+def event_cursor(payload):
+    """Event id for an order (or batch) payload: its ``updated_at`` in microseconds."""
+    updated_at = payload.get('updated_at') if payload else None
+    if not updated_at:
+        return None
+    return str(int(datetime.fromisoformat(updated_at).timestamp() * 1_000_000))
+
+
+def parse_cursor(value):
+    """Turn a Last-Event-ID back into an aware datetime (None if invalid)."""
+    try:
+        micros = int(value)
+    except (TypeError, ValueError):
+        return None
+    return datetime.fromtimestamp(micros / 1_000_000, tz=dt_timezone.utc)
+
+
+def format_event(event_type, payload, event_id=None):
+    lines = []
+    if event_id:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event_type}')
+    lines.append(f'data: {json.dumps(payload, separators=(",", ":"))}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def orders_changed_since(table_number, since):
+    orders = Order.objects.filter(
+        table__number=table_number,
+        updated_at__gt=since,
+    ).select_related('table').prefetch_related('items__menu_item').order_by('updated_at')
+    return OrderSerializer(orders, many=True).data
+
+
+async def table_event_stream(channel_layer, table_number, since=None):
+    """Yield SSE frames for ``table_<table_number>`` until the stream expires."""
+    group = f'table_{table_number}'
+    channel_name = await channel_layer.new_channel()
+    # Subscribe before replaying so nothing slips between the two.
+    await channel_layer.group_add(group, channel_name)
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+
+        if since is not None:
+            missed = await database_sync_to_async(orders_changed_since)(table_number, since)
+            for order_data in missed:
+                yield format_event('order_update', {'order': order_data}, event_cursor(order_data))
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + STREAM_SECONDS
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                message = await asyncio.wait_for(
+                    channel_layer.receive(channel_name),
+                    timeout=min(HEARTBEAT_SECONDS, remaining),
+                )
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                continue
+
+            event_type = message.pop('type', 'message')
+            yield format_event(
+                event_type, message, event_cursor(message.get('order') or message),
+            )
+    finally:
+        await channel_layer.group_discard(group, channel_name)
+
+
+def table_is_open(number):
+    return Table.objects.filter(number=number, is_active=True).exists()
+
+
+async def open_table_stream(number, last_event_id=None):
+    """The event stream for table ``number``; raises :class:`StreamRefused`."""
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        raise StreamRefused(503, 'Live updates are not configured.')
+    if not await database_sync_to_async(table_is_open)(number):
+        raise StreamRefused(404, 'Table not found or inactive.')
+    return table_event_stream(channel_layer, number, parse_cursor(last_event_id))
+
+
+class TableEventStreamApp:
+    """
+    ASGI app for ``/api/orders/table/<number>/events/``.
+
+    Streams frames until the stream expires or the client disconnects,
+    whichever comes first.
+    """
+
+    async def __call__(self, scope, receive, send):
+        if scope['method'] not in ('GET', 'HEAD'):
+            await self.send_error(send, 405, 'Method not allowed.')
+            return
+
+        headers = dict(scope['headers'])
+        last_event_id = headers.get(b'last-event-id', b'').decode('latin-1') or next(
+            iter(parse_qs(scope.get('query_string', b'').decode('latin-1')).get('last_event_id', ())),
+            None,
+        )
+        try:
+            stream = await open_table_stream(scope['url_route']['kwargs']['number'], last_event_id)
+        except StreamRefused as e:
+            await self.send_error(send, e.status, e.error, headers)
+            return
+
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': self.response_headers(STREAM_HEADERS, headers),
+        })
+        pump = asyncio.ensure_future(self.pump(stream, send))
+        disconnect = asyncio.ensure_future(self.wait_for_disconnect(receive))
+        try:
+            await asyncio.wait({pump, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in (pump, disconnect):
+                task.cancel()
+            await asyncio.gather(pump, disconnect, return_exceptions=True)
+            await stream.aclose()
+        if not pump.cancelled():
+            pump.result()  # re-raise anything the stream raised
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+    async def pump(self, stream, send):
+        async for frame in stream:
+            await send({'type': 'http.response.body', 'body': frame.encode(), 'more_body': True})
+
+    async def wait_for_disconnect(self, receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    def response_headers(self, response_headers, request_headers):
+        headers = [(name.lower().encode(), value.encode()) for name, value in response_headers.items()]
+        # What CorsMiddleware would add; this app runs outside the middleware.
+        if settings.CORS_ALLOW_ALL_ORIGINS and b'origin' in request_headers:
+            headers.append((b'access-control-allow-origin', b'*'))
+        return headers
+
+    async def send_error(self, send, status, error, request_headers=None):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': self.response_headers({'Content-Type': 'application/json'}, request_headers or {}),
+        })
+        await send({'type': 'http.response.body', 'body': json.dumps({'error': error}).encode()})
+
+
+class TableEventStreamView(View):
+    """
+    Stream a table's order updates as Server-Sent Events.
+
+    ``number`` is the table number (the same one encoded in its QR code).
+    Reconnecting clients send ``Last-Event-ID`` (or ``?last_event_id=``)
+    and first receive every order on the table that changed since then.
+    """
+
+    async def get(self, request, number):
+        try:
+            stream = await open_table_stream(
+                number, request.headers.get('Last-Event-ID') or request.GET.get('last_event_id'),
+            )
+        except StreamRefused as e:
+            return JsonResponse({'error': e.error}, status=e.status)
+
+        response = StreamingHttpResponse(stream)
+        for name, value in STREAM_HEADERS.items():
+            response[name] = value
+        return response
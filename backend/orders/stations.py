@@ -0,0 +1,80 @@
+"""
+Station-based kitchen routing.
+
+Each order item carries the station that prepares it (grill, bar, ...).
+New orders are split into one ticket per station and published to
+``kitchen_<station>`` groups, so a display only receives and renders its
+own items. The plain ``kitchen`` group still gets whole orders for expo
+screens.
+"""
+import re
+
+from .notifications import publish_many
+
+
+TICKET_FIELDS = (
+    'id', 'order_number', 'table', 'table_number', 'table_name',
+    'status', 'notes', 'customer_name', 'estimated_time', 'version', 'created_at',
+)
+
+
+STATION_RE = re.compile(r'^[-a-zA-Z0-9_]{1,30}$')
+
+
+def is_valid_station(station):
+    """Station names end up in group names, so they must be slugs."""
+    return bool(station) and bool(STATION_RE.match(station))
+
+
+def station_group(station):
+    return f'kitchen_{station}'
+
+
+def split_into_tickets(order_data):
+    """``{station: ticket}`` where each ticket holds only that station's items."""
+    tickets = {}
+    for item in order_data.get('items', []):
+        station = item.get('station') or 'kitchen'
+        ticket = tickets.get(station)
+        if ticket is None:
+            ticket = {field: order_data.get(field) for field in TICKET_FIELDS}
+            ticket['station'] = station
+            ticket['items'] = []
+            tickets[station] = ticket
+        ticket['items'].append(item)
+    for ticket in tickets.values():
+        ticket['items_count'] = len(ticket['items'])
+    return tickets
+
+
+def station_messages(order_data):
+    """``(group, message)`` pairs giving each station its slice of a new order."""
+    return [
+        (station_group(station), {'type': 'station_ticket', 'ticket': ticket})
+        for station, ticket in split_into_tickets(order_data).items()
+    ]
+
+
+def handle_status_changed(sender, changes, **kwargs):
+    """``order_status_changed`` receiver: tell each involved station."""
+    from .models import OrderItem
+
+    stations = {}
+    for order_id, station in OrderItem.objects.filter(
+        order_id__in=[change['order_id'] for change in changes],
+    ).values_list('order_id', 'station').distinct():
+        stations.setdefault(order_id, set()).add(station)
+
+    by_station = {}
+    for change in changes:
+        for station in stations.get(change['order_id'], ()):
+            by_station.setdefault(station, []).append({
+                'id': change['order_id'],
+                'status': change['to_status'],
+                'old_status': change['from_status'],
+            })
+
+    publish_many([
+        (station_group(station), {'type': 'station_status_update', 'orders': orders})
+        for station, orders in by_station.items()
+    ])
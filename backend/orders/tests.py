@@ -0,0 +1,903 @@
+import asyncio
+import json
+import shutil
+import tempfile
+import threading
+from io import StringIO
+from types import SimpleNamespace
+from unittest import mock
+
+import stripe
+
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, models, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from rest_framework.test import APIClient
+
+from menu.models import Category, MenuItem
+from users.models import User
+
+from . import payments, qr
+from .all_day import all_day_counts
+from .benchmarking import percentile, summarize_ms
+from .checkout import bill_amounts
+from .datagen import generate_orders
+from .eta import kitchen_load
+from .models import Order, OrderEvent, QRJob, StripeEvent, Table
+from .webhooks import process_pending
+
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def make_order(table, item, quantity=1, **fields):
+    order = Order.objects.create(table=table, **fields)
+    order.items.create(menu_item=item, quantity=quantity, unit_price=item.price)
+    order.calculate_totals()
+    return order
+
+
+class OrdersTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.table = Table.objects.create(number=1)
+        category = Category.objects.create(name='Mains')
+        cls.item = MenuItem.objects.create(name='Tibs', price='1.05', category=category)
+
+    def setUp(self):
+        self.client = APIClient()
+
+
+class LoadTestHelperTests(SimpleTestCase):
+    def test_nearest_rank_percentiles(self):
+        samples = [n / 1000 for n in range(1, 101)]
+        self.assertEqual(percentile(samples, 50), 0.05)
+        self.assertEqual(percentile(samples, 99), 0.099)
+        self.assertIsNone(percentile([], 50))
+        self.assertEqual(summarize_ms(samples)['p95_ms'], 95.0)
+        self.assertEqual(summarize_ms([])['count'], 0)
+
+
+class WebSocketLoadTestTests(TransactionTestCase):
+    def setUp(self):
+        from .management.commands.loadtest_websockets import Command
+
+        self.command = Command()
+        category = Category.objects.create(name='Load test')
+        self.command.menu_item = MenuItem.objects.create(name='Tibs', price=10, category=category)
+        self.command.table_ids = {
+            number: Table.objects.create(number=number).pk for number in (1, 2, 3)
+        }
+
+    async def test_every_socket_gets_its_events(self):
+        from backend.asgi import application
+
+        result = await self.command.run(application, 3, {
+            'timeout': 5, 'kitchen_sockets': 2, 'orders': 4, 'layer': 'memory',
+        })
+        self.assertEqual(result['lost'], 0)
+        # Per order: new_order and the status change to both kitchens,
+        # order_update and the status change to its table.
+        self.assertEqual(result['deliveries'], 4 * (2 * 2 + 2))
+        self.assertEqual(result['table_latency']['count'], 8)
+        self.assertGreater(result['kib_per_socket'], 0)
+
+
+class BulkOrderStatusTests(OrdersTestCase):
+    url = '/api/orders/bulk-status/'
+
+    def setUp(self):
+        super().setUp()
+        self.order = make_order(self.table, self.item)
+        self.payload = {'order_ids': [self.order.pk], 'status': 'cooking'}
+
+    def test_anonymous_request_is_rejected(self):
+        response = self.client.post(self.url, self.payload, format='json')
+        self.assertEqual(response.status_code, 401)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'pending')
+
+    def test_cashier_is_forbidden(self):
+        self.client.force_authenticate(User.objects.create_user('till', password='x', role='cashier'))
+        response = self.client.post(self.url, self.payload, format='json')
+        self.assertEqual(response.status_code, 403)
+
+    def test_kitchen_can_move_orders(self):
+        self.client.force_authenticate(User.objects.create_user('chef', password='x', role='kitchen'))
+        response = self.client.post(self.url, self.payload, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['updated'], 1)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'cooking')
+
+
+    def test_each_order_logs_the_status_it_left(self):
+        confirmed = make_order(self.table, self.item, status='confirmed')
+        served = make_order(self.table, self.item, status='served')
+        changed, results, _ = Order.bulk_transition([self.order.pk, confirmed.pk, served.pk, 0], 'cooking')
+        self.assertEqual(
+            [result['result'] for result in results],
+            ['updated', 'updated', 'invalid_transition', 'not_found'],
+        )
+        self.assertEqual({row['id']: row['old_status'] for row in changed}, {
+            self.order.pk: 'pending', confirmed.pk: 'confirmed',
+        })
+        self.assertEqual(
+            dict(OrderEvent.objects.filter(to_status='cooking').values_list('order_id', 'from_status')),
+            {self.order.pk: 'pending', confirmed.pk: 'confirmed'},
+        )
+        for row in changed:
+            self.assertEqual(row['version'], Order.objects.get(pk=row['id']).version)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class BulkTransitionConcurrencyTests(TransactionTestCase):
+    def test_waits_for_a_concurrent_writer(self):
+        order = Order.objects.create(table=Table.objects.create(number=1))
+        changed = []
+
+        def bump():
+            try:
+                changed.extend(Order.bulk_transition([order.pk], 'cooking')[0])
+            finally:
+                connection.close()
+
+        with transaction.atomic():
+            Order.objects.select_for_update().get(pk=order.pk)
+            Order.objects.filter(pk=order.pk).update(status='confirmed', version=models.F('version') + 1)
+            thread = threading.Thread(target=bump)
+            thread.start()
+            thread.join(0.5)
+            # Blocked on our row lock until we commit.
+            self.assertTrue(thread.is_alive())
+        thread.join()
+
+        self.assertEqual(changed[0]['old_status'], 'confirmed')
+        self.assertEqual(changed[0]['version'], Order.objects.get(pk=order.pk).version)
+        self.assertEqual(OrderEvent.objects.get(to_status='cooking').from_status, 'confirmed')
+
+
+class OrderTransitionTests(OrdersTestCase):
+    def setUp(self):
+        super().setUp()
+        self.order = make_order(self.table, self.item)
+
+    def test_stale_version_is_refused(self):
+        self.assertFalse(self.order.transition_to('confirmed', expected_version=self.order.version + 1))
+        self.assertEqual(Order.objects.get(pk=self.order.pk).status, 'pending')
+        self.assertTrue(self.order.transition_to('confirmed', expected_version=self.order.version))
+        self.assertEqual(Order.objects.get(pk=self.order.pk).version, self.order.version)
+
+    def test_stale_status_is_refused(self):
+        stale = Order.objects.get(pk=self.order.pk)
+        self.assertTrue(self.order.transition_to('cooking'))
+        self.assertFalse(stale.transition_to('cancelled'))
+        self.assertEqual(stale.status, 'pending')
+
+    async def test_async_transition_is_logged(self):
+        order = await Order.objects.aget(pk=self.order.pk)
+        self.assertTrue(await order.atransition_to('cooking', expected_version=order.version))
+        event = await OrderEvent.objects.aget(order_id=order.pk, to_status='cooking')
+        self.assertEqual(event.from_status, 'pending')
+        self.assertFalse(await order.atransition_to('ready', expected_version=order.version - 1))
+
+
+class OrderStatusConflictTests(OrdersTestCase):
+    def setUp(self):
+        super().setUp()
+        self.order = make_order(self.table, self.item)
+        self.url = f'/api/orders/{self.order.pk}/status/'
+
+    def test_current_version_moves_the_order(self):
+        response = self.client.patch(self.url, {'status': 'confirmed', 'version': self.order.version}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['version'], self.order.version + 1)
+
+    def test_stale_version_is_a_conflict_with_the_current_order(self):
+        Order.objects.filter(pk=self.order.pk).update(notes='extra napkins', version=self.order.version + 1)
+        response = self.client.patch(self.url, {'status': 'confirmed', 'version': self.order.version}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['order']['version'], self.order.version + 1)
+        self.assertEqual(response.data['order']['status'], 'pending')
+        self.assertFalse(OrderEvent.objects.filter(to_status='confirmed').exists())
+
+    def test_second_cashier_cannot_pay_twice(self):
+        first = Order.objects.filter(pk=self.order.pk).mark_paid('cash')
+        self.assertEqual([row['id'] for row in first], [self.order.pk])
+        self.assertEqual(Order.objects.filter(pk=self.order.pk).mark_paid('cash'), [])
+        self.assertEqual(Order.objects.get(pk=self.order.pk).version, first[0]['version'])
+
+
+class OrderSocketStatusTests(OrdersTestCase):
+    def setUp(self):
+        super().setUp()
+        self.order = make_order(self.table, self.item)
+        self.chef = User.objects.create_user('chef', password='x', role='kitchen')
+
+    async def connect(self, user=None, path='/ws/orders/'):
+        from channels.routing import URLRouter
+        from channels.testing import WebsocketCommunicator
+
+        from .routing import websocket_urlpatterns
+
+        router = URLRouter(websocket_urlpatterns)
+
+        async def application(scope, receive, send):
+            return await router({**scope, 'user': user, 'role': getattr(user, 'role', None)}, receive, send)
+
+        communicator = WebsocketCommunicator(application, path)
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertEqual((await communicator.receive_json_from())['type'], 'connection_established')
+        return communicator
+
+    async def command(self, communicator, **fields):
+        await communicator.send_json_to({'type': 'update_order_status', 'order_id': self.order.pk, **fields})
+        return await communicator.receive_json_from()
+
+    async def test_kitchen_status_change_is_saved_and_acked(self):
+        communicator = await self.connect(self.chef)
+        reply = await self.command(communicator, status='cooking', version=self.order.version, request_id='r1')
+        self.assertEqual(reply['type'], 'order_status_ack')
+        self.assertEqual(reply['request_id'], 'r1')
+        order = await Order.objects.aget(pk=self.order.pk)
+        self.assertEqual((order.status, order.version), ('cooking', reply['version']))
+        await communicator.disconnect()
+
+    async def test_stale_version_is_an_error(self):
+        communicator = await self.connect(self.chef)
+        reply = await self.command(communicator, status='cooking', version=self.order.version + 5)
+        self.assertEqual(reply['type'], 'error')
+        self.assertEqual((await Order.objects.aget(pk=self.order.pk)).status, 'pending')
+        await communicator.disconnect()
+
+    async def test_subscriptions_are_counted_by_kind_of_group(self):
+        from backend.metrics import WEBSOCKET_GROUP_SUBSCRIPTIONS
+
+        tables = WEBSOCKET_GROUP_SUBSCRIPTIONS.labels('table')
+        before = tables.value
+        communicator = await self.connect(path='/ws/orders/7/')
+        await communicator.send_json_to({'type': 'join_table', 'table_number': 8})
+        await communicator.receive_json_from()
+        self.assertEqual(tables.value, before + 2)
+        await communicator.disconnect()
+        self.assertEqual(tables.value, before)
+
+    async def test_guests_cannot_change_status(self):
+        communicator = await self.connect()
+        self.assertEqual((await self.command(communicator, status='cooking'))['type'], 'error')
+        self.assertEqual((await Order.objects.aget(pk=self.order.pk)).status, 'pending')
+        await communicator.disconnect()
+
+
+class KitchenPerformanceTests(OrdersTestCase):
+    url = '/api/orders/kitchen/performance/'
+
+    def test_bad_dates_are_rejected(self):
+        for value in ('2024-02-30', 'yesterday', '2024-13-01'):
+            with self.subTest(date=value):
+                response = self.client.get(self.url, {'date': value})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.data)
+
+    def test_valid_date(self):
+        response = self.client.get(self.url, {'date': '2024-02-29', 'days': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['start'], '2024-02-29')
+
+    def test_time_in_status_is_reported(self):
+        from datetime import timedelta
+
+        from django.utils import timezone
+
+        order = make_order(self.table, self.item)
+        Order.objects.filter(pk=order.pk).update(status_changed_at=timezone.now() - timedelta(seconds=90))
+        Order.objects.get(pk=order.pk).transition_to('cooking')
+
+        event = OrderEvent.objects.get(order=order, to_status='cooking')
+        self.assertAlmostEqual(event.duration_seconds, 90, delta=5)
+        (stats,) = self.client.get(self.url).data['stats']
+        self.assertEqual((stats['station'], stats['status'], stats['count']), ('kitchen', 'pending', 1))
+        self.assertAlmostEqual(stats['avg_seconds'], 90, delta=5)
+        # Interpolated inside the 60-120s bucket.
+        self.assertTrue(60 < stats['p50_seconds'] <= 120)
+
+    def test_percentiles_from_buckets(self):
+        from .sla import percentile_from_buckets
+
+        self.assertEqual(percentile_from_buckets([(60, 1), (120, 1)], 50), 60.0)
+        self.assertEqual(percentile_from_buckets([(60, 1), (120, 1)], 100), 120.0)
+        self.assertIsNone(percentile_from_buckets([(60, 0)], 50))
+        # A lone sample interpolates within its own bucket, not from zero.
+        self.assertEqual(percentile_from_buckets([(120, 1)], 50), 90.0)
+
+
+@override_settings(KITCHEN_PARALLEL_CAPACITY=4, ETA_BUFFER_MINUTES=5)
+class OrderEtaTests(OrdersTestCase):
+    def setUp(self):
+        super().setUp()
+        # Start from an empty queue, forcing a reload on the first order.
+        kitchen_load.orders = {}
+        kitchen_load.total_work = 0.0
+        kitchen_load.loaded_at = None
+        MenuItem.objects.filter(pk=self.item.pk).update(preparation_time=12)
+
+    def create(self):
+        response = self.client.post('/api/orders/create/', {
+            'table_id': self.table.pk,
+            'items': [{'menu_item_id': self.item.pk, 'quantity': 1}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.data['estimated_time']
+
+    def test_first_order_on_empty_kitchen(self):
+        # Its own 12 minutes plus the buffer; nothing queued ahead of it.
+        self.assertEqual(self.create(), 17)
+
+    def test_next_order_waits_for_the_queue(self):
+        self.create()
+        # 12 cook-minutes ahead, shared by 4 cooks.
+        self.assertEqual(self.create(), 20)
+        self.assertEqual(self.create(), 23)
+
+
+class StationRoutingTests(TransactionTestCase):
+    def setUp(self):
+        self.table = Table.objects.create(number=1)
+        grill = Category.objects.create(name='Mains', station='grill')
+        self.tibs = MenuItem.objects.create(name='Tibs', price='120.00', category=grill)
+        self.buna = MenuItem.objects.create(name='Buna', price='30.00', category=grill, station='bar')
+
+    async def receive(self, channel):
+        return await asyncio.wait_for(get_channel_layer().receive(channel), 1)
+
+    async def test_each_station_gets_only_its_items(self):
+        layer = get_channel_layer()
+        channels = {}
+        for station in ('grill', 'bar'):
+            channels[station] = await layer.new_channel()
+            await layer.group_add(f'kitchen_{station}', channels[station])
+
+        response = await sync_to_async(self.client.post)('/api/orders/create/', {
+            'table_id': self.table.pk,
+            'items': [{'menu_item_id': self.tibs.pk, 'quantity': 2}, {'menu_item_id': self.buna.pk, 'quantity': 1}],
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        for station, name in (('grill', 'Tibs'), ('bar', 'Buna')):
+            message = await self.receive(channels[station])
+            self.assertEqual(message['type'], 'station_ticket')
+            self.assertEqual([item['menu_item_name'] for item in message['ticket']['items']], [name])
+
+        response = await sync_to_async(self.client.get)('/api/orders/kitchen/', {'station': 'bar'})
+        (order,) = response.json()
+        self.assertEqual([item['station'] for item in order['items']], ['bar'])
+
+        await sync_to_async(self.client.patch)(
+            f"/api/orders/{order['id']}/status/", {'status': 'cooking'}, content_type='application/json',
+        )
+        for channel in channels.values():
+            message = await self.receive(channel)
+            self.assertEqual(message['type'], 'station_status_update')
+            self.assertEqual(message['orders'][0]['status'], 'cooking')
+
+
+@override_settings(ALL_DAY_RELOAD_SECONDS=3600)
+class AllDayCountsTests(OrdersTestCase):
+    url = '/api/orders/kitchen/all-day/'
+
+    def setUp(self):
+        super().setUp()
+        all_day_counts.counts = {}
+        all_day_counts.loaded_at = None
+        # Load the (empty) board so later changes are applied incrementally.
+        self.client.get(self.url)
+
+    def create(self, quantity):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/orders/create/', {
+                'table_id': self.table.pk,
+                'items': [{'menu_item_id': self.item.pk, 'quantity': quantity}],
+            }, format='json')
+        return response.data['id']
+
+    def quantities(self, **params):
+        return [(row['name'], row['quantity']) for row in self.client.get(self.url, params).data['items']]
+
+    def test_orders_add_and_leave_the_board(self):
+        first = self.create(2)
+        self.create(1)
+        self.assertEqual(self.quantities(), [('Tibs', 3)])
+        self.assertEqual(self.quantities(station='kitchen'), [('Tibs', 3)])
+        self.assertEqual(self.quantities(station='bar'), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.get(pk=first).transition_to('cancelled')
+        self.assertEqual(self.quantities(), [('Tibs', 1)])
+
+    def test_reconcile_repairs_a_missed_change(self):
+        self.create(2)
+        all_day_counts.counts[('kitchen', self.item.pk)] = 7
+        moved = all_day_counts.reconcile()
+        self.assertEqual([row['quantity'] for row in moved], [2])
+        self.assertEqual(self.quantities(), [('Tibs', 2)])
+
+
+class TableCheckoutTests(OrdersTestCase):
+    def setUp(self):
+        super().setUp()
+        # 1.05 each: the service charge rounds differently per order and per bill.
+        self.orders = [make_order(self.table, self.item) for _ in range(3)]
+
+    def test_split_rejects_a_line_listed_twice(self):
+        line_id = self.orders[0].items.get().pk
+        response = self.client.post('/api/orders/table/1/bill/split/', {
+            'splits': [[line_id, line_id]],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(line_id), response.data['error'])
+
+    def test_checkout_charges_the_bill_total(self):
+        bill = self.client.get('/api/orders/table/1/bill/').data
+        response = self.client.post('/api/orders/table/1/checkout/', {
+            'payment_method': 'cash',
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total'], bill['total'])
+        self.assertEqual(response.data['service_charge'], bill['service_charge'])
+
+    def test_cash_checkout_reports_the_orders_it_paid(self):
+        response = self.client.post('/api/orders/table/1/checkout/', {
+            'payment_method': 'cash',
+        }, format='json')
+        self.assertEqual(sorted(response.data['paid_order_ids']), sorted(order.pk for order in self.orders))
+        self.assertEqual(self.client.post('/api/orders/table/1/checkout/', {
+            'payment_method': 'cash',
+        }, format='json').status_code, 404)
+
+    @mock.patch('orders.payments.get_or_create_checkout_intent')
+    def test_card_checkout_keeps_an_open_order_intent(self, create_intent):
+        Order.objects.filter(pk=self.orders[0].pk).update(payment_intent_id='pi_order')
+        response = self.client.post('/api/orders/table/1/checkout/', {
+            'payment_method': 'card',
+        }, format='json')
+        self.assertEqual(response.status_code, 409)
+        # Refused before Stripe was asked for an intent.
+        create_intent.assert_not_called()
+        self.assertEqual(
+            list(Order.objects.order_by('pk').values_list('payment_intent_id', flat=True)),
+            ['pi_order', '', ''],
+        )
+
+    def test_card_checkout_can_be_retried(self):
+        cache.clear()
+        intents = FakePaymentIntents()
+        client = SimpleNamespace(v1=SimpleNamespace(payment_intents=intents))
+        with mock.patch.object(payments, 'stripe_client', return_value=client):
+            for _ in range(2):
+                response = self.client.post('/api/orders/table/1/checkout/', {
+                    'payment_method': 'card',
+                }, format='json')
+                self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(intents.keys), 1)
+        self.assertEqual(set(Order.objects.values_list('payment_intent_id', flat=True)), {'pi_1'})
+
+
+class FakePaymentIntents:
+    """``client.v1.payment_intents`` that, like Stripe, replays a request whose idempotency key it has seen."""
+
+    def __init__(self):
+        self.intents = {}
+        self.by_key = {}
+        self.keys = []
+
+    def create(self, params, options):
+        key = options['idempotency_key']
+        self.keys.append(key)
+        if key not in self.by_key:
+            number = len(self.intents) + 1
+            intent = SimpleNamespace(
+                id=f'pi_{number}', client_secret=f'pi_{number}_secret',
+                amount=params['amount'], status='requires_payment_method',
+            )
+            self.intents[intent.id] = self.by_key[key] = intent
+        return self.by_key[key]
+
+    def retrieve(self, intent_id):
+        return self.intents[intent_id]
+
+    async def create_async(self, params, options):
+        return self.create(params, options)
+
+    async def retrieve_async(self, intent_id):
+        return self.retrieve(intent_id)
+
+
+class FlakyHTTPClient(stripe.HTTPClient):
+    """Fails the first request with a 500, then answers like Stripe."""
+
+    name = 'flaky'
+
+    def __init__(self, amount):
+        super().__init__()
+        self.amount = amount
+        self.headers = []
+
+    def request(self, method, url, headers, post_data=None):
+        self.headers.append(dict(headers))
+        if len(self.headers) == 1:
+            return json.dumps({'error': {'type': 'api_error', 'message': 'try again'}}), 500, {}
+        return json.dumps({
+            'id': 'pi_1', 'object': 'payment_intent', 'client_secret': 'pi_1_secret',
+            'amount': self.amount, 'status': 'requires_payment_method',
+        }), 200, {}
+
+    def close(self):
+        pass
+
+
+class PaymentIntentTests(OrdersTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.order = Order.objects.get(pk=make_order(self.table, self.item).pk)
+        self.amount = payments.amount_in_cents(self.order)
+        self.intents = FakePaymentIntents()
+        patcher = mock.patch.object(payments, 'stripe_client')
+        self.stripe_client = patcher.start()
+        self.stripe_client.return_value = SimpleNamespace(v1=SimpleNamespace(payment_intents=self.intents))
+        self.addCleanup(patcher.stop)
+
+    def pay(self):
+        # A fresh copy, as the next request would load it.
+        return payments.get_or_create_payment_intent(Order.objects.get(pk=self.order.pk))
+
+    def test_double_tap_gets_one_intent(self):
+        first = self.pay()
+        self.assertEqual(self.pay(), first)
+        self.assertEqual(self.intents.keys, [f'dineqr-order-{self.order.pk}-{self.amount}'])
+        self.assertEqual(Order.objects.get(pk=self.order.pk).payment_intent_id, first['id'])
+
+    def test_payable_intent_is_reused_without_the_cache(self):
+        first = self.pay()
+        cache.clear()
+        self.assertEqual(self.pay(), first)
+        self.assertEqual(len(self.intents.keys), 1)
+
+    def test_changed_amount_gets_a_new_intent(self):
+        first = self.pay()
+        self.order.items.create(menu_item=self.item, quantity=1, unit_price=self.item.price)
+        self.order.calculate_totals()
+        amount = payments.amount_in_cents(Order.objects.get(pk=self.order.pk))
+        self.assertNotEqual(self.pay()['id'], first['id'])
+        self.assertEqual(self.intents.keys[-1], f'dineqr-order-{self.order.pk}-{amount}')
+
+    def test_dead_intent_is_replaced_not_replayed(self):
+        first = self.pay()
+        self.intents.intents[first['id']].status = 'canceled'
+        cache.clear()
+        self.assertNotEqual(self.pay()['id'], first['id'])
+        self.assertEqual(self.intents.keys[-1], f"dineqr-order-{self.order.pk}-{self.amount}-after-{first['id']}")
+
+    async def test_async_helper_reuses_the_intent(self):
+        order = await Order.objects.aget(pk=self.order.pk)
+        first = await payments.aget_or_create_payment_intent(order)
+        order = await Order.objects.aget(pk=self.order.pk)
+        self.assertEqual(order.payment_intent_id, first['id'])
+        await cache.aclear()
+        self.assertEqual(await payments.aget_or_create_payment_intent(order), first)
+        self.assertEqual(len(self.intents.keys), 1)
+
+    @override_settings(STRIPE_SECRET_KEY='sk_test_dineqr', STRIPE_MAX_NETWORK_RETRIES=2)
+    def test_retry_resends_the_same_idempotency_key(self):
+        http_client = FlakyHTTPClient(self.amount)
+        with mock.patch.object(stripe, 'HTTPXClient', return_value=http_client), \
+                mock.patch('stripe._http_client.time.sleep'):
+            self.stripe_client.return_value = payments._build_client()
+            self.assertEqual(self.pay()['id'], 'pi_1')
+        self.assertEqual(len(http_client.headers), 2)
+        self.assertEqual(
+            {headers['Idempotency-Key'] for headers in http_client.headers},
+            {payments.idempotency_key(self.order, self.amount)},
+        )
+
+
+class MarkPaidTests(OrdersTestCase):
+    def setUp(self):
+        super().setUp()
+        self.order = make_order(self.table, self.item)
+        self.url = f'/api/orders/{self.order.pk}/mark-paid/'
+
+    def test_cash_is_marked_paid_once(self):
+        response = self.client.post(self.url, {'payment_method': 'cash'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['payment_status'], 'paid')
+        self.assertEqual(self.client.post(self.url, {'payment_method': 'cash'}, format='json').status_code, 409)
+
+    def test_client_cannot_mark_card_paid(self):
+        response = self.client.post(self.url, {'payment_method': 'card'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Order.objects.get(pk=self.order.pk).payment_status, 'unpaid')
+
+
+class StripeWebhookProcessingTests(OrdersTestCase):
+    def setUp(self):
+        super().setUp()
+        self.orders = [make_order(self.table, self.item) for _ in range(2)]
+
+    def succeeded(self, intent_id, amount_received, **metadata):
+        StripeEvent.objects.create(
+            event_id=f'evt_{StripeEvent.objects.count()}',
+            type='payment_intent.succeeded',
+            payload={'data': {'object': {
+                'id': intent_id, 'amount_received': amount_received, 'metadata': metadata,
+            }}},
+        )
+        process_pending()
+
+    def payment_statuses(self):
+        return list(Order.objects.order_by('pk').values_list('payment_status', flat=True))
+
+    def test_order_intent_settles_its_order(self):
+        order = Order.objects.get(pk=self.orders[0].pk)
+        Order.objects.filter(pk=order.pk).update(payment_intent_id='pi_order')
+        self.succeeded('pi_order', payments.amount_in_cents(order), order_id=str(order.pk))
+        self.assertEqual(self.payment_statuses(), ['paid', 'unpaid'])
+
+    def test_short_payment_leaves_the_order_unpaid(self):
+        order = Order.objects.get(pk=self.orders[0].pk)
+        Order.objects.filter(pk=order.pk).update(payment_intent_id='pi_order')
+        with self.assertLogs('orders.webhooks', 'WARNING'):
+            self.succeeded('pi_order', payments.amount_in_cents(order) - 1, order_id=str(order.pk))
+        self.assertEqual(self.payment_statuses(), ['unpaid', 'unpaid'])
+
+    def test_table_intent_is_checked_against_the_bill(self):
+        Order.objects.update(payment_intent_id='pi_table')
+        orders = list(Order.objects.all())
+        bill = int(bill_amounts(sum(order.subtotal for order in orders))['total'] * 100)
+        # The bill rounds its service charge once; the orders each round their own.
+        order_totals = sum(payments.amount_in_cents(order) for order in orders)
+        self.assertNotEqual(order_totals, bill)
+        with self.assertLogs('orders.webhooks', 'WARNING'):
+            self.succeeded('pi_table', order_totals, table_number='1', order_count='2')
+        self.assertEqual(self.payment_statuses(), ['unpaid', 'unpaid'])
+        self.succeeded('pi_table', bill, table_number='1', order_count='2')
+        self.assertEqual(self.payment_statuses(), ['paid', 'paid'])
+        self.assertEqual(set(Order.objects.values_list('payment_method', flat=True)), {'card'})
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class TableQRCodeTests(OrdersTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        super().setUp()
+        # A fresh render cache per test, so every test starts with misses.
+        cache_dir = tempfile.mkdtemp(dir=TEMP_MEDIA_ROOT)
+        override = self.settings(QR_CACHE_DIR=cache_dir)
+        override.enable()
+        self.addCleanup(override.disable)
+        patcher = mock.patch.object(qr, 'render_png', wraps=qr.render_png)
+        self.render = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_unchanged_code_is_not_rendered_again(self):
+        self.assertTrue(self.table.generate_qr_code('https://dine.example'))
+        name = self.table.qr_code.name
+        self.assertFalse(self.table.generate_qr_code('https://dine.example'))
+        self.assertEqual(self.render.call_count, 1)
+        self.assertEqual(self.table.qr_code.name, name)
+        self.assertTrue(name.startswith('qr_codes/'))
+
+    def test_new_payload_is_rendered(self):
+        self.table.generate_qr_code('https://dine.example')
+        self.assertTrue(self.table.generate_qr_code('https://new.example'))
+        self.assertEqual(self.render.call_count, 2)
+        self.assertEqual(self.table.qr_hash, qr.qr_hash(qr.table_payload(1, 'https://new.example')))
+
+    def test_rendered_on_the_fly_with_an_etag(self):
+        response = self.client.get('/table/1/qr.png')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertTrue(response.content.startswith(b'\x89PNG'))
+        etag = response['ETag']
+        self.assertEqual(self.client.get('/table/1/qr.png', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        svg = self.client.get('/table/1/qr.svg')
+        self.assertIn(b'<svg', svg.content)
+        self.assertNotEqual(svg['ETag'], etag)
+
+    def test_unknown_or_inactive_table_is_404(self):
+        self.assertEqual(self.client.get('/table/99/qr.svg').status_code, 404)
+        Table.objects.filter(pk=self.table.pk).update(is_active=False)
+        self.assertEqual(self.client.get('/table/1/qr.svg').status_code, 404)
+
+    def test_sheet_inlines_the_selected_tables(self):
+        Table.objects.create(number=2)
+        response = self.client.get('/api/orders/tables/qr-sheet/', {'numbers': '2'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content.count(b'<svg'), 1)
+        self.assertEqual(self.client.get('/api/orders/tables/qr-sheet/', {'numbers': '1,x'}).status_code, 400)
+
+    def test_lost_image_is_uploaded_from_the_render_cache(self):
+        self.table.generate_qr_code('https://dine.example')
+        self.table.qr_code.delete(save=False)
+        self.assertTrue(self.table.generate_qr_code('https://dine.example'))
+        self.assertEqual(self.render.call_count, 1)
+        self.assertTrue(self.table.qr_code.storage.exists(self.table.qr_code.name))
+
+
+class QRJobTests(TransactionTestCase):
+    def setUp(self):
+        self.tables = [Table.objects.create(number=number) for number in (1, 2, 3)]
+        self.client.force_login(User.objects.create_superuser('admin', password='x', role='admin'))
+
+    def run_job(self, generate):
+        with mock.patch.object(qr, 'generate_table_qr_codes', side_effect=generate):
+            job_id = qr.start_qr_job([table.pk for table in self.tables], 'https://dine.example')
+            for thread in threading.enumerate():
+                if thread.name == f'qr-job-{job_id[:8]}':
+                    thread.join(5)
+        return job_id
+
+    def progress(self, job_id):
+        return self.client.get(f'/admin/orders/table/qr-jobs/{job_id}/')
+
+    def test_progress_is_read_from_the_database(self):
+        def generate(tables, base_url, force, progress):
+            progress(1, 2)
+            self.assertEqual(QRJob.objects.get().done, 1)
+            return 2
+
+        job_id = self.run_job(generate)
+        response = self.progress(job_id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'status': 'done', 'done': 2, 'total': 2, 'skipped': 1})
+
+    def test_failed_job_reports_the_error(self):
+        def generate(tables, base_url, force, progress):
+            raise OSError('storage is down')
+
+        with self.assertLogs('orders.qr', 'ERROR'):
+            job_id = self.run_job(generate)
+        self.assertEqual(self.progress(job_id).json()['error'], 'storage is down')
+
+    def test_unknown_job_is_404(self):
+        self.assertEqual(self.progress('not-a-job').status_code, 404)
+        self.assertEqual(self.progress('0' * 32).status_code, 404)
+
+
+class ImportFoodTests(TestCase):
+    def setUp(self):
+        from .management.commands.import_food import API_BASE, CachedFetcher
+
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        fetcher = CachedFetcher(self.cache_dir, workers=1)
+        self.record = lambda url, data: fetcher.path_for(f'{API_BASE}/{url}').write_text(json.dumps(data))
+
+        self.record('categories.php', {'categories': [
+            {'strCategory': 'Beef', 'strCategoryDescription': 'Beef dishes'},
+            {'strCategory': 'Unknown'},
+        ]})
+        self.record('filter.php?c=Beef', {'meals': [
+            {'idMeal': '1', 'strMeal': 'Tibs', 'strMealThumb': 'https://cdn.example/tibs.jpg'},
+            {'idMeal': '2', 'strMeal': 'Kitfo', 'strMealThumb': ''},
+        ]})
+        self.record('lookup.php?i=1', {'meals': [{'strInstructions': 'Fry the beef. Add onions. Serve.'}]})
+        self.record('lookup.php?i=2', {'meals': []})
+
+    def run_import(self):
+        out = StringIO()
+        call_command('import_food', offline=True, cache_dir=self.cache_dir, limit=5, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def test_offline_replay_creates_items_once(self):
+        output = self.run_import()
+        self.assertIn('0 network requests, 4 cache hits', output)
+        items = dict(MenuItem.objects.values_list('name', 'description'))
+        self.assertEqual(set(items), {'Tibs', 'Kitfo'})
+        self.assertTrue(items['Tibs'].startswith('Fry the beef.'))
+        self.assertEqual(list(Category.objects.values_list('name', flat=True)), ['Beef'])
+
+        self.assertIn('Imported 0 new menu items', self.run_import())
+        self.assertEqual(MenuItem.objects.count(), 2)
+
+    def test_offline_without_a_recording_fails(self):
+        shutil.rmtree(self.cache_dir)
+        with self.assertRaises(CommandError):
+            self.run_import()
+
+
+class GenerateOrdersTests(TestCase):
+    def test_failed_run_leaves_nothing_behind(self):
+        def fail_after_first_batch(orders, items):
+            raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            generate_orders(30, batch_size=10, active=0, progress=fail_after_first_batch)
+        self.assertFalse(Order.objects.exists())
+
+    def test_run_appends_every_order(self):
+        generate_orders(30, batch_size=10, active=0)
+        self.assertEqual(Order.objects.count(), 30)
+
+
+class BenchmarkCommandTests(TestCase):
+    def test_scales_accept_suffixes(self):
+        from .management.commands.benchmark import parse_scale
+
+        self.assertEqual([parse_scale(v) for v in ('1000', '100k', '1M', '2.5k')], [1000, 100_000, 1_000_000, 2500])
+        with self.assertRaises(CommandError):
+            parse_scale('lots')
+
+    def test_menu_list_is_timed_uncached_and_cached(self):
+        from .management.commands.benchmark import Command
+
+        cache.clear()
+        generate_orders(20, active=0)
+        command = Command(stdout=StringIO())
+        command.options = {
+            'only': ['menu_list', 'menu_list_cached'], 'warmup': 1, 'iterations': 3, 'max_seconds': 30,
+        }
+        results = command.run_scale()
+        self.assertGreater(results['menu_list']['queries'], 0)
+        self.assertEqual(results['menu_list_cached']['queries'], 0)
+
+
+class TableEventStreamTests(TransactionTestCase):
+    def setUp(self):
+        Table.objects.create(number=1)
+
+    def communicator(self, path, headers=()):
+        from backend.asgi import application
+
+        return ApplicationCommunicator(application, {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': b'',
+            'root_path': '',
+            'headers': [(b'host', b'testserver'), *headers],
+            'client': ('127.0.0.1', 0),
+            'server': ('testserver', 80),
+        })
+
+    async def test_unknown_table_is_404(self):
+        communicator = self.communicator('/api/orders/table/99/events/')
+        await communicator.send_input({'type': 'http.request', 'body': b''})
+        start = await communicator.receive_output(1)
+        body = await communicator.receive_output(1)
+        self.assertEqual(start['status'], 404)
+        self.assertIn(b'error', body['body'])
+
+    async def test_stream_relays_table_group(self):
+        communicator = self.communicator('/api/orders/table/1/events/', [(b'origin', b'http://app.example')])
+        await communicator.send_input({'type': 'http.request', 'body': b''})
+        start = await communicator.receive_output(1)
+        self.assertEqual(start['status'], 200)
+        self.assertIn((b'content-type', b'text/event-stream'), start['headers'])
+        self.assertIn((b'access-control-allow-origin', b'*'), start['headers'])
+        self.assertTrue((await communicator.receive_output(1))['body'].startswith(b'retry:'))
+
+        await get_channel_layer().group_send('table_1', {
+            'type': 'order_status_update', 'order': {'id': 7, 'status': 'ready'},
+        })
+        frame = (await communicator.receive_output(1))['body'].decode()
+        self.assertIn('event: order_status_update', frame)
+        self.assertIn('"status":"ready"', frame)
+
+        await communicator.send_input({'type': 'http.disconnect'})
+        await communicator.wait(1)
+        # The stream left the group when the client went away.
+        self.assertFalse(get_channel_layer().groups.get('table_1'))
@@ -4,17 +4,26 @@ from .views import (
     TableDetailView,
     TableByNumberView,
     GenerateQRView,
+    TableQRSheetView,
     CreateOrderView,
     OrderDetailView,
     TableOrdersView,
+    TableBillView,
+    TableBillSplitView,
+    TableCheckoutView,
     UpdateOrderStatusView,
+    BulkOrderStatusView,
     KitchenOrdersView,
+    KitchenAllDayView,
+    KitchenPerformanceView,
     CashierOrdersView,
     AdminDashboardView,
     CreatePaymentIntentView,
     MarkOrderPaidView,
     StripeConfigView,
+    StripeWebhookView,
 )
+from .sse import TableEventStreamView
 
 urlpatterns = [
     # Tables
@@ -22,23 +31,32 @@ urlpatterns = [
     path('tables/<int:pk>/', TableDetailView.as_view(), name='table-detail'),
     path('tables/number/<int:number>/', TableByNumberView.as_view(), name='table-by-number'),
     path('tables/<int:pk>/generate-qr/', GenerateQRView.as_view(), name='generate-qr'),
+    path('tables/qr-sheet/', TableQRSheetView.as_view(), name='table-qr-sheet'),
 
     # Orders
     path('create/', CreateOrderView.as_view(), name='order-create'),
     path('<int:pk>/', OrderDetailView.as_view(), name='order-detail'),
     path('<int:pk>/status/', UpdateOrderStatusView.as_view(), name='order-status-update'),
+    path('bulk-status/', BulkOrderStatusView.as_view(), name='order-bulk-status'),
     path('<int:pk>/create-payment-intent/', CreatePaymentIntentView.as_view(), name='create-payment-intent'),
     path('<int:pk>/mark-paid/', MarkOrderPaidView.as_view(), name='order-mark-paid'),
     path('table/<int:table_id>/', TableOrdersView.as_view(), name='table-orders'),
+    path('table/<int:number>/events/', TableEventStreamView.as_view(), name='table-events'),
+    path('table/<int:number>/bill/', TableBillView.as_view(), name='table-bill'),
+    path('table/<int:number>/bill/split/', TableBillSplitView.as_view(), name='table-bill-split'),
+    path('table/<int:number>/checkout/', TableCheckoutView.as_view(), name='table-checkout'),
 
     # Kitchen
     path('kitchen/', KitchenOrdersView.as_view(), name='kitchen-orders'),
+    path('kitchen/all-day/', KitchenAllDayView.as_view(), name='kitchen-all-day'),
+    path('kitchen/performance/', KitchenPerformanceView.as_view(), name='kitchen-performance'),
 
     # Cashier
     path('cashier/', CashierOrdersView.as_view(), name='cashier-orders'),
 
     # Stripe
     path('stripe-config/', StripeConfigView.as_view(), name='stripe-config'),
+    path('stripe-webhook/', StripeWebhookView.as_view(), name='stripe-webhook'),
 
     # Admin Dashboard
     path('dashboard/', AdminDashboardView.as_view(), name='admin-dashboard'),
@@ -2,22 +2,40 @@ from rest_framework import generics, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from django.db.models import Sum, Count, Q
+from django.db import transaction
+from django.http import HttpResponse
+from django.db.models import Sum, Count, F, Q, Prefetch
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from datetime import timedelta
+import hashlib
+import json
 import stripe
 from django.conf import settings
 
+from users.permissions import IsKitchenStaff
+
 from .models import Table, Order, OrderItem
 from .serializers import (
     TableSerializer,
     OrderSerializer,
     OrderCreateSerializer,
     OrderStatusUpdateSerializer,
+    BulkOrderStatusSerializer,
+    TableCheckoutSerializer,
+    BillSplitSerializer,
 )
 
 
-stripe.api_key = getattr(settings, 'STRIPE_SECRET_KEY', None)
+def conflict_response(pk, message):
+    """409 carrying the order's current state, for a lost compare-and-set."""
+    current = Order.objects.select_related('table').prefetch_related(
+        'items__menu_item'
+    ).get(pk=pk)
+    return Response(
+        {'error': message, 'order': OrderSerializer(current).data},
+        status=status.HTTP_409_CONFLICT,
+    )
 
 
 class TableListView(generics.ListCreateAPIView):
@@ -27,7 +45,7 @@ class TableListView(generics.ListCreateAPIView):
     permission_classes = [AllowAny]
 
     def get_queryset(self):
-        queryset = Table.objects.all()
+        queryset = Table.objects.with_active_orders_count().order_by('number')
         is_active = self.request.query_params.get('is_active')
         if is_active is not None:
             queryset = queryset.filter(is_active=is_active.lower() == 'true')
@@ -75,6 +93,91 @@ class GenerateQRView(APIView):
         return Response(serializer.data)
 
 
+def qr_cache_headers(response, etag):
+    response['ETag'] = etag
+    response['Cache-Control'] = f"public, max-age={getattr(settings, 'QR_CACHE_MAX_AGE', 86400)}"
+    return response
+
+
+def etag_matches(request, etag):
+    return etag in request.META.get('HTTP_IF_NONE_MATCH', '')
+
+
+class TableQRView(APIView):
+    """
+    QR code for a table, rendered for the current base URL.
+
+    ``/table/<n>/qr.png`` or ``/table/<n>/qr.svg``. Renders come from an
+    in-process LRU and carry an ETag, so clients revalidate cheaply and no
+    image files need to be stored.
+    """
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    def get(self, request, number, fmt):
+        from .qr import CONTENT_TYPES, base_url_for, rendered, table_payload
+
+        if not Table.objects.filter(number=number, is_active=True).exists():
+            return Response({'error': 'Table not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+        etag, body = rendered(table_payload(number, base_url_for(request)), fmt)
+        if etag_matches(request, etag):
+            return qr_cache_headers(HttpResponse(status=status.HTTP_304_NOT_MODIFIED), etag)
+        return qr_cache_headers(HttpResponse(body, content_type=CONTENT_TYPES[fmt]), etag)
+
+
+class TableQRSheetView(APIView):
+    """
+    Printable page with the QR codes of many tables.
+
+    ``?numbers=1,2,3`` picks tables; by default every active table is
+    included. Codes are inlined as SVG, so the sheet is one response.
+    """
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    def get(self, request):
+        from django.utils.html import escape
+        from .qr import base_url_for, rendered, table_payload
+
+        tables = Table.objects.filter(is_active=True)
+        if request.query_params.get('numbers'):
+            try:
+                numbers = [int(n) for n in request.query_params['numbers'].split(',') if n.strip()]
+            except ValueError:
+                return Response(
+                    {'error': 'numbers must be a comma-separated list of table numbers.'},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            tables = tables.filter(number__in=numbers)
+
+        base_url = base_url_for(request)
+        etags = []
+        cells = []
+        for number, name in tables.order_by('number').values_list('number', 'name'):
+            etag, svg = rendered(table_payload(number, base_url), 'svg')
+            etags.append(f'{etag}{name}')
+            cells.append(
+                f'<figure>{svg.decode()}<figcaption>{escape(name or f"Table {number}")}'
+                f'</figcaption></figure>'
+            )
+
+        etag = '"sheet-%s"' % hashlib.sha256(''.join(etags).encode()).hexdigest()[:32]
+        if etag_matches(request, etag):
+            return qr_cache_headers(HttpResponse(status=status.HTTP_304_NOT_MODIFIED), etag)
+
+        html = (
+            '<!DOCTYPE html><html><head><meta charset="utf-8"><title>Table QR codes</title>'
+            '<style>'
+            'body{margin:0;font-family:sans-serif;display:grid;'
+            'grid-template-columns:repeat(3,1fr);gap:8mm;padding:8mm}'
+            'figure{margin:0;text-align:center;break-inside:avoid}'
+            'svg{width:100%;height:auto}figcaption{font-size:16pt;font-weight:bold}'
+            '</style></head><body>' + ''.join(cells) + '</body></html>'
+        )
+        return qr_cache_headers(HttpResponse(html, content_type='text/html; charset=utf-8'), etag)
+
+
 class CreateOrderView(APIView):
     """Create a new order (customer)."""
     permission_classes = [AllowAny]
@@ -94,29 +197,15 @@ class CreateOrderView(APIView):
 
     def _notify_kitchen(self, order):
         """Send new order notification to kitchen via WebSocket."""
-        try:
-            from channels.layers import get_channel_layer
-            from asgiref.sync import async_to_sync
+        from .notifications import publish_many
+        from .stations import station_messages
 
-            channel_layer = get_channel_layer()
-            order_data = OrderSerializer(order).data
-
-            async_to_sync(channel_layer.group_send)(
-                'kitchen',
-                {
-                    'type': 'new_order',
-                    'order': order_data,
-                }
-            )
-            async_to_sync(channel_layer.group_send)(
-                f'table_{order.table.number}',
-                {
-                    'type': 'order_update',
-                    'order': order_data,
-                }
-            )
-        except Exception as e:
-            print(f"WebSocket notification error: {e}")
+        order_data = OrderSerializer(order).data
+        publish_many([
+            ('kitchen', {'type': 'new_order', 'order': order_data}),
+            (f'table_{order.table.number}', {'type': 'order_update', 'order': order_data}),
+            *station_messages(order_data),
+        ])
 
 
 class OrderDetailView(generics.RetrieveAPIView):
@@ -131,7 +220,9 @@ class TableOrdersView(APIView):
     permission_classes = [AllowAny]
 
     def get(self, request, table_id):
-        orders = Order.objects.filter(table_id=table_id)
+        orders = Order.objects.filter(table_id=table_id).select_related(
+            'table'
+        ).prefetch_related('items__menu_item')
 
         active_only = request.query_params.get('active')
         if active_only and active_only.lower() == 'true':
@@ -147,7 +238,9 @@ class UpdateOrderStatusView(APIView):
 
     def patch(self, request, pk):
         try:
-            order = Order.objects.get(pk=pk)
+            order = Order.objects.select_related('table').prefetch_related(
+                'items__menu_item'
+            ).get(pk=pk)
         except Order.DoesNotExist:
             return Response(
                 {'error': 'Order not found.'},
@@ -161,8 +254,12 @@ class UpdateOrderStatusView(APIView):
         serializer.is_valid(raise_exception=True)
 
         old_status = order.status
-        order.status = serializer.validated_data['status']
-        order.save(update_fields=['status', 'updated_at'])
+        if not order.transition_to(
+            serializer.validated_data['status'],
+            expected_version=serializer.validated_data.get('version'),
+            actor=request.user,
+        ):
+            return conflict_response(pk, 'Order was changed by another request.')
 
         # Notify via WebSocket
         self._notify_status_change(order, old_status)
@@ -170,46 +267,89 @@ class UpdateOrderStatusView(APIView):
         return Response(OrderSerializer(order).data)
 
     def _notify_status_change(self, order, old_status):
-        """Send status update via WebSocket."""
-        try:
-            from channels.layers import get_channel_layer
-            from asgiref.sync import async_to_sync
+        """Send status update to the kitchen and the customer's table."""
+        from .notifications import publish_many
 
-            channel_layer = get_channel_layer()
-            order_data = OrderSerializer(order).data
+        event = {
+            'type': 'order_status_update',
+            'order': OrderSerializer(order).data,
+            'old_status': old_status,
+        }
+        publish_many([('kitchen', event), (f'table_{order.table.number}', event)])
 
-            # Notify kitchen
-            async_to_sync(channel_layer.group_send)(
-                'kitchen',
-                {
-                    'type': 'order_status_update',
-                    'order': order_data,
-                    'old_status': old_status,
-                }
-            )
-            # Notify customer table
-            async_to_sync(channel_layer.group_send)(
-                f'table_{order.table.number}',
-                {
-                    'type': 'order_status_update',
-                    'order': order_data,
-                    'old_status': old_status,
-                }
-            )
-        except Exception as e:
-            print(f"WebSocket notification error: {e}")
+
+class BulkOrderStatusView(APIView):
+    """Move a batch of orders to one status at once (expo "bump bar")."""
+    permission_classes = [IsAuthenticated, IsKitchenStaff]
+
+    def post(self, request):
+        serializer = BulkOrderStatusSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        new_status = serializer.validated_data['status']
+
+        changed, results, updated_at = Order.bulk_transition(
+            serializer.validated_data['order_ids'],
+            new_status,
+            actor=request.user,
+        )
+        if changed:
+            self._notify_bulk_change(changed, updated_at)
+
+        return Response({
+            'status': new_status,
+            'updated': len(changed),
+            'results': results,
+        })
+
+    def _notify_bulk_change(self, changed, updated_at):
+        """Send one coalesced update to the kitchen and to each affected table."""
+        from .notifications import publish_many
+
+        updated_at = updated_at.isoformat()
+        by_table = {}
+        for order in changed:
+            by_table.setdefault(order['table_number'], []).append(order)
+
+        messages = [('kitchen', {
+            'type': 'bulk_status_update',
+            'orders': changed,
+            'updated_at': updated_at,
+        })]
+        for table_number, orders in by_table.items():
+            messages.append((f'table_{table_number}', {
+                'type': 'bulk_status_update',
+                'orders': orders,
+                'updated_at': updated_at,
+            }))
+        publish_many(messages)
 
 
 class KitchenOrdersView(APIView):
-    """Get orders for kitchen display."""
+    """
+    Get orders for kitchen display.
+
+    ``?station=grill`` limits the list to orders with grill items and only
+    includes those items.
+    """
     permission_classes = [AllowAny]
 
     def get(self, request):
         status_filter = request.query_params.get('status')
+        station = request.query_params.get('station')
 
         orders = Order.objects.exclude(
             status__in=['served', 'cancelled']
-        ).select_related('table').prefetch_related('items__menu_item')
+        ).select_related('table')
+
+        if station:
+            orders = orders.filter(
+                id__in=OrderItem.objects.filter(station=station).values('order_id')
+            ).prefetch_related(Prefetch(
+                'items',
+                queryset=OrderItem.objects.filter(station=station).select_related('menu_item'),
+            ))
+        else:
+            orders = orders.prefetch_related('items__menu_item')
 
         if status_filter:
             orders = orders.filter(status=status_filter)
@@ -218,6 +358,67 @@ class KitchenOrdersView(APIView):
         return Response(serializer.data)
 
 
+class KitchenAllDayView(APIView):
+    """
+    Pending quantity of each menu item across active orders.
+
+    ``?station=grill`` limits the board to one station. Served from the
+    worker's live counters, which are reconciled with the database
+    periodically.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        from .all_day import all_day_counts, publish_all_day_changes
+
+        moved = all_day_counts.ensure_loaded()
+        if moved:
+            publish_all_day_changes(moved)
+        return Response({
+            'station': request.query_params.get('station'),
+            'items': all_day_counts.snapshot(request.query_params.get('station')),
+        })
+
+
+class KitchenPerformanceView(APIView):
+    """
+    Kitchen SLA figures: time orders spend in each status.
+
+    Query params: ``date`` (YYYY-MM-DD, default today), ``days`` (default 1,
+    max 31) and ``station``. Served from precomputed histograms.
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        from .sla import kitchen_performance
+
+        start_day = timezone.localdate()
+        if request.query_params.get('date'):
+            try:
+                start_day = parse_date(request.query_params['date'])
+            except ValueError:
+                # Well-formed but impossible, e.g. 2024-02-30.
+                start_day = None
+            if start_day is None:
+                return Response(
+                    {'error': 'date must be YYYY-MM-DD.'},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+        try:
+            days = min(max(int(request.query_params.get('days', 1)), 1), 31)
+        except ValueError:
+            return Response(
+                {'error': 'days must be an integer.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        return Response({
+            'start': start_day.isoformat(),
+            'days': days,
+            'stats': kitchen_performance(start_day, days, request.query_params.get('station')),
+        })
+
+
 class CashierOrdersView(APIView):
     """Get orders for cashier dashboard (focus on unpaid/active)."""
     permission_classes = [AllowAny]
@@ -246,57 +447,274 @@ class CreatePaymentIntentView(APIView):
     permission_classes = [AllowAny]
 
     def post(self, request, pk):
-        if not stripe.api_key:
-            return Response(
-                {"error": "Stripe is not configured on the server."},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            )
+        from .payments import PaymentsNotConfigured, get_or_create_payment_intent
 
         try:
             order = Order.objects.get(pk=pk)
         except Order.DoesNotExist:
             return Response({"error": "Order not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        # Amount in cents
-        amount = int(order.total * 100)
+        if order.payment_status == 'paid':
+            return conflict_response(pk, 'Order is already paid.')
 
+        # Reuses the order's intent when unchanged; idempotent otherwise.
         try:
-            intent = stripe.PaymentIntent.create(
-                amount=amount,
-                currency="usd",
-                metadata={"order_id": order.id},
-            )
-        except stripe.error.StripeError as e:
+            intent = get_or_create_payment_intent(order)
+        except PaymentsNotConfigured as e:
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        except stripe.StripeError as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Mark that this order is intended to be paid by card
-        if order.payment_method != 'card':
-            order.payment_method = 'card'
-            order.save(update_fields=['payment_method'])
-
-        return Response({"client_secret": intent.client_secret})
+        return Response({"client_secret": intent['client_secret']})
 
 
 class MarkOrderPaidView(APIView):
-    """Mark an order as paid (cash or card) after successful payment."""
+    """
+    Mark an order as paid in cash.
+
+    Card orders are only marked paid by the Stripe webhook, once Stripe
+    says the money arrived.
+    """
     permission_classes = [AllowAny]
 
     def post(self, request, pk):
-        try:
-            order = Order.objects.get(pk=pk)
-        except Order.DoesNotExist:
-            return Response({"error": "Order not found."}, status=status.HTTP_404_NOT_FOUND)
-
         payment_method = request.data.get('payment_method', 'cash')
         if payment_method not in dict(Order.PAYMENT_METHOD_CHOICES):
             return Response({"error": "Invalid payment method."}, status=status.HTTP_400_BAD_REQUEST)
+        if payment_method == 'card':
+            return Response(
+                {"error": "Card payments are confirmed by Stripe, not by the client."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-        order.payment_status = 'paid'
-        order.payment_method = payment_method
-        order.save(update_fields=['payment_status', 'payment_method'])
+        # Compare-and-set on payment_status: only an unpaid order flips.
+        if not Order.objects.filter(pk=pk).mark_paid(payment_method):
+            if not Order.objects.filter(pk=pk).exists():
+                return Response({"error": "Order not found."}, status=status.HTTP_404_NOT_FOUND)
+            return conflict_response(pk, 'Order is already paid.')
 
+        order = Order.objects.select_related('table').prefetch_related(
+            'items__menu_item'
+        ).get(pk=pk)
+        self._notify_paid(order)
         return Response(OrderSerializer(order).data)
 
+    def _notify_paid(self, order):
+        from .payments import publish_payment_updates
+
+        publish_payment_updates([{
+            'id': order.id,
+            'table__number': order.table.number,
+            'payment_status': order.payment_status,
+            'payment_method': order.payment_method,
+            'version': order.version,
+        }])
+
+
+def get_active_table(number):
+    try:
+        return Table.objects.get(number=number, is_active=True)
+    except Table.DoesNotExist:
+        return None
+
+
+class TableBillView(APIView):
+    """Every unpaid line on a table, with the combined totals."""
+    permission_classes = [AllowAny]
+
+    def get(self, request, number):
+        from .checkout import bill_lines, summarize_lines
+
+        table = get_active_table(number)
+        if table is None:
+            return Response({"error": "Table not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        lines = bill_lines(table)
+        orders = {}
+        for line in lines:
+            orders.setdefault(line['order_id'], {
+                'id': line['order_id'],
+                'order_number': line['order__order_number'],
+                'version': line['order__version'],
+            })
+        return Response({
+            'table_number': table.number,
+            'orders': list(orders.values()),
+            'items': [
+                {
+                    'id': line['id'],
+                    'order_id': line['order_id'],
+                    'menu_item_name': line['menu_item__name'],
+                    'quantity': line['quantity'],
+                    'unit_price': line['unit_price'],
+                    'notes': line['notes'],
+                }
+                for line in lines
+            ],
+            **summarize_lines(lines),
+        })
+
+
+class TableBillSplitView(APIView):
+    """
+    Split a table's bill by line item.
+
+    Body: ``{"splits": [[item ids], [item ids], ...]}``, one list per payer.
+    All splits are computed from one read of the table's lines.
+    """
+    permission_classes = [AllowAny]
+
+    def post(self, request, number):
+        from .checkout import bill_lines, split_by_lines
+
+        table = get_active_table(number)
+        if table is None:
+            return Response({"error": "Table not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        serializer = BillSplitSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            result = split_by_lines(bill_lines(table), serializer.validated_data['splits'])
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'table_number': table.number, **result})
+
+
+class TableCheckoutView(APIView):
+    """
+    Pay every unpaid order on a table at once.
+
+    Cash marks them all paid with one conditional UPDATE; card returns one
+    PaymentIntent for the combined total, and the Stripe webhook marks the
+    orders paid. Pass the ``order_ids`` shown on the bill to get a 409 if
+    the table's orders changed in the meantime. Card checkout is refused
+    while an order still has its own PaymentIntent, so a payment made on
+    that intent is still matched by its webhook.
+    """
+    permission_classes = [AllowAny]
+
+    def post(self, request, number):
+        from .checkout import bill_totals, unpaid_orders
+
+        table = get_active_table(number)
+        if table is None:
+            return Response({"error": "Table not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        serializer = TableCheckoutSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        payment_method = serializer.validated_data['payment_method']
+        order_ids = serializer.validated_data.get('order_ids')
+
+        orders = unpaid_orders(table, order_ids)
+        totals = bill_totals(orders)
+        if not totals['order_count']:
+            return Response({"error": "No unpaid orders for this table."}, status=status.HTTP_404_NOT_FOUND)
+        if order_ids is not None and totals['order_count'] != len(order_ids):
+            return Response(
+                {"error": "Some of these orders were paid or cancelled. Refresh the bill."},
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        if payment_method == 'card':
+            return self._checkout_card(table, orders, totals)
+        return self._checkout_cash(table, orders, totals)
+
+    def _checkout_cash(self, table, orders, totals):
+        from .payments import publish_payment_updates
+
+        with transaction.atomic():
+            paid = orders.mark_paid('cash')
+            if len(paid) != totals['order_count']:
+                transaction.set_rollback(True)
+                return Response(
+                    {"error": "The table's orders changed. Refresh the bill."},
+                    status=status.HTTP_409_CONFLICT,
+                )
+        publish_payment_updates(paid)
+        return Response({
+            **totals,
+            'payment_method': 'cash',
+            'paid_order_ids': [order['id'] for order in paid],
+        })
+
+    def _checkout_card(self, table, orders, totals):
+        from .payments import PaymentsNotConfigured, cached_checkout_intent, get_or_create_checkout_intent
+
+        # Refuse before asking Stripe for an intent the table can't use.
+        cached = cached_checkout_intent(table, totals)
+        own_intents = list(orders.exclude(
+            payment_intent_id__in=['', cached['id'] if cached else ''],
+        ).values_list('order_number', flat=True))
+        if own_intents:
+            return Response(
+                {"error": (
+                    f"Orders {', '.join(own_intents)} already have a card payment "
+                    "in progress. Pay them individually."
+                )},
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        try:
+            intent = get_or_create_checkout_intent(table, totals)
+        except PaymentsNotConfigured as e:
+            return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        except stripe.StripeError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            # Still conditional: an order may have started its own payment meanwhile.
+            attached = orders.filter(payment_intent_id__in=['', intent['id']]).update(
+                payment_intent_id=intent['id'],
+                payment_method='card',
+                version=F('version') + 1,
+                updated_at=timezone.now(),
+            )
+            if attached != totals['order_count']:
+                transaction.set_rollback(True)
+                return Response(
+                    {"error": "The table's orders changed. Refresh the bill."},
+                    status=status.HTTP_409_CONFLICT,
+                )
+        return Response({**totals, 'payment_method': 'card', 'client_secret': intent['client_secret']})
+
+
+class StripeWebhookView(APIView):
+    """
+    Receive Stripe events.
+
+    Verifies the signature, stores the event (duplicates are dropped) and
+    acknowledges at once; orders are marked paid in the background.
+    """
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    def post(self, request):
+        from .webhooks import event_processor, record_event
+
+        secret = getattr(settings, 'STRIPE_WEBHOOK_SECRET', '')
+        if not secret:
+            return Response(
+                {"error": "Stripe webhooks are not configured."},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+        payload = request.body
+        try:
+            stripe.Webhook.construct_event(
+                payload, request.META.get('HTTP_STRIPE_SIGNATURE', ''), secret,
+            )
+        except ValueError:
+            return Response({"error": "Invalid payload."}, status=status.HTTP_400_BAD_REQUEST)
+        except stripe.SignatureVerificationError:
+            return Response({"error": "Invalid signature."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if record_event(json.loads(payload)):
+            event_processor.wake()
+        return Response({"received": True})
+
 
 class StripeConfigView(APIView):
     """Return the Stripe publishable key to the frontend."""
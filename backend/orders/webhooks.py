@@ -0,0 +1,157 @@
+"""
+Stripe webhook ingestion.
+
+The endpoint only verifies the signature and inserts the event into
+:class:`StripeEvent`, whose unique ``event_id`` drops retries and duplicate
+deliveries, so Stripe gets its 200 straight away. A background thread per
+worker then claims unprocessed events in batches, marks the matching orders
+paid with one UPDATE per batch once the amount received checks out, and
+tells the cashier and table groups. ``manage.py process_stripe_events`` drains anything a worker left
+behind.
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, models, transaction
+from django.utils import timezone
+
+from .models import Order, StripeEvent
+
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_SUCCEEDED = 'payment_intent.succeeded'
+
+
+def record_event(event):
+    """Store a verified event; returns False if it was already received."""
+    _, created = StripeEvent.objects.get_or_create(
+        event_id=event['id'],
+        defaults={'type': event['type'], 'payload': event},
+    )
+    return created
+
+
+def batch_size():
+    return getattr(settings, 'STRIPE_WEBHOOK_BATCH_SIZE', 100)
+
+
+def process_pending(limit=None):
+    """
+    Process one batch of unprocessed events; returns how many were claimed.
+
+    Rows are claimed with ``SKIP LOCKED`` where the database supports it,
+    so several workers can drain the same table.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        events = list(
+            StripeEvent.objects.select_for_update(skip_locked=True)
+            .filter(processed_at=None)
+            .order_by('received_at')[:limit or batch_size()]
+        )
+        if not events:
+            return 0
+        paid = mark_orders_paid(
+            [event.payload['data']['object'] for event in events if event.type == PAYMENT_SUCCEEDED],
+            now,
+        )
+        StripeEvent.objects.filter(pk__in=[event.pk for event in events]).update(processed_at=now)
+
+    if paid:
+        from .payments import publish_payment_updates
+
+        publish_payment_updates(paid)
+    return len(events)
+
+
+def expected_amount(intent, orders):
+    """
+    What ``intent`` should have collected for ``orders``, in cents.
+
+    A table checkout's intent was priced from the bill (see
+    :func:`orders.checkout.bill_amounts`); an order's from its total.
+    """
+    from .checkout import bill_amounts
+    from .payments import amount_in_cents
+
+    if (intent.get('metadata') or {}).get('table_number') is not None:
+        return int(bill_amounts(sum(order.subtotal for order in orders))['total'] * 100)
+    return sum(amount_in_cents(order) for order in orders)
+
+
+def mark_orders_paid(intents, now):
+    """
+    Mark orders paid by these PaymentIntents; returns the orders that changed.
+
+    An intent only settles its orders when its ``amount_received`` is what
+    they cost. A short or mismatched payment is logged and the orders stay
+    unpaid for the cashier to sort out.
+    """
+    if not intents:
+        return []
+    by_id = {intent['id']: intent for intent in intents}
+    # Intents created before orders stored their id still carry it in metadata.
+    metadata_ids = {}
+    for intent in intents:
+        try:
+            metadata_ids[int((intent.get('metadata') or {}).get('order_id'))] = intent['id']
+        except (TypeError, ValueError):
+            continue
+
+    by_intent = {}
+    for order in Order.objects.filter(
+        models.Q(payment_intent_id__in=by_id)
+        | models.Q(pk__in=metadata_ids, payment_intent_id='')
+    ).select_for_update().order_by('pk').only('id', 'payment_intent_id', 'subtotal', 'total'):
+        by_intent.setdefault(order.payment_intent_id or metadata_ids[order.pk], []).append(order)
+
+    settled = []
+    for intent_id, orders in by_intent.items():
+        intent = by_id[intent_id]
+        expected = expected_amount(intent, orders)
+        if intent.get('amount_received') != expected:
+            logger.warning(
+                "PaymentIntent %s received %s, expected %s; orders %s left unpaid",
+                intent_id, intent.get('amount_received'), expected, [order.pk for order in orders],
+            )
+            continue
+        settled.extend(order.pk for order in orders)
+    if not settled:
+        return []
+    return Order.objects.filter(pk__in=settled).mark_paid('card', now=now)
+
+
+class EventProcessor:
+    """Background thread that drains :class:`StripeEvent` in batches."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def wake(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self.run, name='stripe-events', daemon=True,
+                )
+                self.thread.start()
+        self.wakeup.set()
+
+    def run(self):
+        poll_seconds = getattr(settings, 'STRIPE_WEBHOOK_POLL_SECONDS', 30)
+        while True:
+            self.wakeup.wait(poll_seconds)
+            self.wakeup.clear()
+            try:
+                while process_pending() >= batch_size():
+                    pass
+            except Exception:
+                logger.exception("Stripe event processing failed")
+            finally:
+                close_old_connections()
+
+
+event_processor = EventProcessor()
@@ -3,3 +3,13 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        from django.contrib.auth import get_user_model
+        from django.db.models.signals import post_delete, post_save
+
+        from .authentication import handle_user_changed
+
+        User = get_user_model()
+        post_save.connect(handle_user_changed, sender=User, dispatch_uid='users.auth_state.save')
+        post_delete.connect(handle_user_changed, sender=User, dispatch_uid='users.auth_state.delete')
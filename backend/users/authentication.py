@@ -0,0 +1,130 @@
+"""
+JWT authentication without a user query per request.
+
+Tokens issued by :func:`tokens_for` carry the user's ``role``, ``username``
+and staff flags. :class:`ClaimsJWTAuthentication` turns them into a
+:class:`ClaimsUser` instead of loading the ``User`` row, so polling kitchen
+and cashier screens cost no extra query.
+
+What a token can't know — whether the account was deactivated, demoted or
+had its password changed since — comes from a small per-user state record
+cached for ``AUTH_STATE_CACHE_SECONDS`` and dropped whenever the user is
+saved. Tokens issued before claims were added still authenticate through
+the database.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from backend.metrics import CACHE_REQUESTS
+
+
+ROLE_CLAIM = 'role'
+
+
+def add_user_claims(token, user):
+    token[ROLE_CLAIM] = user.role
+    token['username'] = user.username
+    token['is_staff'] = user.is_staff
+    token['is_superuser'] = user.is_superuser
+    return token
+
+
+def tokens_for(user):
+    """Refresh token (and, through it, access tokens) carrying the user's claims."""
+    return add_user_claims(RefreshToken.for_user(user), user)
+
+
+def _state_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def user_state(user_id):
+    """
+    What the token can't vouch for: active flag, role, staff flags and
+    password hash. Cached briefly; None if the user no longer exists.
+    """
+    key = _state_key(user_id)
+    state = cache.get(key)
+    CACHE_REQUESTS.labels('auth_state', 'miss' if state is None else 'hit').inc()
+    if state is None:
+        row = get_user_model().objects.filter(**{api_settings.USER_ID_FIELD: user_id}).values(
+            'is_active', 'role', 'is_staff', 'is_superuser', 'password',
+        ).first()
+        if row is None:
+            state = {}
+        else:
+            state = {**row, 'password': get_md5_hash_password(row['password'])}
+        cache.set(key, state, getattr(settings, 'AUTH_STATE_CACHE_SECONDS', 30))
+    return state or None
+
+
+def forget_user(user_id):
+    cache.delete(_state_key(user_id))
+
+
+def handle_user_changed(sender, instance, **kwargs):
+    """post_save / post_delete receiver for the user model."""
+    forget_user(getattr(instance, api_settings.USER_ID_FIELD))
+
+
+class ClaimsUser(TokenUser):
+    """
+    User built from token claims plus the cached state record.
+
+    ``role`` and the staff flags come from the state record, so a demotion
+    takes effect within ``AUTH_STATE_CACHE_SECONDS`` even for old tokens.
+    Use ``pk`` to load the full ``User`` when a view needs profile fields.
+    """
+
+    def __init__(self, token, state):
+        super().__init__(token)
+        self.state = state
+
+    @cached_property
+    def role(self):
+        return self.state['role']
+
+    @cached_property
+    def is_staff(self):
+        return self.state['is_staff']
+
+    @cached_property
+    def is_superuser(self):
+        return self.state['is_superuser']
+
+    @property
+    def is_active(self):
+        return self.state['is_active']
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """``JWTAuthentication`` that trusts token claims instead of loading the user."""
+
+    def get_user(self, validated_token):
+        if ROLE_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+
+        state = user_state(user_id)
+        if state is None:
+            raise AuthenticationFailed('User not found', code='user_not_found')
+        if api_settings.CHECK_USER_IS_ACTIVE and not state['is_active']:
+            raise AuthenticationFailed('User is inactive', code='user_inactive')
+        if api_settings.CHECK_REVOKE_TOKEN and (
+            validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != state['password']
+        ):
+            raise AuthenticationFailed("The user's password has been changed.", code='password_changed')
+
+        return ClaimsUser(validated_token, state)
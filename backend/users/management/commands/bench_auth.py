@@ -0,0 +1,65 @@
+"""
+Measure per-request authentication overhead.
+
+Authenticates the same request many times with simplejwt's
+``JWTAuthentication`` (one user query per request) and with
+``ClaimsJWTAuthentication`` (claims plus the cached state record), and
+reports latency and queries per request for each. A throwaway user is
+created inside a transaction that is rolled back.
+
+Usage:
+    python manage.py bench_auth --requests 5000
+"""
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from users.authentication import ClaimsJWTAuthentication, forget_user, tokens_for
+
+
+class Command(BaseCommand):
+    help = 'Benchmark JWT authentication overhead per request'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = get_user_model().objects.create_user(
+                username='bench-auth', password='bench-auth', role='kitchen',
+            )
+            plain = str(RefreshToken.for_user(user).access_token)
+            claims = str(tokens_for(user).access_token)
+            forget_user(user.pk)
+
+            for label, backend, token in (
+                ('JWTAuthentication', JWTAuthentication(), plain),
+                ('ClaimsJWTAuthentication', ClaimsJWTAuthentication(), claims),
+            ):
+                self._run(label, backend, token, options['requests'])
+            transaction.set_rollback(True)
+
+    def _run(self, label, backend, token, count):
+        factory = APIRequestFactory()
+        timings = []
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(count):
+                request = Request(factory.get('/', HTTP_AUTHORIZATION=f'Bearer {token}'))
+                start = time.perf_counter()
+                backend.authenticate(request)
+                timings.append((time.perf_counter() - start) * 1e6)
+
+        timings.sort()
+        self.stdout.write(
+            f"{label:<24} p50 {statistics.median(timings):7.1f} us  "
+            f"p95 {timings[int(len(timings) * 0.95) - 1]:7.1f} us  "
+            f"queries/request {len(queries) / count:.3f}"
+        )
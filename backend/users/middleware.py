@@ -0,0 +1,115 @@
+"""
+JWT authentication for WebSocket connections.
+
+Clients pass their access token either as a ``Sec-WebSocket-Protocol``
+pair (``["bearer", "<token>"]``, preferred since it stays out of access
+logs) or as ``?token=``. Decoded tokens are kept in a bounded per-process
+cache until they expire, and the user is built by
+:class:`~users.authentication.ClaimsJWTAuthentication` from claims plus the
+cached state record, so a reconnect storm costs neither signature checks
+nor database queries.
+
+A valid token sets ``scope['user']`` and ``scope['role']``; an invalid or
+expired one is refused at the handshake. Connections without a token fall
+through to the session-based ``AuthMiddlewareStack`` as before.
+"""
+import hashlib
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qs
+
+from channels.auth import AuthMiddlewareStack
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from channels.security.websocket import WebsocketDenier
+from django.conf import settings
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from backend.metrics import CACHE_REQUESTS
+
+from .authentication import ClaimsJWTAuthentication
+
+
+BEARER_SUBPROTOCOL = 'bearer'
+
+
+class TokenCache:
+    """Validated access tokens by hash of the raw token, LRU-bounded, until ``exp``."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.tokens = OrderedDict()
+
+    def get(self, raw):
+        key = hashlib.sha256(raw.encode()).digest()
+        entry = self.tokens.get(key)
+        if entry is None:
+            return None
+        token, expires = entry
+        if expires <= time.time():
+            del self.tokens[key]
+            return None
+        self.tokens.move_to_end(key)
+        return token
+
+    def put(self, raw, token):
+        key = hashlib.sha256(raw.encode()).digest()
+        self.tokens[key] = (token, token['exp'])
+        self.tokens.move_to_end(key)
+        while len(self.tokens) > self.maxsize:
+            self.tokens.popitem(last=False)
+
+
+token_cache = TokenCache(getattr(settings, 'WS_TOKEN_CACHE_SIZE', 10000))
+_backend = ClaimsJWTAuthentication()
+
+
+def token_from_scope(scope):
+    """``(raw_token, subprotocol_to_accept)``; ``(None, None)`` if the client sent none."""
+    subprotocols = scope.get('subprotocols') or []
+    if BEARER_SUBPROTOCOL in subprotocols:
+        index = subprotocols.index(BEARER_SUBPROTOCOL)
+        if index + 1 < len(subprotocols):
+            return subprotocols[index + 1], BEARER_SUBPROTOCOL
+
+    query = parse_qs(scope.get('query_string', b'').decode())
+    token = query.get('token', [None])[0]
+    return token, None
+
+
+async def authenticate_token(raw):
+    """User for a raw access token; raises ``TokenError`` / ``AuthenticationFailed``."""
+    token = token_cache.get(raw)
+    CACHE_REQUESTS.labels('ws_token', 'miss' if token is None else 'hit').inc()
+    if token is None:
+        token = AccessToken(raw)
+        token_cache.put(raw, token)
+    return await database_sync_to_async(_backend.get_user)(token)
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """Populate ``scope['user']`` and ``scope['role']`` from a JWT."""
+
+    async def __call__(self, scope, receive, send):
+        raw, subprotocol = token_from_scope(scope)
+        if raw is None:
+            return await super().__call__(scope, receive, send)
+
+        try:
+            user = await authenticate_token(raw)
+        except (TokenError, AuthenticationFailed):
+            return await WebsocketDenier.as_asgi()(scope, receive, send)
+
+        scope = dict(
+            scope,
+            user=user,
+            role=getattr(user, 'role', None),
+            auth_subprotocol=subprotocol,
+        )
+        return await super().__call__(scope, receive, send)
+
+
+def JWTAuthMiddlewareStack(inner):
+    """Session auth as before, overridden by a JWT when one is sent."""
+    return AuthMiddlewareStack(JWTAuthMiddleware(inner))
@@ -0,0 +1,24 @@
+from rest_framework.permissions import BasePermission
+
+
+def has_role(user, roles):
+    """True for staff users and for authenticated users with one of ``roles``."""
+    if user is None or not user.is_authenticated:
+        return False
+    return user.is_staff or getattr(user, 'role', None) in roles
+
+
+class IsKitchenStaff(BasePermission):
+    """Kitchen staff and admins, who may change order status."""
+    roles = ('admin', 'kitchen')
+
+    def has_permission(self, request, view):
+        return has_role(request.user, self.roles)
+
+
+class IsAdminRole(BasePermission):
+    """Admins only."""
+    roles = ('admin',)
+
+    def has_permission(self, request, view):
+        return has_role(request.user, self.roles)
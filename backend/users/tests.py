@@ -0,0 +1,155 @@
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import middleware
+from .authentication import ClaimsUser, tokens_for
+from .models import User
+
+
+class UsersTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.chef = User.objects.create_user('chef', password='x', role='kitchen')
+
+    def bearer(self, refresh):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+
+class ClaimsAuthenticationTests(UsersTestCase):
+    url = '/api/orders/kitchen/'
+
+    def user_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        return response, [q['sql'] for q in queries if '"users"' in q['sql']]
+
+    def test_login_token_carries_claims(self):
+        response = self.client.post('/api/auth/login/', {'identifier': 'chef', 'password': 'x'})
+        self.assertEqual(response.status_code, 200)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.data["access"]}')
+        response, _ = self.user_queries()
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response.wsgi_request.user, ClaimsUser)
+        self.assertEqual(response.wsgi_request.user.role, 'kitchen')
+
+    def test_user_row_is_read_once_then_cached(self):
+        self.bearer(tokens_for(self.chef))
+        response, first = self.user_queries()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(first), 1)
+        response, second = self.user_queries()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(second, [])
+
+    def test_deactivated_user_is_rejected_at_once(self):
+        self.bearer(tokens_for(self.chef))
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.chef.is_active = False
+        self.chef.save()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_demotion_applies_to_existing_tokens(self):
+        admin = User.objects.create_user('boss', password='x', role='admin')
+        self.bearer(tokens_for(admin))
+        self.assertEqual(self.client.get('/api/menu/export/').status_code, 200)
+        admin.role = 'cashier'
+        admin.save()
+        self.assertEqual(self.client.get('/api/menu/export/').status_code, 403)
+
+    def test_deleted_user_is_rejected(self):
+        self.bearer(tokens_for(self.chef))
+        self.chef.delete()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_tokens_without_claims_still_authenticate(self):
+        self.bearer(RefreshToken.for_user(self.chef))
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response.wsgi_request.user, User)
+
+
+class WebSocketTokenTests(UsersTestCase):
+    def setUp(self):
+        super().setUp()
+        middleware.token_cache.tokens.clear()
+        self.cashier = User.objects.create_user('till', password='x', role='cashier')
+        self.token = str(tokens_for(self.cashier).access_token)
+
+    async def connect(self, path='/ws/orders/', subprotocols=None):
+        from channels.routing import URLRouter
+        from channels.testing import WebsocketCommunicator
+
+        from orders.routing import websocket_urlpatterns
+
+        application = middleware.JWTAuthMiddlewareStack(URLRouter(websocket_urlpatterns))
+        communicator = WebsocketCommunicator(application, path, subprotocols=subprotocols)
+        connected, subprotocol = await communicator.connect()
+        return communicator, connected, subprotocol
+
+    def test_subprotocol_token_is_preferred_over_query_string(self):
+        scope = {'subprotocols': ['bearer', 'abc'], 'query_string': b'token=xyz'}
+        self.assertEqual(middleware.token_from_scope(scope), ('abc', 'bearer'))
+        self.assertEqual(middleware.token_from_scope({'query_string': b'token=xyz'}), ('xyz', None))
+        self.assertEqual(middleware.token_from_scope({'query_string': b''}), (None, None))
+
+    async def test_bearer_subprotocol_sets_role_and_groups(self):
+        communicator, connected, subprotocol = await self.connect(subprotocols=['bearer', self.token])
+        self.assertTrue(connected)
+        self.assertEqual(subprotocol, 'bearer')
+        message = await communicator.receive_json_from()
+        self.assertEqual(message['role'], 'cashier')
+        self.assertIn('cashier', message['groups'])
+        await communicator.disconnect()
+
+    async def test_query_string_token(self):
+        communicator, connected, subprotocol = await self.connect(f'/ws/orders/?token={self.token}')
+        self.assertTrue(connected)
+        self.assertIsNone(subprotocol)
+        self.assertEqual((await communicator.receive_json_from())['role'], 'cashier')
+        await communicator.disconnect()
+
+    async def test_invalid_token_is_refused(self):
+        communicator, connected, _ = await self.connect('/ws/orders/?token=not-a-jwt')
+        self.assertFalse(connected)
+
+    async def test_no_token_connects_anonymously(self):
+        communicator, connected, _ = await self.connect()
+        self.assertTrue(connected)
+        message = await communicator.receive_json_from()
+        self.assertIsNone(message['role'])
+        self.assertNotIn('cashier', message['groups'])
+        await communicator.disconnect()
+
+    def test_reconnect_skips_decoding_and_user_query(self):
+        authenticate = async_to_sync(middleware.authenticate_token)
+        with mock.patch.object(middleware, 'AccessToken', wraps=middleware.AccessToken) as decode:
+            first = authenticate(self.token)
+            with self.assertNumQueries(0):
+                second = authenticate(self.token)
+        self.assertEqual(decode.call_count, 1)
+        self.assertEqual((first.role, second.role), ('cashier', 'cashier'))
+
+    async def test_cached_token_of_deactivated_user_is_refused(self):
+        await middleware.authenticate_token(self.token)
+        self.cashier.is_active = False
+        await self.cashier.asave()
+        communicator, connected, _ = await self.connect(subprotocols=['bearer', self.token])
+        self.assertFalse(connected)
+
+    def test_cache_is_bounded_and_drops_expired_tokens(self):
+        cache = middleware.TokenCache(maxsize=1)
+        cache.put('a', {'exp': 2 ** 40})
+        cache.put('b', {'exp': 2 ** 40})
+        self.assertIsNone(cache.get('a'))
+        self.assertIsNotNone(cache.get('b'))
+        cache.put('c', {'exp': 0})
+        self.assertIsNone(cache.get('c'))
+        self.assertEqual(cache.tokens, {})
@@ -5,6 +5,7 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate, get_user_model
 
+from .authentication import tokens_for
 from .serializers import UserSerializer, LoginSerializer
 
 User = get_user_model()
@@ -38,7 +39,7 @@ class LoginView(APIView):
                 status=status.HTTP_401_UNAUTHORIZED,
             )
 
-        refresh = RefreshToken.for_user(user)
+        refresh = tokens_for(user)
         return Response({
             'access': str(refresh.access_token),
             'refresh': str(refresh),
@@ -71,5 +72,7 @@ class UserProfileView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        serializer = UserSerializer(request.user)
+        # request.user may be a ClaimsUser; profile fields live on the row.
+        user = User.objects.get(pk=request.user.pk)
+        serializer = UserSerializer(user)
         return Response(serializer.data)
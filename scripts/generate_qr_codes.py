@@ -5,11 +5,13 @@ DineQR - Table QR Code Generator
 Generates QR codes for restaurant tables.
 Usage:
     python generate_qr_codes.py --tables 10 --base-url http://192.168.1.100:8000
+    python generate_qr_codes.py --tables 500 --workers 8
 """
 
 import os
 import sys
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 import qrcode
 from qrcode.image.styledpil import StyledPilImage
 from qrcode.image.styles.colormasks import SolidFillColorMask
@@ -21,6 +23,28 @@ except ImportError:
     sys.exit(1)
 
 
+_fonts = None
+
+
+def load_fonts():
+    """Label fonts, loaded once per process."""
+    global _fonts
+    if _fonts is None:
+        # Try to use a nice font, fallback to default
+        try:
+            font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 24)
+            font_small = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 14)
+        except (OSError, IOError):
+            try:
+                font = ImageFont.truetype("arial.ttf", 24)
+                font_small = ImageFont.truetype("arial.ttf", 14)
+            except (OSError, IOError):
+                font = ImageFont.load_default()
+                font_small = font
+        _fonts = (font, font_small)
+    return _fonts
+
+
 def generate_qr_for_table(table_number, base_url, output_dir):
     """Generate a styled QR code for a specific table."""
     qr_data = f"{base_url}/table/{table_number}"
@@ -48,18 +72,7 @@ def generate_qr_for_table(table_number, base_url, output_dir):
     final_img.paste(img, (0, 0))
 
     draw = ImageDraw.Draw(final_img)
-
-    # Try to use a nice font, fallback to default
-    try:
-        font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 24)
-        font_small = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 14)
-    except (OSError, IOError):
-        try:
-            font = ImageFont.truetype("arial.ttf", 24)
-            font_small = ImageFont.truetype("arial.ttf", 14)
-        except (OSError, IOError):
-            font = ImageFont.load_default()
-            font_small = font
+    font, font_small = load_fonts()
 
     # Draw "DineQR" branding
     brand_text = "DineQR"
@@ -116,6 +129,10 @@ def main():
         '--output', type=str, default='qr_codes',
         help='Output directory for QR code images (default: qr_codes)',
     )
+    parser.add_argument(
+        '--workers', type=int, default=os.cpu_count() or 1,
+        help='Processes rendering in parallel (default: CPU count)',
+    )
     args = parser.parse_args()
 
     # Create output directory
@@ -129,10 +146,19 @@ def main():
     print(f"  Output: {args.output}/")
     print(f"{'='*50}\n")
 
-    generated = []
-    for i in range(1, args.tables + 1):
-        path = generate_qr_for_table(i, args.base_url, args.output)
-        generated.append(path)
+    numbers = range(1, args.tables + 1)
+    if args.workers <= 1:
+        generated = [generate_qr_for_table(i, args.base_url, args.output) for i in numbers]
+    else:
+        # Each worker loads the fonts once, then renders its share of tables.
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=load_fonts) as pool:
+            generated = list(pool.map(
+                generate_qr_for_table,
+                numbers,
+                [args.base_url] * len(numbers),
+                [args.output] * len(numbers),
+                chunksize=max(1, len(numbers) // (args.workers * 4)),
+            ))
 
     print(f"\n  Done! Generated {len(generated)} QR codes.")
     print(f"  Print these and place on restaurant tables.\n")